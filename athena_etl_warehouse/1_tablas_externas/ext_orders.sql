@@ -1,4 +1,13 @@
-CREATE EXTERNAL TABLE IF NOT EXISTS hack2_aw_catalog.ext_orders (
+-- Un mes por carpeta Hive (sources.json "partitioning": "year-month"):
+--   table=orders/year=2012/month=7/orders_2012-07.csv[.gz|.zst]
+-- Partition projection: no hay MSCK REPAIR / ADD PARTITION, y un WHERE year/month
+-- hace que Athena liste y planifique solo esa carpeta.
+-- Objetos del layout plano anterior: lambda_ingest/migrate_orders_layout.py
+-- DROP + CREATE: una ext_orders previa sin year/month (layout plano) no se reemplaza con
+-- IF NOT EXISTS. Es externa: DROP no borra datos de S3.
+DROP TABLE IF EXISTS hack2_aw_catalog.ext_orders;
+
+CREATE EXTERNAL TABLE hack2_aw_catalog.ext_orders (
   SalesOrderID        INT,
   SalesOrderDetailID  INT,
   OrderDate           STRING,
@@ -17,10 +26,19 @@ CREATE EXTERNAL TABLE IF NOT EXISTS hack2_aw_catalog.ext_orders (
   LineTotal           DOUBLE,
   StoreID             INT
 )
+PARTITIONED BY (year INT, month INT)
 ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.OpenCSVSerde'
 WITH SERDEPROPERTIES ('separatorChar'=',','quoteChar'='\"','escapeChar'='\\')
 LOCATION 's3://bg-hack2-aw-datalake2/bronze/source=github/table=orders/'
-TBLPROPERTIES ('skip.header.line.count'='1');
+TBLPROPERTIES (
+  'skip.header.line.count'='1',
+  'projection.enabled'='true',
+  'projection.year.type'='integer',
+  'projection.year.range'='2011,2030',
+  'projection.month.type'='integer',
+  'projection.month.range'='1,12',
+  'storage.location.template'='s3://bg-hack2-aw-datalake2/bronze/source=github/table=orders/year=${year}/month=${month}/'
+);
 
 
-SELECT * FROM ext_orders LIMIT 5;
\ No newline at end of file
+SELECT * FROM ext_orders WHERE year = 2011 AND month = 5 LIMIT 5;
\ No newline at end of file
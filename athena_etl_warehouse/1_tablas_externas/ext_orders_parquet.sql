@@ -0,0 +1,40 @@
+-- Variante Parquet de ext_orders (sources.json: "format": "parquet").
+-- Los ingest escriben en table=orders_parquet/year=Y/month=M/ (hermano de table=orders/)
+-- con el schema del manifest; mismo particionado y projection que ext_orders.
+-- DROP + CREATE: una ext_orders_parquet previa sin year/month (layout plano) no se reemplaza con
+-- IF NOT EXISTS. Es externa: DROP no borra datos de S3.
+DROP TABLE IF EXISTS hack2_aw_catalog.ext_orders_parquet;
+
+CREATE EXTERNAL TABLE hack2_aw_catalog.ext_orders_parquet (
+  SalesOrderID        INT,
+  SalesOrderDetailID  INT,
+  OrderDate           STRING,
+  DueDate             STRING,
+  ShipDate            STRING,
+  EmployeeID          INT,
+  CustomerID          INT,
+  SubTotal            DOUBLE,
+  TaxAmt              DOUBLE,
+  Freight             DOUBLE,
+  TotalDue            DOUBLE,
+  ProductID           INT,
+  OrderQty            INT,
+  UnitPrice           DOUBLE,
+  UnitPriceDiscount   DOUBLE,
+  LineTotal           DOUBLE,
+  StoreID             INT
+)
+PARTITIONED BY (year INT, month INT)
+STORED AS PARQUET
+LOCATION 's3://bg-hack2-aw-datalake2/bronze/source=github/table=orders_parquet/'
+TBLPROPERTIES (
+  'projection.enabled'='true',
+  'projection.year.type'='integer',
+  'projection.year.range'='2011,2030',
+  'projection.month.type'='integer',
+  'projection.month.range'='1,12',
+  'storage.location.template'='s3://bg-hack2-aw-datalake2/bronze/source=github/table=orders_parquet/year=${year}/month=${month}/'
+);
+
+
+SELECT * FROM ext_orders_parquet WHERE year = 2011 AND month = 5 LIMIT 5;
\ No newline at end of file
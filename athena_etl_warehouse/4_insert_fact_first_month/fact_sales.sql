@@ -23,4 +23,4 @@ SELECT
 
   '2011-05'                 AS RunMonth
 FROM hack2_aw_catalog.ext_orders o
-WHERE "$path" = 's3://bg-hack2-aw-datalake2/bronze/source=github/table=orders/orders_2011-05.csv';
+WHERE o.year = 2011 AND o.month = 5;   -- solo la partición del mes (orders_2011-05.csv, .csv.gz o .csv.zst)
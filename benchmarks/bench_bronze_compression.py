@@ -0,0 +1,99 @@
+# bench_bronze_compression.py
+"""
+Bytes escaneados por Athena para los meses de orders: CSV plano vs gzip vs zstd.
+
+Athena factura los bytes leídos de S3; para tablas de texto eso es el tamaño
+del objeto (comprimido si aplica). Por eso el tamaño de cada
+orders_YYYY-MM.csv[.gz|.zst] es la medida de "bytes scanned" de las consultas
+por mes (sql_count_file_rows / sql_insert_for, filtradas por "$path").
+
+Uso:
+    python benchmarks/bench_bronze_compression.py [orders.csv | URL]
+    python benchmarks/bench_bronze_compression.py --synthetic [n_rows]
+
+Por defecto usa la URL de orders en sources.json. Requiere zstandard para la
+columna zstd (si no está instalado se omite).
+"""
+import os, sys, io, csv, json, gzip, random, urllib.request
+from datetime import date, timedelta
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "lambda_ingest"))
+from date_matcher import DateMatcher
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def _orders_source():
+    with open(os.path.join(ROOT, "sources.json"), encoding="utf-8") as f:
+        return next(s for s in json.load(f)["sources"] if s["table"] == "orders")
+
+def _read_text(arg):
+    if arg.startswith("http"):
+        with urllib.request.urlopen(arg) as resp:
+            return resp.read().decode("utf-8", errors="replace")
+    with open(arg, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+def _synthetic(n, seed=11):
+    rnd = random.Random(seed)
+    cols = ["SalesOrderID","SalesOrderDetailID","OrderDate","DueDate","ShipDate","EmployeeID","CustomerID",
+            "SubTotal","TaxAmt","Freight","TotalDue","ProductID","OrderQty","UnitPrice","UnitPriceDiscount",
+            "LineTotal","StoreID"]
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(cols)
+    start = date(2011, 5, 31)
+    for i in range(n):
+        d = start + timedelta(days=rnd.randrange(0, 1100))
+        qty, price = rnd.randint(1, 10), round(rnd.uniform(2, 3500), 4)
+        sub = round(qty * price, 4)
+        tax, fr = round(sub * 0.08, 4), round(sub * 0.025, 4)
+        f = lambda x: f"{x.month}/{x.day}/{x.year}"
+        w.writerow([43659 + i // 4, i + 1, f(d), f(d + timedelta(days=12)), f(d + timedelta(days=7)),
+                    rnd.randint(274, 290), rnd.randint(11000, 30118), sub, tax, fr, round(sub + tax + fr, 4),
+                    rnd.randint(707, 999), qty, price, 0, sub, rnd.randint(292, 2051)])
+    return out.getvalue()
+
+def main():
+    src = _orders_source()
+    args = sys.argv[1:]
+    if args and args[0] == "--synthetic":
+        text, label = _synthetic(int(args[1]) if len(args) > 1 else 120_000), "synthetic"
+    else:
+        label = args[0] if args else src["url_or_query"]
+        text = _read_text(label)
+
+    reader = csv.DictReader(io.StringIO(text))
+    matcher, rows = DateMatcher.from_rows(src.get("date_format"), reader, src.get("date_field", "OrderDate"))
+    months = {}
+    for row in rows:
+        ym = matcher.year_month(row.get("OrderDate", ""))
+        if ym is None:
+            continue
+        if ym not in months:
+            buf = io.StringIO()
+            w = csv.DictWriter(buf, fieldnames=reader.fieldnames)
+            w.writeheader()
+            months[ym] = (buf, w)
+        months[ym][1].writerow(row)
+
+    print(f"source={label} months={len(months)}")
+    print(f"{'run_month':<10} {'csv':>12} {'gzip':>12} {'zstd':>12} {'gzip%':>7}")
+    tot = [0, 0, 0]
+    for (y, m) in sorted(months):
+        raw = months[(y, m)][0].getvalue().encode("utf-8")
+        gz = len(gzip.compress(raw, 6))
+        zs = len(zstandard.ZstdCompressor(level=3).compress(raw)) if zstandard else 0
+        tot[0] += len(raw); tot[1] += gz; tot[2] += zs
+        print(f"{y:04d}-{m:02d}    {len(raw):>12,} {gz:>12,} {zs:>12,} {100 * gz / len(raw):>6.1f}%")
+    print(f"{'TOTAL':<10} {tot[0]:>12,} {tot[1]:>12,} {tot[2]:>12,} {100 * tot[1] / max(tot[0], 1):>6.1f}%")
+    if zstandard:
+        print(f"ratio csv/gzip = {tot[0] / tot[1]:.1f}x   csv/zstd = {tot[0] / tot[2]:.1f}x")
+    else:
+        print(f"ratio csv/gzip = {tot[0] / tot[1]:.1f}x   (zstandard no instalado)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# bench_date_matcher.py
+"""
+Micro-benchmark: _match_run_month (cascade de strptime) vs DateMatcher compilado.
+
+Uso:
+    python benchmarks/bench_date_matcher.py [n_rows] [date_format]
+
+Genera n_rows fechas sintéticas tipo orders.csv (M/d/yyyy por defecto, con
+algunas filas vacías o fuera de formato), verifica que ambos caminos
+seleccionan exactamente las mismas filas y reporta tiempos.
+"""
+import os, sys, time, random
+from datetime import datetime, date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_ingest"))
+from date_matcher import DateMatcher
+
+# --- Copia literal de la implementación anterior (referencia) ---
+def _month_parts(run_month: str):
+    y, m = run_month.split("-")
+    return int(y), int(m)
+
+def _match_run_month(date_str, pattern, run_month):
+    if not date_str:
+        return False
+    date_str = date_str.strip().split("T")[0].split(" ")[0]
+
+    fmts = []
+    if pattern in ("M/d/yyyy", "MM/dd/yyyy"):
+        fmts.append("%m/%d/%Y")
+    elif pattern in ("MM-dd-yyyy", "M-d-yyyy"):
+        fmts.append("%m-%d-%Y")
+    fmts += ["%Y-%m-%d", "%Y/%m/%d", "%d-%m-%Y", "%m/%d/%Y", "%m-%d-%Y"]
+
+    Y, M = _month_parts(run_month)
+    for f in fmts:
+        try:
+            dt = datetime.strptime(date_str, f)
+            return dt.year == Y and dt.month == M
+        except Exception:
+            continue
+    return False
+# ----------------------------------------------------------------
+
+def _gen_rows(n, seed=7):
+    rnd = random.Random(seed)
+    start = date(2011, 5, 31)
+    out = []
+    for i in range(n):
+        d = start + timedelta(days=rnd.randrange(0, 1100))
+        if i % 5000 == 0:
+            out.append({"OrderDate": ""})
+        elif i % 7919 == 0:
+            out.append({"OrderDate": d.strftime("%Y-%m-%d")})   # fuera de formato
+        else:
+            out.append({"OrderDate": f"{d.month}/{d.day}/{d.year}"})
+    return out
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 120_000
+    pattern = sys.argv[2] if len(sys.argv) > 2 else "MM-dd-yyyy"   # valor actual del manifest
+    run_month = "2012-07"
+    rows = _gen_rows(n)
+
+    t0 = time.perf_counter()
+    old = [r for r in rows if _match_run_month(r["OrderDate"], pattern, run_month)]
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    matcher, it = DateMatcher.from_rows(pattern, rows, "OrderDate")
+    target = _month_parts(run_month)
+    new = [r for r in it if matcher.year_month(r["OrderDate"]) == target]
+    t_new = time.perf_counter() - t0
+
+    assert old == new, "DateMatcher y _match_run_month difieren"
+    print(f"rows={n} pattern={pattern} run_month={run_month} matched={len(new)}")
+    print(f"_match_run_month : {t_old*1000:9.1f} ms")
+    print(f"DateMatcher      : {t_new*1000:9.1f} ms  (x{t_old/t_new:.1f})")
+    print("report:", matcher.report())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# bench_money_normalizer.py
+"""
+Micro-benchmark + corpus de corrección: clean_money (heurística por celda) vs
+MoneyNormalizer (formato detectado una vez por columna).
+
+Uso:
+    python benchmarks/bench_money_normalizer.py [n_rows] [StoresBudget_master.csv]
+
+Corpus: los 702 montos de StoresBudget_master.csv ("$60.749.820.000", separado
+por ';') y los mismos montos re-escritos en otros formatos de columna (coma de
+miles, espacios, con decimales, números ya tipados). El valor esperado sale del
+entero original, no de ninguna de las dos implementaciones. Se verifica que:
+  - MoneyNormalizer acierta todas las columnas del corpus;
+  - en la columna original ambos caminos devuelven exactamente lo mismo.
+Luego mide ambos sobre n_rows celdas de la columna original.
+"""
+import os, sys, csv, time
+from itertools import islice, cycle
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "lambda_ingest"))
+from money_normalizer import MoneyNormalizer, clean_money
+
+def _load_master(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return [r["Budget"].strip() for r in csv.DictReader(f, delimiter=";") if (r.get("Budget") or "").strip()]
+
+def _group(n, sep):
+    return f"{n:,}".replace(",", sep)
+
+def corpus(raw_values):
+    """{columna: [(celda, esperado)]} a partir de los montos del master."""
+    ints = [int("".join(ch for ch in v if ch.isdigit())) for v in raw_values]
+    cents = [(n, f"{i % 100:02d}") for i, n in enumerate(ints)]
+    return {
+        "master ($ . miles)":      [(v, str(n)) for v, n in zip(raw_values, ints)],
+        ". miles , decimal":       [(f"{_group(n, '.')},{c}", f"{n}.{c}") for n, c in cents],
+        ", miles . decimal":       [(f"${_group(n, ',')}.{c}", f"{n}.{c}") for n, c in cents],
+        ", miles sin decimal":     [(_group(n, ","), str(n)) for n in ints],
+        "espacio de miles":        [(f" {_group(n, ' ')} ", str(n)) for n in ints],
+        "sin separadores":         [(str(n), str(n)) for n in ints],
+        "números tipados (excel)": [(n, str(n)) for n in ints],
+    }
+
+def _run(values):
+    norm, it = MoneyNormalizer.from_rows(values, lambda v: v)
+    return norm, [norm.normalize(v) for v in it]
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(ROOT, "StoresBudget_master.csv")
+    raw = _load_master(path)
+
+    print(f"corpus: {len(raw)} montos de {os.path.basename(path)}")
+    for name, pairs in corpus(raw).items():
+        cells, expected = [c for c, _ in pairs], [e for _, e in pairs]
+        norm, got = _run(cells)
+        bad = [(c, g, e) for c, g, e in zip(cells, got, expected) if g != e]
+        assert not bad, f"MoneyNormalizer falla en '{name}': {bad[:3]}"
+        legacy_bad = sum(1 for c, e in zip(cells, expected) if clean_money(c) != e)
+        r = norm.report()
+        print(f"  {name:26s} ok  formato={r['money_format']} outliers={r['outliers']} "
+              f"clean_money_erróneos={legacy_bad}")
+
+    # la columna real debe quedar idéntica a la implementación anterior
+    assert [clean_money(v) for v in raw] == _run(raw)[1], "difiere de clean_money en el master"
+
+    cells = list(islice(cycle(raw), n))
+    t0 = time.perf_counter()
+    old = [clean_money(v) for v in cells]
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    norm, new = _run(cells)
+    t_new = time.perf_counter() - t0
+
+    assert old == new
+    print(f"rows={n}")
+    print(f"clean_money     : {t_old*1000:9.1f} ms")
+    print(f"MoneyNormalizer : {t_new*1000:9.1f} ms  (x{t_old/t_new:.1f})")
+    print("report:", norm.report())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+../shared/athena_client.py
\ No newline at end of file
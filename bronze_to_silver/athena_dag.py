@@ -0,0 +1,240 @@
+# athena_dag.py
+"""
+Sentencias Athena declaradas como grafo de dependencias y ejecutadas en paralelo.
+
+    dag = AthenaDag()
+    a = dag.add("drop:bronze_x", "DROP TABLE IF EXISTS ...")
+    b = dag.add("create:bronze_x", "CREATE EXTERNAL TABLE ...", deps=[a])
+    dag.run()
+
+- Un nodo es SQL (start_query_execution) o una función Python (p. ej. limpiar
+  un prefijo S3 o una llamada a Glue); se lanza cuando todas sus dependencias
+  terminaron OK.
+- Como mucho ATHENA_MAX_IN_FLIGHT consultas a la vez (cuota de consultas
+  concurrentes del workgroup); el estado se consulta en lote con
+  batch_get_query_execution. Las llamadas pasan por athena_client
+  (reintentos ante throttling, timeout por consulta) y el intervalo de poll
+  crece con backoff.
+- Si un nodo falla, sus dependientes (directos e indirectos) se marcan SKIPPED;
+  las ramas independientes siguen. Los nodos always=True (limpieza de tablas
+  tmp) corren cuando sus dependencias terminaron, con o sin error.
+- run() levanta RuntimeError con los nodos fallidos al final.
+- Cada sentencia terminada queda en la telemetría (CONTROL_TABLE) con el
+  nombre del nodo como paso y el run_month del DAG.
+- Las dependencias se declaran antes que el nodo: el grafo no puede tener ciclos.
+"""
+import os, time
+from athena_client import POLL_MIN_S, POLL_MAX_S, POLL_FACTOR, QueryStats
+from athena_utils import CLIENT, BUCKET, DB, delete_s3_prefix
+from glue_catalog import ensure_table, drop_table
+
+MAX_IN_FLIGHT = int(os.environ.get("ATHENA_MAX_IN_FLIGHT", "5"))
+
+PENDING, RUNNING, SUCCEEDED, FAILED, SKIPPED = "PENDING", "RUNNING", "SUCCEEDED", "FAILED", "SKIPPED"
+_DONE = (SUCCEEDED, FAILED, SKIPPED)
+
+class Node:
+    def __init__(self, name, action, deps, always):
+        self.name = name
+        self.action = action          # str (SQL) o callable()
+        self.deps = list(deps)
+        self.always = always
+        self.state = PENDING
+        self.qid = None
+        self.error = None
+        self.started = None
+        self.elapsed_ms = None
+        self.stats = None             # QueryStats (solo nodos SQL)
+
+class AthenaDag:
+    def __init__(self, max_in_flight=None, run_month=None):
+        self.nodes = {}
+        self.max_in_flight = max(1, int(max_in_flight or MAX_IN_FLIGHT))
+        self.run_month = run_month
+
+    def add(self, name, action, deps=(), always=False):
+        """Agrega un nodo; deps = nombres ya agregados. Devuelve el nombre."""
+        if name in self.nodes:
+            raise ValueError(f"Nodo duplicado en el DAG: {name}")
+        deps = [d for d in deps if d]
+        missing = [d for d in deps if d not in self.nodes]
+        if missing:
+            raise ValueError(f"{name}: dependencias inexistentes {missing}")
+        self.nodes[name] = Node(name, action, deps, always)
+        return name
+
+    # ---------- ejecución ----------
+    def _ready(self, node):
+        deps = [self.nodes[d] for d in node.deps]
+        if node.always:
+            return all(d.state in _DONE for d in deps)
+        return all(d.state == SUCCEEDED for d in deps)
+
+    def _blocked(self, node):
+        return not node.always and any(self.nodes[d].state in (FAILED, SKIPPED) for d in node.deps)
+
+    def _finish(self, node, state, error=None):
+        node.state = state
+        node.error = error
+        node.elapsed_ms = int((time.monotonic() - node.started) * 1000)
+        if state == FAILED:
+            print(f"ATHENA DAG FAILED {node.name}: {error}")
+
+    def _start(self, node):
+        node.started = time.monotonic()
+        node.state = RUNNING
+        if callable(node.action):
+            try:
+                node.action()
+                self._finish(node, SUCCEEDED)
+            except Exception as e:
+                self._finish(node, FAILED, str(e))
+            return
+        try:
+            node.qid = CLIENT.start(node.action)
+        except Exception as e:
+            self._finish(node, FAILED, str(e))
+
+    def _poll(self, running):
+        """Actualiza los nodos en curso; True si alguno terminó."""
+        by_qid = {n.qid: n for n in running}
+        changed = False
+        for qe in CLIENT.executions(by_qid):
+            st = qe["Status"]["State"]
+            node = by_qid[qe["QueryExecutionId"]]
+            if st in ("SUCCEEDED", "FAILED", "CANCELLED"):
+                node.stats = QueryStats.from_execution(qe)
+                changed = True
+            if st == "SUCCEEDED":
+                self._finish(node, SUCCEEDED)
+            elif st in ("FAILED", "CANCELLED"):
+                self._finish(node, FAILED, f"Athena {st}: {qe['Status'].get('StateChangeReason')}")
+            elif time.monotonic() - node.started >= CLIENT.timeout_s:
+                CLIENT.stop(node.qid)
+                self._finish(node, FAILED, f"Athena TIMEOUT tras {int(CLIENT.timeout_s)}s")
+                changed = True
+            if node.stats:
+                node.stats.wall_ms = node.elapsed_ms
+                CLIENT.record(node.stats, node.name, self.run_month)
+        return changed
+
+    def run(self):
+        """Ejecuta el grafo completo. Devuelve el resumen; RuntimeError si algún nodo falló."""
+        t0 = time.monotonic()
+        order = list(self.nodes.values())   # orden de declaración = prioridad
+        delay = POLL_MIN_S
+        try:
+            while True:
+                for n in order:
+                    if n.state == PENDING and self._blocked(n):
+                        n.state = SKIPPED
+                running = [n for n in order if n.state == RUNNING and n.qid]
+                for n in order:
+                    if len(running) >= self.max_in_flight:
+                        break
+                    if n.state == PENDING and self._ready(n):
+                        self._start(n)
+                        if n.state == RUNNING:
+                            running.append(n)
+                if all(n.state in _DONE for n in order):
+                    break
+                if running:
+                    time.sleep(delay)
+                    # backoff mientras nada termina; al liberarse un cupo vuelve a poll rápido
+                    delay = POLL_MIN_S if self._poll(running) else min(POLL_MAX_S, delay * POLL_FACTOR)
+        finally:
+            CLIENT.flush()
+
+        summary = self.summary(int((time.monotonic() - t0) * 1000))
+        print("ATHENA DAG:", {k: v for k, v in summary.items() if k != "nodes"})
+        failed = [n for n in order if n.state == FAILED]
+        if failed:
+            raise RuntimeError("Athena DAG: " + "; ".join(f"{n.name}: {n.error}" for n in failed))
+        return summary
+
+    def summary(self, wall_ms=None):
+        nodes = list(self.nodes.values())
+        return {
+            "statements": len(nodes),
+            "succeeded": sum(n.state == SUCCEEDED for n in nodes),
+            "failed": sum(n.state == FAILED for n in nodes),
+            "skipped": sum(n.state == SKIPPED for n in nodes),
+            "wall_ms": wall_ms,
+            "sum_ms": sum(n.elapsed_ms or 0 for n in nodes),   # lo que tardaría en serie
+            "engine_ms": sum(n.stats.engine_ms for n in nodes if n.stats),
+            "scanned_bytes": sum(n.stats.scanned_bytes for n in nodes if n.stats),
+            "nodes": {n.name: {"state": n.state, "ms": n.elapsed_ms, "qid": n.qid, "error": n.error,
+                               "stats": n.stats.as_dict() if n.stats else None}
+                      for n in nodes},
+        }
+
+# ---------- Split válidos / inválidos ----------
+STAGE_PREFIX = "tmp/classified/"   # staging Parquet efímero (se borra al terminar)
+_PARQUET = "format='PARQUET', parquet_compression='SNAPPY'"
+
+def add_split_valid_invalid(dag, stage_table, classified_sql,
+                            valid_table, valid_loc, valid_cols,
+                            invalid_table, invalid_loc, invalid_cols, after=(), staged=False):
+    """
+    Reparte las filas clasificadas en Silver / logs/invalid (nodos del DAG).
+
+    classified_sql: SELECT (o WITH ... SELECT) que lee Bronze, calcula ROW_NUMBER
+    y devuelve las columnas de ambas salidas + is_valid (BOOLEAN) + REASON.
+    staged=False (dims): dos CTAS en paralelo sobre classified_sql,
+      {valid_table} WHERE is_valid y {invalid_table} WHERE NOT is_valid. Dos
+      consultas, como antes: para tablas chicas el mínimo facturado por consulta
+      (10 MB) pesa más que leer Bronze dos veces.
+    staged=True (orders): Bronze se escanea UNA vez.
+      1) CTAS {stage_table} (Parquet en s3://<bucket>/tmp/classified/...).
+      2) CTAS {valid_table}   -> valid_loc:   SELECT valid_cols   ... WHERE is_valid
+      3) CTAS {invalid_table} -> invalid_loc: SELECT invalid_cols ... WHERE NOT is_valid
+      2) y 3) leen solo el staging columnar y corren en paralelo.
+    Con is_valid NULL la fila no va a ninguna salida (mismo resultado que
+    WHERE cond / WHERE NOT (cond)). Devuelve los nodos finales (limpieza de tmp).
+    """
+    if staged:
+        stage_prefix = f"{STAGE_PREFIX}{stage_table}/"
+        source = f"{DB}.{stage_table}"
+        # los DROP de tablas tmp van por Glue (sin round trip a Athena)
+        drop = dag.add(f"drop:{stage_table}", lambda: drop_table(DB, stage_table), deps=after)
+        # CTAS exige la ubicación vacía
+        clean = dag.add(f"clean:{stage_table}", lambda: delete_s3_prefix(stage_prefix), deps=after)
+        split_after = [dag.add(f"ctas:{stage_table}", f"""
+    CREATE TABLE {source}
+    WITH ({_PARQUET}, external_location='s3://{BUCKET}/{stage_prefix}')
+    AS
+    {classified_sql}
+    """, deps=[drop, clean])]
+    else:
+        source = f"({classified_sql}) c"
+        split_after = list(after)
+    valid = dag.add(f"ctas:{valid_table}", f"""
+    CREATE TABLE {DB}.{valid_table}
+    WITH ({_PARQUET}, external_location='{valid_loc}')
+    AS SELECT {valid_cols} FROM {source} WHERE is_valid;
+    """, deps=split_after)
+    invalid = dag.add(f"ctas:{invalid_table}", f"""
+    CREATE TABLE {DB}.{invalid_table}
+    WITH ({_PARQUET}, external_location='{invalid_loc}')
+    AS SELECT {invalid_cols} FROM {source} WHERE NOT is_valid;
+    """, deps=split_after)
+    done = [
+        dag.add(f"drop:{valid_table}", lambda: drop_table(DB, valid_table), deps=[valid], always=True),
+        dag.add(f"drop:{invalid_table}", lambda: drop_table(DB, invalid_table), deps=[invalid], always=True),
+    ]
+    if staged:
+        drop_stage = dag.add(f"drop-stage:{stage_table}", lambda: drop_table(DB, stage_table),
+                             deps=[valid, invalid], always=True)
+        done.append(dag.add(f"clean-stage:{stage_table}", lambda: delete_s3_prefix(stage_prefix),
+                            deps=[drop_stage], always=True))
+    return done
+
+def add_bronze_table(dag, table_input, after=()):
+    """
+    Tabla Bronze de larga vida (glue_catalog.csv_table): se crea / actualiza por
+    Glue solo si cambió su definición; en caliente no hace ninguna llamada.
+    """
+    name = table_input["Name"]
+    if f"ensure:{name}" in dag.nodes:   # varias dims pueden leer la misma Bronze
+        return f"ensure:{name}"
+    return dag.add(f"ensure:{name}", lambda: ensure_table(DB, table_input), deps=after)
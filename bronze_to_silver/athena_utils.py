@@ -1,29 +1,40 @@
-import os, time, boto3
+import os, boto3
+from athena_client import AthenaClient, QueryTelemetry
 
-ATHENA = boto3.client("athena")
+S3 = boto3.client("s3")
+# ATHENA_BACKEND=duckdb: misma API ejecutada en local (athena_duckdb.py), sin Athena
+ATHENA_BACKEND = os.environ.get("ATHENA_BACKEND", "athena").lower()
+if ATHENA_BACKEND == "duckdb":
+    from athena_duckdb import local_athena
+    ATHENA = local_athena(S3)
+else:
+    ATHENA = boto3.client("athena")
 
 DB = os.environ["CATALOG_DB"]            # p.ej. hack2_aw_catalog (AwsDataCatalog/Hive)
 ATHENA_OUTPUT = os.environ["ATHENA_OUTPUT"]  # s3://<bucket>/logs/athena-results/
 BUCKET = os.environ["BUCKET_NAME"]       # p.ej. bg-hack2-aw-datalake
-ATHENA_WG = "primary"  # NUEVO
+ATHENA_WG = "primary"
 
-def run_athena(sql: str):
-    qid = ATHENA.start_query_execution(
-        QueryString=sql,
-        QueryExecutionContext={"Database": DB},
-        ResultConfiguration={"OutputLocation": ATHENA_OUTPUT},
-        WorkGroup=ATHENA_WG
-    )["QueryExecutionId"]
-    while True:
-        st = ATHENA.get_query_execution(QueryExecutionId=qid)["QueryExecution"]["Status"]["State"]
-        if st in ("SUCCEEDED", "FAILED", "CANCELLED"):
-            if st != "SUCCEEDED":
-                info = ATHENA.get_query_execution(QueryExecutionId=qid)["QueryExecution"]["Status"]
-                raise RuntimeError(f"Athena {st}: {info.get('StateChangeReason')}")
-            return
-        time.sleep(1.0)
+# telemetría por sentencia en el CONTROL_TABLE (opcional)
+CONTROL_TABLE = os.environ.get("CONTROL_TABLE")
+TELEMETRY = (QueryTelemetry(boto3.resource("dynamodb").Table(CONTROL_TABLE), "bronze_to_silver")
+             if CONTROL_TABLE else None)
+
+# cliente común (shared/athena_client.py): backoff de polling, reintentos, timeout
+CLIENT = AthenaClient(ATHENA, DB, ATHENA_OUTPUT, ATHENA_WG, telemetry=TELEMETRY)
+
+def run_athena(sql: str, step: str = None):
+    """Ejecuta UNA sentencia y espera; devuelve QueryStats. AthenaError si falla."""
+    return CLIENT.run(sql, step=step)
 
 def ym_from_run_month(run_month: str):
     y_str, m_str = run_month.split("-")
     y = int(y_str); m = int(m_str); m_z = f"{m:02d}"
     return y, m, m_z
+
+def delete_s3_prefix(prefix: str):
+    keys = []
+    for page in S3.get_paginator("list_objects_v2").paginate(Bucket=BUCKET, Prefix=prefix):
+        keys += [{"Key": o["Key"]} for o in page.get("Contents", [])]
+    for i in range(0, len(keys), 1000):
+        S3.delete_objects(Bucket=BUCKET, Delete={"Objects": keys[i:i + 1000], "Quiet": True})
@@ -1,32 +1,26 @@
 # etl_dim_customers.py
-from athena_utils import run_athena, ym_from_run_month, BUCKET, DB
+from athena_utils import ym_from_run_month, BUCKET, DB
+from athena_dag import AthenaDag, add_bronze_table, add_split_valid_invalid
+from glue_catalog import csv_table
 
-def run_dim_customers(run_month: str):
+# Bronze (CSV, todo STRING): una tabla por fuente con projection en run_month
+CUSTOMERS_COLS = ['CustomerID', 'FirstName', 'LastName', 'FullName']
+BRONZE_LOC = f"s3://{BUCKET}/bronze/source=github/table=customers/"
+
+def add_dim_customers(dag: AthenaDag, run_month: str):
+    """Nodos de la dim customer en el DAG; devuelve los nodos finales."""
     y, m, m_z = ym_from_run_month(run_month)
-    bronze_loc = f"s3://{BUCKET}/bronze/source=github/table=customers/run_month={y}-{m_z}/"
     silver_loc = f"s3://{BUCKET}/silver/dim=customer/run_month={y}-{m_z}/"
     invalid_loc = f"s3://{BUCKET}/logs/invalid/dim=customer/run_month={y}-{m_z}/"
 
-    # 1) Bronze externa como STRING + skip header (forzamos DROP por si existía con tipos numéricos)
-    run_athena(f"DROP TABLE IF EXISTS {DB}.bronze_customers_{y}_{int(m_z)};")
-    run_athena(f"""
-    CREATE EXTERNAL TABLE {DB}.bronze_customers_{y}_{int(m_z)} (
-      CustomerID STRING,
-      FirstName  STRING,
-      LastName   STRING,
-      FullName   STRING
-    )
-    ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.OpenCSVSerde'
-    WITH SERDEPROPERTIES ('separatorChar' = ',', 'quoteChar' = '"', 'escapeChar'='\\\\')
-    LOCATION '{bronze_loc}'
-    TBLPROPERTIES ('skip.header.line.count'='1');
-    """)
+    # 1) Bronze de larga vida (Glue + projection): el mes se elige con WHERE run_month
+    bronze = add_bronze_table(dag, csv_table("bronze_customers", CUSTOMERS_COLS, BRONZE_LOC))
 
-    # 2) CTAS válidos → Silver
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_customer_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{silver_loc}')
-    AS
+    # 2) Clasificación → válidos a Silver, inválidos a logs/invalid (dos CTAS directos, sin staging)
+    return add_split_valid_invalid(
+        dag,
+        f"tmp_dim_customer_classified_{y}_{int(m_z)}",
+        f"""
     WITH s AS (
       SELECT
         TRY(CAST(CustomerID AS INT)) AS CustomerID,
@@ -35,44 +29,26 @@ def run_dim_customers(run_month: str):
         TRIM(FullName)               AS FullName,
         ROW_NUMBER() OVER (PARTITION BY TRY(CAST(CustomerID AS INT))
                            ORDER BY TRIM(FullName)) AS rn
-      FROM {DB}.bronze_customers_{y}_{int(m_z)}
-    ),
-    valid AS (
-      SELECT * FROM s WHERE CustomerID IS NOT NULL AND rn=1
+      FROM {DB}.bronze_customers
+      WHERE run_month = '{y}-{m_z}'
     )
-    SELECT CustomerID, FirstName, LastName, FullName
-    FROM valid;
-    """)
-
-    # 3) CTAS inválidos → logs/invalid
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_customer_invalid_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{invalid_loc}')
-    AS
-    WITH s AS (
-      SELECT
-        TRY(CAST(CustomerID AS INT)) AS CustomerID,
-        TRIM(FirstName)              AS FirstName,
-        TRIM(LastName)               AS LastName,
-        TRIM(FullName)               AS FullName,
-        ROW_NUMBER() OVER (PARTITION BY TRY(CAST(CustomerID AS INT))
-                           ORDER BY TRIM(FullName)) AS rn
-      FROM {DB}.bronze_customers_{y}_{int(m_z)}
-    ),
-    invalid AS (
-      SELECT s.*,
-        CASE
-          WHEN CustomerID IS NULL THEN 'PK_NULL_OR_NOT_INT'
-          WHEN rn > 1 THEN 'DUPLICATE_PK'
-          ELSE 'UNKNOWN'
-        END AS REASON
-      FROM s
-      WHERE NOT (CustomerID IS NOT NULL AND rn=1)
+    SELECT s.*,
+      (CustomerID IS NOT NULL AND rn=1) AS is_valid,
+      CASE
+        WHEN CustomerID IS NULL THEN 'PK_NULL_OR_NOT_INT'
+        WHEN rn > 1 THEN 'DUPLICATE_PK'
+        ELSE 'UNKNOWN'
+      END AS REASON
+    FROM s
+    """,
+        f"tmp_dim_customer_{y}_{int(m_z)}", silver_loc,
+        "CustomerID, FirstName, LastName, FullName",
+        f"tmp_dim_customer_invalid_{y}_{int(m_z)}", invalid_loc,
+        "CustomerID, FirstName, LastName, FullName, REASON",
+        after=[bronze],
     )
-    SELECT CustomerID, FirstName, LastName, FullName, REASON
-    FROM invalid;
-    """)
 
-    # 4) Limpieza
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_customer_{y}_{int(m_z)};")
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_customer_invalid_{y}_{int(m_z)};")
+def run_dim_customers(run_month: str):
+    dag = AthenaDag(run_month=run_month)
+    add_dim_customers(dag, run_month)
+    return dag.run()
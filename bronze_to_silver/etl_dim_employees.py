@@ -1,40 +1,27 @@
 # etl_dim_employees.py
-from athena_utils import run_athena, ym_from_run_month, BUCKET, DB
+from athena_utils import ym_from_run_month, BUCKET, DB
+from athena_dag import AthenaDag, add_bronze_table, add_split_valid_invalid
+from glue_catalog import csv_table
 
-def run_dim_employees(run_month: str):
+# Bronze (CSV, todo STRING): una tabla por fuente con projection en run_month
+BRONZE_LOC = f"s3://{BUCKET}/bronze/source=github/table=employee/"
+EMPLOYEE_COLS = ['EmployeeID', 'ManagerID', 'FirstName', 'LastName', 'FullName', 'JobTitle',
+                 'OrganizationLevel', 'MaritalStatus', 'Gender', 'Territory', 'Country', 'GroupCol']
+
+def add_dim_employees(dag: AthenaDag, run_month: str):
+    """Nodos de la dim employee en el DAG; devuelve los nodos finales."""
     y, m, m_z = ym_from_run_month(run_month)
-    bronze_loc = f"s3://{BUCKET}/bronze/source=github/table=employee/run_month={y}-{m_z}/"
     silver_loc = f"s3://{BUCKET}/silver/dim=employee/run_month={y}-{m_z}/"
     invalid_loc = f"s3://{BUCKET}/logs/invalid/dim=employee/run_month={y}-{m_z}/"
 
-    # BRONZE — Hive DDL (igual que en la consola)
-    run_athena(f"DROP TABLE IF EXISTS {DB}.bronze_employee_{y}_{int(m_z)};")
-    run_athena(f"""
-    CREATE EXTERNAL TABLE {DB}.bronze_employee_{y}_{int(m_z)} (
-      EmployeeID        STRING,
-      ManagerID         STRING,
-      FirstName         STRING,
-      LastName          STRING,
-      FullName          STRING,
-      JobTitle          STRING,
-      OrganizationLevel STRING,
-      MaritalStatus     STRING,
-      Gender            STRING,
-      Territory         STRING,
-      Country           STRING,
-      GroupCol          STRING
-    )
-    ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.OpenCSVSerde'
-    WITH SERDEPROPERTIES ('separatorChar' = ',', 'quoteChar' = '"', 'escapeChar'='\\\\')
-    LOCATION '{bronze_loc}'
-    TBLPROPERTIES ('skip.header.line.count'='1');
-    """)
+    # BRONZE — tabla de larga vida (Glue + projection en run_month)
+    bronze = add_bronze_table(dag, csv_table("bronze_employee", EMPLOYEE_COLS, BRONZE_LOC))
 
-    # SILVER — válidos
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_employee_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{silver_loc}')
-    AS
+    # SILVER / LOGS — clasificación → válidos e inválidos (dos CTAS directos, sin staging)
+    return add_split_valid_invalid(
+        dag,
+        f"tmp_dim_employee_classified_{y}_{int(m_z)}",
+        f"""
     WITH s AS (
       SELECT
         TRY(CAST(EmployeeID AS INT))        AS EmployeeID,
@@ -51,7 +38,8 @@ def run_dim_employees(run_month: str):
         TRIM(GroupCol)                      AS GroupCol,
         ROW_NUMBER() OVER (PARTITION BY TRY(CAST(EmployeeID AS INT))
                            ORDER BY TRIM(FullName)) AS rn
-      FROM {DB}.bronze_employee_{y}_{int(m_z)}
+      FROM {DB}.bronze_employee
+      WHERE run_month = '{y}-{m_z}'
     ),
     s2 AS (
       SELECT *,
@@ -62,67 +50,29 @@ def run_dim_employees(run_month: str):
              WHEN MaritalStatus IN ('M','MARRIED','CASADO','CASADA') THEN 'M'
              ELSE 'U' END AS MaritalNorm
       FROM s
-    ),
-    valid AS (
-      SELECT * FROM s2
-      WHERE EmployeeID IS NOT NULL AND rn=1 AND GenderNorm IN ('M','F') AND MaritalNorm IN ('S','M')
     )
-    SELECT EmployeeID, ManagerID, FirstName, LastName, FullName, JobTitle,
-           OrganizationLevel, MaritalNorm AS MaritalStatus, GenderNorm AS Gender,
-           Territory, Country, GroupCol AS "Group"
-    FROM valid;
-    """)
-
-    # LOGS — inválidos
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_employee_invalid_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{invalid_loc}')
-    AS
-    WITH s AS (
-      SELECT
-        TRY(CAST(EmployeeID AS INT))        AS EmployeeID,
-        TRY(CAST(ManagerID AS INT))         AS ManagerID,
-        TRIM(FirstName)                     AS FirstName,
-        TRIM(LastName)                      AS LastName,
-        TRIM(FullName)                      AS FullName,
-        TRIM(JobTitle)                      AS JobTitle,
-        TRY(CAST(OrganizationLevel AS INT)) AS OrganizationLevel,
-        UPPER(TRIM(MaritalStatus))          AS MaritalStatus,
-        UPPER(TRIM(Gender))                 AS Gender,
-        TRIM(Territory)                     AS Territory,
-        TRIM(Country)                       AS Country,
-        TRIM(GroupCol)                      AS GroupCol,
-        ROW_NUMBER() OVER (PARTITION BY TRY(CAST(EmployeeID AS INT))
-                           ORDER BY TRIM(FullName)) AS rn
-      FROM {DB}.bronze_employee_{y}_{int(m_z)}
-    ),
-    s2 AS (
-      SELECT *,
-        CASE WHEN Gender IN ('M','MALE','H') THEN 'M'
-             WHEN Gender IN ('F','FEMALE','MUJER') THEN 'F'
-             ELSE 'U' END AS GenderNorm,
-        CASE WHEN MaritalStatus IN ('S','SINGLE','SOLTERO','SOLTERA') THEN 'S'
-             WHEN MaritalStatus IN ('M','MARRIED','CASADO','CASADA') THEN 'M'
-             ELSE 'U' END AS MaritalNorm
-      FROM s
-    ),
-    invalid AS (
-      SELECT s2.*,
-        CASE
-          WHEN EmployeeID IS NULL THEN 'PK_NULL_OR_NOT_INT'
-          WHEN rn > 1 THEN 'DUPLICATE_PK'
-          WHEN GenderNorm NOT IN ('M','F') THEN 'GENDER_INVALID'
-          WHEN MaritalNorm NOT IN ('S','M') THEN 'MARITALSTATUS_INVALID'
-          ELSE 'UNKNOWN'
-        END AS REASON
-      FROM s2
-      WHERE NOT (EmployeeID IS NOT NULL AND rn=1 AND GenderNorm IN ('M','F') AND MaritalNorm IN ('S','M'))
+    SELECT s2.*,
+      (EmployeeID IS NOT NULL AND rn=1 AND GenderNorm IN ('M','F') AND MaritalNorm IN ('S','M')) AS is_valid,
+      CASE
+        WHEN EmployeeID IS NULL THEN 'PK_NULL_OR_NOT_INT'
+        WHEN rn > 1 THEN 'DUPLICATE_PK'
+        WHEN GenderNorm NOT IN ('M','F') THEN 'GENDER_INVALID'
+        WHEN MaritalNorm NOT IN ('S','M') THEN 'MARITALSTATUS_INVALID'
+        ELSE 'UNKNOWN'
+      END AS REASON
+    FROM s2
+    """,
+        f"tmp_dim_employee_{y}_{int(m_z)}", silver_loc,
+        ('EmployeeID, ManagerID, FirstName, LastName, FullName, JobTitle, '
+         'OrganizationLevel, MaritalNorm AS MaritalStatus, GenderNorm AS Gender, '
+         'Territory, Country, GroupCol AS "Group"'),
+        f"tmp_dim_employee_invalid_{y}_{int(m_z)}", invalid_loc,
+        ('EmployeeID, ManagerID, FirstName, LastName, FullName, JobTitle, '
+         'OrganizationLevel, MaritalStatus, Gender, Territory, Country, GroupCol AS "Group", REASON'),
+        after=[bronze],
     )
-    SELECT EmployeeID, ManagerID, FirstName, LastName, FullName, JobTitle,
-           OrganizationLevel, MaritalStatus, Gender, Territory, Country, GroupCol AS "Group", REASON
-    FROM invalid;
-    """)
 
-    # Limpieza de temporales
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_employee_{y}_{int(m_z)};")
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_employee_invalid_{y}_{int(m_z)};")
+def run_dim_employees(run_month: str):
+    dag = AthenaDag(run_month=run_month)
+    add_dim_employees(dag, run_month)
+    return dag.run()
@@ -1,18 +1,27 @@
 # etl_dim_products.py
-from athena_utils import run_athena, ym_from_run_month, BUCKET, DB
+from athena_utils import ym_from_run_month, BUCKET, DB
+from athena_dag import AthenaDag, add_bronze_table, add_split_valid_invalid
+from glue_catalog import csv_table
 
-def run_dim_products(run_month: str):
-    """Dim Product (Category, SubCategory, Product) → Silver.
-    - Bronze externas como STRING + skip header
+# Bronze (CSV, todo STRING): una tabla por fuente con projection en run_month
+CAT_LOC  = f"s3://{BUCKET}/bronze/source=github/table=productCategories/"
+SUB_LOC  = f"s3://{BUCKET}/bronze/source=github/table=productSubcategories/"
+PROD_LOC = f"s3://{BUCKET}/bronze/source=github/table=products/"
+PRODUCTCATEGORIES_COLS = ['CategoryID', 'CategoryName']
+PRODUCTSUBCATEGORIES_COLS = ['SubCategoryID', 'CategoryID', 'SubCategoryName']
+PRODUCTS_COLS = ['ProductID', 'ProductNumber', 'ProductName', 'ModelName', 'MakeFlag',
+                 'StandardCost', 'ListPrice', 'SubCategoryID']
+
+def add_dim_products(dag: AthenaDag, run_month: str):
+    """Dim Product (Category, SubCategory, Product) → Silver (nodos del DAG).
+    - Bronze de larga vida como STRING + skip header (projection en run_month)
     - CAST/TRY en CTEs
-    - CTAS válidos e inválidos (una sentencia por ejecución)
+    - Por entidad, dos CTAS sobre la misma clasificación: válidos e inválidos
+      (una sentencia por ejecución; sin staging, las tablas son chicas)
+    - Las tres entidades son independientes: cada split depende solo de su Bronze
     """
     y, m, m_z = ym_from_run_month(run_month)
 
-    cat_loc  = f"s3://{BUCKET}/bronze/source=github/table=productCategories/run_month={y}-{m_z}/"
-    sub_loc  = f"s3://{BUCKET}/bronze/source=github/table=productSubcategories/run_month={y}-{m_z}/"
-    prod_loc = f"s3://{BUCKET}/bronze/source=github/table=products/run_month={y}-{m_z}/"
-
     silver_cat  = f"s3://{BUCKET}/silver/dim=product/Category/run_month={y}-{m_z}/"
     silver_sub  = f"s3://{BUCKET}/silver/dim=product/SubCategory/run_month={y}-{m_z}/"
     silver_prod = f"s3://{BUCKET}/silver/dim=product/Product/run_month={y}-{m_z}/"
@@ -21,103 +30,46 @@ def run_dim_products(run_month: str):
     invalid_sub  = f"s3://{BUCKET}/logs/invalid/dim=productSubcategory/run_month={y}-{m_z}/"
     invalid_prod = f"s3://{BUCKET}/logs/invalid/dim=product/run_month={y}-{m_z}/"
 
-    # 0) Forzamos DROP para asegurar esquema correcto (STRING + skip header)
-    run_athena(f"DROP TABLE IF EXISTS {DB}.bronze_productcategories_{y}_{int(m_z)};")
-    run_athena(f"""
-    CREATE EXTERNAL TABLE {DB}.bronze_productcategories_{y}_{int(m_z)} (
-      CategoryID   STRING,
-      CategoryName STRING
-    )
-    ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.OpenCSVSerde'
-    WITH SERDEPROPERTIES ('separatorChar' = ',', 'quoteChar' = '"', 'escapeChar'='\\\\')
-    LOCATION '{cat_loc}'
-    TBLPROPERTIES ('skip.header.line.count'='1');
-    """)
-
-    run_athena(f"DROP TABLE IF EXISTS {DB}.bronze_productsubcategories_{y}_{int(m_z)};")
-    run_athena(f"""
-    CREATE EXTERNAL TABLE {DB}.bronze_productsubcategories_{y}_{int(m_z)} (
-      SubCategoryID  STRING,
-      CategoryID     STRING,
-      SubCategoryName STRING
-    )
-    ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.OpenCSVSerde'
-    WITH SERDEPROPERTIES ('separatorChar' = ',', 'quoteChar' = '"', 'escapeChar'='\\\\')
-    LOCATION '{sub_loc}'
-    TBLPROPERTIES ('skip.header.line.count'='1');
-    """)
-
-    run_athena(f"DROP TABLE IF EXISTS {DB}.bronze_products_{y}_{int(m_z)};")
-    run_athena(f"""
-    CREATE EXTERNAL TABLE {DB}.bronze_products_{y}_{int(m_z)} (
-      ProductID     STRING,
-      ProductNumber STRING,
-      ProductName   STRING,
-      ModelName     STRING,
-      MakeFlag      STRING,
-      StandardCost  STRING,
-      ListPrice     STRING,
-      SubCategoryID STRING
-    )
-    ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.OpenCSVSerde'
-    WITH SERDEPROPERTIES ('separatorChar' = ',', 'quoteChar' = '"', 'escapeChar'='\\\\')
-    LOCATION '{prod_loc}'
-    TBLPROPERTIES ('skip.header.line.count'='1');
-    """)
+    # 0) Bronze de larga vida (Glue + projection en run_month)
+    cat = add_bronze_table(dag, csv_table("bronze_productcategories", PRODUCTCATEGORIES_COLS, CAT_LOC))
+    sub = add_bronze_table(dag, csv_table("bronze_productsubcategories", PRODUCTSUBCATEGORIES_COLS, SUB_LOC))
+    prod = add_bronze_table(dag, csv_table("bronze_products", PRODUCTS_COLS, PROD_LOC))
 
-    # 1) CATEGORY — válidos
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_product_category_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{silver_cat}')
-    AS
+    # 1) CATEGORY — clasificación → válidos / inválidos
+    done = add_split_valid_invalid(
+        dag,
+        f"tmp_dim_product_category_classified_{y}_{int(m_z)}",
+        f"""
     WITH c AS (
       SELECT
         TRY(CAST(CategoryID AS INT)) AS CategoryID,
         TRIM(CategoryName)           AS CategoryName,
         ROW_NUMBER() OVER (PARTITION BY TRY(CAST(CategoryID AS INT))
                            ORDER BY TRIM(CategoryName)) AS rn
-      FROM {DB}.bronze_productcategories_{y}_{int(m_z)}
-    ),
-    c_valid AS (
-      SELECT * FROM c WHERE CategoryID IS NOT NULL AND rn=1
+      FROM {DB}.bronze_productcategories
+      WHERE run_month = '{y}-{m_z}'
     )
-    SELECT CategoryID, CategoryName FROM c_valid;
-    """)
-
-    # 2) CATEGORY — inválidos
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_product_category_invalid_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{invalid_cat}')
-    AS
-    WITH c AS (
-      SELECT
-        TRY(CAST(CategoryID AS INT)) AS CategoryID,
-        TRIM(CategoryName)           AS CategoryName,
-        ROW_NUMBER() OVER (PARTITION BY TRY(CAST(CategoryID AS INT))
-                           ORDER BY TRIM(CategoryName)) AS rn
-      FROM {DB}.bronze_productcategories_{y}_{int(m_z)}
-    ),
-    c_invalid AS (
-      SELECT
-        *,
-        CASE
-          WHEN CategoryID IS NULL THEN 'PK_NULL_OR_NOT_INT'
-          WHEN rn > 1 THEN 'DUPLICATE_PK'
-          ELSE 'UNKNOWN'
-        END AS REASON
-      FROM c
-      WHERE NOT (CategoryID IS NOT NULL AND rn=1)
+    SELECT c.*,
+      (CategoryID IS NOT NULL AND rn=1) AS is_valid,
+      CASE
+        WHEN CategoryID IS NULL THEN 'PK_NULL_OR_NOT_INT'
+        WHEN rn > 1 THEN 'DUPLICATE_PK'
+        ELSE 'UNKNOWN'
+      END AS REASON
+    FROM c
+    """,
+        f"tmp_dim_product_category_{y}_{int(m_z)}", silver_cat,
+        "CategoryID, CategoryName",
+        f"tmp_dim_product_category_invalid_{y}_{int(m_z)}", invalid_cat,
+        "CategoryID, CategoryName, REASON",
+        after=[cat],
     )
-    SELECT CategoryID, CategoryName, REASON FROM c_invalid;
-    """)
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_product_category_{y}_{int(m_z)};")
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_product_category_invalid_{y}_{int(m_z)};")
 
-    # 3) SUBCATEGORY — válidos
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_product_subcategory_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{silver_sub}')
-    AS
+    # 2) SUBCATEGORY — clasificación → válidos / inválidos
+    done += add_split_valid_invalid(
+        dag,
+        f"tmp_dim_product_subcategory_classified_{y}_{int(m_z)}",
+        f"""
     WITH s AS (
       SELECT
         TRY(CAST(SubCategoryID AS INT)) AS SubCategoryID,
@@ -125,51 +77,31 @@ def run_dim_products(run_month: str):
         TRIM(SubCategoryName)           AS SubCategoryName,
         ROW_NUMBER() OVER (PARTITION BY TRY(CAST(SubCategoryID AS INT))
                            ORDER BY TRIM(SubCategoryName)) AS rn
-      FROM {DB}.bronze_productsubcategories_{y}_{int(m_z)}
-    ),
-    s_valid AS (
-      SELECT * FROM s
-      WHERE SubCategoryID IS NOT NULL AND rn=1 AND CategoryID IS NOT NULL
+      FROM {DB}.bronze_productsubcategories
+      WHERE run_month = '{y}-{m_z}'
     )
-    SELECT SubCategoryID, CategoryID, SubCategoryName FROM s_valid;
-    """)
-
-    # 4) SUBCATEGORY — inválidos
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_product_subcategory_invalid_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{invalid_sub}')
-    AS
-    WITH s AS (
-      SELECT
-        TRY(CAST(SubCategoryID AS INT)) AS SubCategoryID,
-        TRY(CAST(CategoryID AS INT))    AS CategoryID,
-        TRIM(SubCategoryName)           AS SubCategoryName,
-        ROW_NUMBER() OVER (PARTITION BY TRY(CAST(SubCategoryID AS INT))
-                           ORDER BY TRIM(SubCategoryName)) AS rn
-      FROM {DB}.bronze_productsubcategories_{y}_{int(m_z)}
-    ),
-    s_invalid AS (
-      SELECT
-        s.*,
-        CASE
-          WHEN s.SubCategoryID IS NULL THEN 'PK_NULL_OR_NOT_INT'
-          WHEN s.rn > 1 THEN 'DUPLICATE_PK'
-          WHEN s.CategoryID IS NULL THEN 'CAT_FK_NULL_OR_NOT_INT'
-          ELSE 'UNKNOWN'
-        END AS REASON
-      FROM s
-      WHERE NOT (s.SubCategoryID IS NOT NULL AND s.rn=1 AND s.CategoryID IS NOT NULL)
+    SELECT s.*,
+      (s.SubCategoryID IS NOT NULL AND s.rn=1 AND s.CategoryID IS NOT NULL) AS is_valid,
+      CASE
+        WHEN s.SubCategoryID IS NULL THEN 'PK_NULL_OR_NOT_INT'
+        WHEN s.rn > 1 THEN 'DUPLICATE_PK'
+        WHEN s.CategoryID IS NULL THEN 'CAT_FK_NULL_OR_NOT_INT'
+        ELSE 'UNKNOWN'
+      END AS REASON
+    FROM s
+    """,
+        f"tmp_dim_product_subcategory_{y}_{int(m_z)}", silver_sub,
+        "SubCategoryID, CategoryID, SubCategoryName",
+        f"tmp_dim_product_subcategory_invalid_{y}_{int(m_z)}", invalid_sub,
+        "SubCategoryID, CategoryID, SubCategoryName, REASON",
+        after=[sub],
     )
-    SELECT SubCategoryID, CategoryID, SubCategoryName, REASON FROM s_invalid;
-    """)
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_product_subcategory_{y}_{int(m_z)};")
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_product_subcategory_invalid_{y}_{int(m_z)};")
 
-    # 5) PRODUCT — válidos
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_product_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{silver_prod}')
-    AS
+    # 3) PRODUCT — clasificación → válidos / inválidos
+    done += add_split_valid_invalid(
+        dag,
+        f"tmp_dim_product_classified_{y}_{int(m_z)}",
+        f"""
     WITH p AS (
       SELECT
         TRY(CAST(ProductID AS INT))     AS ProductID,
@@ -186,55 +118,28 @@ def run_dim_products(run_month: str):
           PARTITION BY TRY(CAST(ProductID AS INT))
           ORDER BY TRIM(ProductName)
         ) AS rn
-      FROM {DB}.bronze_products_{y}_{int(m_z)}
-    ),
-    p_valid AS (
-      SELECT * FROM p
-      WHERE ProductID IS NOT NULL AND rn=1 AND SubCategoryID IS NOT NULL
+      FROM {DB}.bronze_products
+      WHERE run_month = '{y}-{m_z}'
     )
-    SELECT ProductID, ProductNumber, ProductName, ModelName, MakeFlag,
-           StandardCost, ListPrice, SubCategoryID
-    FROM p_valid;
-    """)
-
-    # 6) PRODUCT — inválidos
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_product_invalid_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{invalid_prod}')
-    AS
-    WITH p AS (
-      SELECT
-        TRY(CAST(ProductID AS INT))     AS ProductID,
-        TRIM(ProductNumber)             AS ProductNumber,
-        TRIM(ProductName)               AS ProductName,
-        NULLIF(TRIM(ModelName),'')      AS ModelName,
-        CASE UPPER(TRIM(MakeFlag))
-          WHEN '1' THEN TRUE WHEN 'TRUE' THEN TRUE WHEN 'Y' THEN TRUE
-          ELSE FALSE END                AS MakeFlag,
-        TRY(CAST(StandardCost AS DOUBLE)) AS StandardCost,
-        TRY(CAST(ListPrice  AS DOUBLE))   AS ListPrice,
-        TRY(CAST(SubCategoryID AS INT)) AS SubCategoryID,
-        ROW_NUMBER() OVER (
-          PARTITION BY TRY(CAST(ProductID AS INT))
-          ORDER BY TRIM(ProductName)
-        ) AS rn
-      FROM {DB}.bronze_products_{y}_{int(m_z)}
-    ),
-    p_invalid AS (
-      SELECT
-        p.*,
-        CASE
-          WHEN p.ProductID IS NULL THEN 'PK_NULL_OR_NOT_INT'
-          WHEN p.rn > 1 THEN 'DUPLICATE_PK'
-          WHEN p.SubCategoryID IS NULL THEN 'SUBCAT_FK_NULL_OR_NOT_INT'
-          ELSE 'UNKNOWN'
-        END AS REASON
-      FROM p
-      WHERE NOT (p.ProductID IS NOT NULL AND p.rn=1 AND p.SubCategoryID IS NOT NULL)
+    SELECT p.*,
+      (p.ProductID IS NOT NULL AND p.rn=1 AND p.SubCategoryID IS NOT NULL) AS is_valid,
+      CASE
+        WHEN p.ProductID IS NULL THEN 'PK_NULL_OR_NOT_INT'
+        WHEN p.rn > 1 THEN 'DUPLICATE_PK'
+        WHEN p.SubCategoryID IS NULL THEN 'SUBCAT_FK_NULL_OR_NOT_INT'
+        ELSE 'UNKNOWN'
+      END AS REASON
+    FROM p
+    """,
+        f"tmp_dim_product_{y}_{int(m_z)}", silver_prod,
+        "ProductID, ProductNumber, ProductName, ModelName, MakeFlag, StandardCost, ListPrice, SubCategoryID",
+        f"tmp_dim_product_invalid_{y}_{int(m_z)}", invalid_prod,
+        "ProductID, ProductNumber, ProductName, ModelName, MakeFlag, StandardCost, ListPrice, SubCategoryID, REASON",
+        after=[prod],
     )
-    SELECT ProductID, ProductNumber, ProductName, ModelName, MakeFlag,
-           StandardCost, ListPrice, SubCategoryID, REASON
-    FROM p_invalid;
-    """)
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_product_{y}_{int(m_z)};")
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_product_invalid_{y}_{int(m_z)};")
+    return done
+
+def run_dim_products(run_month: str):
+    dag = AthenaDag(run_month=run_month)
+    add_dim_products(dag, run_month)
+    return dag.run()
@@ -1,108 +1,79 @@
 # etl_dim_store.py
-from athena_utils import run_athena, ym_from_run_month, BUCKET, DB
+from athena_utils import ym_from_run_month, BUCKET, DB
+from athena_dag import AthenaDag, add_bronze_table, add_split_valid_invalid
+from glue_catalog import csv_table
 
-def run_dim_store(run_month: str):
+# Bronze (CSV, todo STRING): una tabla por fuente con projection en run_month
+STORES_LOC = f"s3://{BUCKET}/bronze/source=mysql/table=stores/"
+# deltas del ingest por watermark (engine.ingest_table): <prefix>delta/stores_delta_<ts>.csv[.gz];
+# el snapshot completo los borra, así que ahí solo hay cambios posteriores a él
+STORES_DELTA_LOC = f"{STORES_LOC}delta/"
+BUDGET_LOC = f"s3://{BUCKET}/bronze/source=excel/table=storesBudget/"
+STORES_COLS = ['StoreID', 'StoreName', 'EmployeeID', 'ModifiedDate']
+STORESBUDGET_COLS = ['StoreID', 'Budget']
+
+def add_dim_store(dag: AthenaDag, run_month: str):
     """
     SCD1: stores + storesBudget del snapshot de run_month → silver/dim=store/ (Parquet).
-    - Lee CSV Bronze (STRING + skip header)
+    Declara los nodos en el DAG y devuelve los nodos finales.
+    - Lee CSV Bronze (STRING + skip header; una tabla por fuente, WHERE run_month)
+      más los deltas de stores; por StoreID gana la versión con ModifiedDate más reciente
     - Castea y limpia
     - Une Budget a Store (LEFT JOIN)
-    - Válidos → silver/dim=store/
-    - Inválidos → logs/invalid/dim=store/run_month=YYYY-MM/
+    - Clasifica y reparte (dos CTAS directos, sin staging):
+      válidos → silver/dim=store/, inválidos → logs/invalid/dim=store/run_month=YYYY-MM/
     """
     y, m, m_z = ym_from_run_month(run_month)
 
-    stores_loc  = f"s3://{BUCKET}/bronze/source=mysql/table=stores/run_month={y}-{m_z}/"
-    budget_loc  = f"s3://{BUCKET}/bronze/source=excel/table=storesBudget/run_month={y}-{m_z}/"
     silver_loc  = f"s3://{BUCKET}/silver/dim=store/run_month={y}-{m_z}/"
     invalid_loc = f"s3://{BUCKET}/logs/invalid/dim=store/run_month={y}-{m_z}/"
 
-    # 1) Tablas externas Bronze (STRING + skip header). Forzamos DROP para asegurar esquema correcto.
-    run_athena(f"DROP TABLE IF EXISTS {DB}.bronze_stores_{y}_{int(m_z)};")
-    run_athena(f"""
-    CREATE EXTERNAL TABLE {DB}.bronze_stores_{y}_{int(m_z)} (
-      StoreID    STRING,
-      StoreName  STRING,
-      EmployeeID STRING
-    )
-    ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.OpenCSVSerde'
-    WITH SERDEPROPERTIES ('separatorChar' = ',', 'quoteChar' = '"', 'escapeChar'='\\\\')
-    LOCATION '{stores_loc}'
-    TBLPROPERTIES ('skip.header.line.count'='1');
-    """)
+    # 1) Tablas Bronze de larga vida (Glue + projection en run_month), independientes entre sí
+    stores = add_bronze_table(dag, csv_table("bronze_stores", STORES_COLS, STORES_LOC))
+    deltas = add_bronze_table(dag, csv_table("bronze_stores_delta", STORES_COLS, STORES_DELTA_LOC, partition=None))
 
-    run_athena(f"DROP TABLE IF EXISTS {DB}.bronze_storesbudget_{y}_{int(m_z)};")
-    run_athena(f"""
-    CREATE EXTERNAL TABLE {DB}.bronze_storesbudget_{y}_{int(m_z)} (
-      StoreID STRING,
-      Budget  STRING
-    )
-    ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.OpenCSVSerde'
-    WITH SERDEPROPERTIES ('separatorChar' = ',', 'quoteChar' = '"', 'escapeChar'='\\\\')
-    LOCATION '{budget_loc}'
-    TBLPROPERTIES ('skip.header.line.count'='1');
-    """)
+    budget = add_bronze_table(dag, csv_table("bronze_storesbudget", STORESBUDGET_COLS, BUDGET_LOC))
 
-    # 2) CTAS válidos → Silver (CREATE TABLE ... AS WITH ... SELECT)
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_store_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{silver_loc}')
-    AS
-    WITH s AS (
-      SELECT
-        CAST(StoreID AS INT)         AS StoreID,
-        TRIM(StoreName)              AS StoreName,
-        TRY(CAST(EmployeeID AS INT)) AS EmployeeID,
-        ROW_NUMBER() OVER (PARTITION BY CAST(StoreID AS INT) ORDER BY TRIM(StoreName)) AS rn
-      FROM {DB}.bronze_stores_{y}_{int(m_z)}
+    # 2) Clasificación → válidos a Silver, inválidos a logs/invalid
+    return add_split_valid_invalid(
+        dag,
+        f"tmp_dim_store_classified_{y}_{int(m_z)}",
+        f"""
+    WITH raw AS (
+      SELECT CAST(StoreID AS INT) AS StoreID, StoreName, EmployeeID,
+             NULLIF(TRIM(ModifiedDate), '') AS ModifiedDate   -- 'YYYY-MM-DD HH:MM:SS': ordena como fecha
+      FROM (
+        SELECT StoreID, StoreName, EmployeeID, ModifiedDate
+        FROM {DB}.bronze_stores
+        WHERE run_month = '{y}-{m_z}'
+        UNION ALL
+        SELECT StoreID, StoreName, EmployeeID, ModifiedDate
+        FROM {DB}.bronze_stores_delta
+      ) u
     ),
-    b AS (
+    v AS (
       SELECT
-        CAST(StoreID AS INT) AS StoreID,
-        TRY(CAST(Budget AS DECIMAL(18,2))) AS Budget
-      FROM {DB}.bronze_storesbudget_{y}_{int(m_z)}
-    ),
-    j AS (
-      SELECT
-        StoreID,                 -- OJO: tras USING, no usar s.StoreID
-        s.StoreName,
-        s.EmployeeID,
-        COALESCE(b.Budget, CAST(0 AS DECIMAL(18,2))) AS Budget,
-        s.rn,
-        (StoreID IS NOT NULL)             AS pk_ok,
-        (b.Budget IS NULL OR b.Budget >= 0) AS budget_ok
-      FROM s
-      LEFT JOIN b USING (StoreID)
-    ),
-    valid AS (
-      SELECT * FROM j WHERE pk_ok AND rn=1 AND budget_ok
-    )
-    SELECT StoreID, StoreName, EmployeeID, Budget
-    FROM valid;
-    """)
-
-    # 3) CTAS inválidos → logs/invalid
-    run_athena(f"""
-    CREATE TABLE {DB}.tmp_dim_store_invalid_{y}_{int(m_z)}
-    WITH (format='PARQUET', parquet_compression='SNAPPY', external_location='{invalid_loc}')
-    AS
-    WITH s AS (
-      SELECT
-        CAST(StoreID AS INT)         AS StoreID,
+        StoreID,
         TRIM(StoreName)              AS StoreName,
         TRY(CAST(EmployeeID AS INT)) AS EmployeeID,
-        ROW_NUMBER() OVER (PARTITION BY CAST(StoreID AS INT) ORDER BY TRIM(StoreName)) AS rn
-      FROM {DB}.bronze_stores_{y}_{int(m_z)}
+        ROW_NUMBER() OVER (PARTITION BY StoreID ORDER BY ModifiedDate DESC NULLS LAST, TRIM(StoreName)) AS rn,
+        -- versión anterior de un StoreID que cambió (snapshot vs delta): no es un duplicado
+        ModifiedDate IS DISTINCT FROM MAX(ModifiedDate) OVER (PARTITION BY StoreID) AS superseded
+      FROM raw
+    ),
+    s AS (
+      SELECT StoreID, StoreName, EmployeeID, rn FROM v WHERE NOT superseded
     ),
     b AS (
       SELECT
         CAST(StoreID AS INT) AS StoreID,
         TRY(CAST(Budget AS DECIMAL(18,2))) AS Budget
-      FROM {DB}.bronze_storesbudget_{y}_{int(m_z)}
+      FROM {DB}.bronze_storesbudget
+      WHERE run_month = '{y}-{m_z}'
     ),
     j AS (
       SELECT
-        StoreID,
+        StoreID,                 -- OJO: tras USING, no usar s.StoreID
         s.StoreName,
         s.EmployeeID,
         COALESCE(b.Budget, CAST(0 AS DECIMAL(18,2))) AS Budget,
@@ -111,23 +82,25 @@ def run_dim_store(run_month: str):
         (b.Budget IS NULL OR b.Budget >= 0) AS budget_ok
       FROM s
       LEFT JOIN b USING (StoreID)
-    ),
-    invalid AS (
-      SELECT
-        j.*,
-        CASE
-          WHEN NOT pk_ok      THEN 'PK_NULL'
-          WHEN rn > 1         THEN 'DUPLICATE_PK'
-          WHEN NOT budget_ok  THEN 'BUDGET_INVALID'
-          ELSE 'UNKNOWN'
-        END AS REASON
-      FROM j
-      WHERE NOT (pk_ok AND rn=1 AND budget_ok)
     )
-    SELECT StoreID, StoreName, EmployeeID, Budget, REASON
-    FROM invalid;
-    """)
+    SELECT j.*,
+      (pk_ok AND rn=1 AND budget_ok) AS is_valid,
+      CASE
+        WHEN NOT pk_ok      THEN 'PK_NULL'
+        WHEN rn > 1         THEN 'DUPLICATE_PK'
+        WHEN NOT budget_ok  THEN 'BUDGET_INVALID'
+        ELSE 'UNKNOWN'
+      END AS REASON
+    FROM j
+    """,
+        f"tmp_dim_store_{y}_{int(m_z)}", silver_loc,
+        "StoreID, StoreName, EmployeeID, Budget",
+        f"tmp_dim_store_invalid_{y}_{int(m_z)}", invalid_loc,
+        "StoreID, StoreName, EmployeeID, Budget, REASON",
+        after=[stores, deltas, budget],
+    )
 
-    # 4) Limpieza de tablas temporales
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_store_{y}_{int(m_z)};")
-    run_athena(f"DROP TABLE IF EXISTS {DB}.tmp_dim_store_invalid_{y}_{int(m_z)};")
+def run_dim_store(run_month: str):
+    dag = AthenaDag(run_month=run_month)
+    add_dim_store(dag, run_month)
+    return dag.run()
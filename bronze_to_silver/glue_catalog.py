@@ -0,0 +1,148 @@
+# glue_catalog.py
+"""
+Tablas Bronze de larga vida con partition projection, mantenidas por la API de Glue.
+
+Antes cada corrida hacía DROP + CREATE EXTERNAL TABLE bronze_<tabla>_<y>_<m>
+(y CREATE IF NOT EXISTS + ALTER ADD PARTITION para orders): 2-6 round trips
+serie a Athena por tabla y por mes, y cientos de tablas descartables en Glue.
+Ahora:
+  - Una tabla por fuente (bronze_customers, bronze_orders, ...) con
+    projection en run_month (yyyy-MM) o year/month: Athena calcula la
+    ubicación de la partición, no hay ALTER ADD PARTITION.
+  - ensure_table() compara la definición con get_table y solo hace
+    create_table / update_table si falta o cambió; el resultado se recuerda
+    por contenedor, así en caliente no hay ninguna llamada.
+  - drop_table() (tablas tmp de los CTAS) usa delete_table de Glue: es lo
+    mismo que DROP TABLE de una tabla externa, sin pasar por Athena.
+  - Con ATHENA_BACKEND=duckdb las mismas llamadas van al catálogo local que
+    usa el motor de athena_duckdb.py.
+"""
+import os, re, json
+import boto3
+
+if os.environ.get("ATHENA_BACKEND", "athena").lower() == "duckdb":
+    from athena_duckdb import local_glue
+    GLUE = local_glue()
+else:
+    GLUE = boto3.client("glue")
+
+PROJECTION_START = os.environ.get("BRONZE_PROJECTION_START", "2011-01")   # primer run_month
+PROJECTION_YEARS = os.environ.get("BRONZE_PROJECTION_YEARS", "2011,2030")
+
+_CSV_SERDE = {
+    "SerializationLibrary": "org.apache.hadoop.hive.serde2.OpenCSVSerde",
+    "Parameters": {"separatorChar": ",", "quoteChar": '"', "escapeChar": "\\"},
+}
+_ensured = {}   # nombre -> huella de la definición ya verificada en este contenedor
+
+def _base(location):
+    return location if location.endswith("/") else location + "/"
+
+def csv_table(name, columns, location, partition="run_month"):
+    """
+    TableInput de Glue para una Bronze CSV (columnas STRING + skip header).
+    partition: "run_month" -> <location>run_month=yyyy-MM/
+               "year_month" -> <location>year=Y/month=M/ (M sin cero a la izquierda)
+               None         -> todo <location> (p. ej. los deltas por watermark)
+    """
+    location = _base(location)
+    params = {
+        "EXTERNAL": "TRUE",
+        "classification": "csv",
+        "skip.header.line.count": "1",
+    }
+    if partition is None:
+        keys = []
+    elif partition == "run_month":
+        keys = [{"Name": "run_month", "Type": "string"}]
+        params.update({
+            "projection.enabled": "true",
+            "projection.run_month.type": "date",
+            "projection.run_month.format": "yyyy-MM",
+            "projection.run_month.range": f"{PROJECTION_START},NOW",
+            "projection.run_month.interval": "1",
+            "projection.run_month.interval.unit": "MONTHS",
+            "storage.location.template": location + "run_month=${run_month}/",
+        })
+    elif partition == "year_month":
+        keys = [{"Name": "year", "Type": "int"}, {"Name": "month", "Type": "int"}]
+        params.update({
+            "projection.enabled": "true",
+            "projection.year.type": "integer",
+            "projection.year.range": PROJECTION_YEARS,
+            "projection.month.type": "integer",
+            "projection.month.range": "1,12",
+            "storage.location.template": location + "year=${year}/month=${month}/",
+        })
+    else:
+        raise ValueError(f"partition no soportada: {partition}")
+    return {
+        "Name": name.lower(),
+        "TableType": "EXTERNAL_TABLE",
+        "Parameters": params,
+        "PartitionKeys": keys,
+        "StorageDescriptor": {
+            "Columns": [{"Name": c.lower(), "Type": "string"} for c in columns],
+            "Location": location,
+            "InputFormat": "org.apache.hadoop.mapred.TextInputFormat",
+            "OutputFormat": "org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat",
+            "SerdeInfo": _CSV_SERDE,
+        },
+    }
+
+def _shape(t):
+    """Lo que definimos nosotros de una tabla (para comparar con get_table)."""
+    sd = t.get("StorageDescriptor", {})
+    return {
+        "columns": [(c["Name"].lower(), c["Type"].lower()) for c in sd.get("Columns", [])],
+        "location": sd.get("Location"),
+        "serde": (sd.get("SerdeInfo") or {}).get("SerializationLibrary"),
+        "serde_params": (sd.get("SerdeInfo") or {}).get("Parameters") or {},
+        "partitions": [(k["Name"].lower(), k["Type"].lower()) for k in t.get("PartitionKeys", [])],
+        "params": {k: v for k, v in (t.get("Parameters") or {}).items()
+                   if k in ("skip.header.line.count", "storage.location.template") or k.startswith("projection.")},
+    }
+
+def ensure_table(database, table_input):
+    """Crea o actualiza la tabla si su definición difiere. Devuelve "CREATED" | "UPDATED" | "OK"."""
+    name = table_input["Name"]
+    want = _shape(table_input)
+    fp = json.dumps(want, sort_keys=True)
+    if _ensured.get((database, name)) == fp:
+        return "OK"
+    try:
+        have = GLUE.get_table(DatabaseName=database, Name=name)["Table"]
+    except GLUE.exceptions.EntityNotFoundException:
+        GLUE.create_table(DatabaseName=database, TableInput=table_input)
+        action = "CREATED"
+    else:
+        if _shape(have) == want:
+            action = "OK"
+        else:
+            GLUE.update_table(DatabaseName=database, TableInput=table_input)
+            action = "UPDATED"
+    if action != "OK":
+        print(f"GLUE {action} {database}.{name}")
+    _ensured[(database, name)] = fp
+    return action
+
+def drop_table(database, name):
+    """DROP TABLE IF EXISTS vía Glue (tablas externas / tmp de CTAS: no borra datos)."""
+    try:
+        GLUE.delete_table(DatabaseName=database, Name=name.lower())
+    except GLUE.exceptions.EntityNotFoundException:
+        pass
+    _ensured.pop((database, name.lower()), None)
+
+_LEGACY_RX = re.compile(r"^bronze_\w+_\d{4}_\d{1,2}$")
+
+def drop_legacy_monthly_tables(database):
+    """Borra las bronze_<tabla>_<y>_<m> del esquema anterior. Devuelve los nombres borrados."""
+    names = []
+    for page in GLUE.get_paginator("get_tables").paginate(DatabaseName=database):
+        names += [t["Name"] for t in page.get("TableList", []) if _LEGACY_RX.match(t["Name"])]
+    for i in range(0, len(names), 100):   # límite de batch_delete_table
+        GLUE.batch_delete_table(DatabaseName=database, TablesToDelete=names[i:i + 100])
+    if names:
+        print(f"GLUE: {len(names)} tablas bronze mensuales borradas")
+    return names
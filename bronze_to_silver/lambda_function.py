@@ -1,30 +1,62 @@
-from etl_orders import run_orders
-from etl_dim_store import run_dim_store
-from etl_dim_products import run_dim_products
-from etl_dim_customers import run_dim_customers
-from etl_dim_employees import run_dim_employees
+from athena_dag import AthenaDag
+from athena_utils import DB
+from glue_catalog import drop_legacy_monthly_tables
+from etl_orders import add_orders
+from etl_dim_store import add_dim_store
+from etl_dim_products import add_dim_products
+from etl_dim_customers import add_dim_customers
+from etl_dim_employees import add_dim_employees
 import json, logging
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
+# add_dim_* -> tablas Bronze de las que depende (nombres de 'table' en sources.json)
+DIM_INPUTS = {
+    "store":     ["stores", "storesBudget"],
+    "products":  ["products", "productCategories", "productSubcategories"],
+    "customers": ["customers"],
+    "employees": ["employee"],
+}
+
+def _dim_unchanged(dim, dims_status):
+    """True si TODAS las entradas Bronze de la dim vienen marcadas UNCHANGED por ingest."""
+    return all(dims_status.get(t) == "UNCHANGED" for t in DIM_INPUTS[dim])
+
 def handler(event, context):
     log.info(f"EVENT: {json.dumps(event)}")
     run_month = event.get("run_month")  # "YYYY-MM"
     if not run_month:
         raise RuntimeError("Falta run_month (YYYY-MM)")
     refresh_dims = bool(event.get("refresh_dims", False))
+    # opcional: {"customers": "UNCHANGED", ...} tal como lo devuelve ingest_csv_github
+    dims_status = event.get("dims_status") or {}
+
+    # Un solo DAG: orders y las dims no dependen entre sí, sus sentencias se
+    # intercalan hasta max_in_flight consultas a la vez (ATHENA_MAX_IN_FLIGHT)
+    dag = AthenaDag(event.get("max_in_flight"), run_month=run_month)
 
     # Siempre: fact (orders) del mes indicado
-    run_orders(run_month)
+    add_orders(dag, run_month)
 
-    # Dimensiones (SCD1 snapshot por run_month)
+    # Dimensiones (SCD1 snapshot por run_month); se saltan las que no cambiaron
+    dims = {"store": add_dim_store, "products": add_dim_products,
+            "customers": add_dim_customers, "employees": add_dim_employees}
+    skipped = []
     if refresh_dims:
-        run_dim_store(run_month)
-        run_dim_products(run_month)
-        run_dim_customers(run_month)
-        run_dim_employees(run_month)
+        for dim, add in dims.items():
+            if _dim_unchanged(dim, dims_status):
+                log.info(f"SKIP dim {dim}: entradas Bronze UNCHANGED")
+                skipped.append(dim)
+                continue
+            add(dag, run_month)
 
-    result = {"status": "SUCCEEDED", "run_month": run_month, "refresh_dims": refresh_dims}
+    summary = dag.run()
+    summary.pop("nodes")
+    result = {"status": "SUCCEEDED", "run_month": run_month, "refresh_dims": refresh_dims,
+              "skipped_dims": skipped, "athena": summary}
+    # opcional, una vez: borra del catálogo las bronze_<tabla>_<y>_<m> del esquema anterior
+    if event.get("drop_legacy_bronze"):
+        result["legacy_bronze_dropped"] = len(drop_legacy_monthly_tables(DB))
     log.info(f"RESULT: {json.dumps(result)}")
     return result
 
@@ -0,0 +1 @@
+../shared/athena_duckdb.py
\ No newline at end of file
@@ -1,52 +1,61 @@
-import boto3, time, os
+import boto3, os
+from athena_client import AthenaClient, ResultCache, QueryTelemetry, s3_fingerprint
 
-ATHENA = boto3.client("athena")
+S3 = boto3.client("s3")
+# ATHENA_BACKEND=duckdb: misma API ejecutada en local (athena_duckdb.py), sin Athena
+ATHENA_BACKEND = os.environ.get("ATHENA_BACKEND", "athena").lower()
+if ATHENA_BACKEND == "duckdb":
+    from athena_duckdb import local_athena
+    ATHENA = local_athena(S3)
+else:
+    ATHENA = boto3.client("athena")
 
 DB  = os.environ.get("DB", "hack2_aw_catalog")
 WG  = os.environ.get("WORKGROUP", "primary")
 OUT = os.environ["ATHENA_RESULTS"]  # e.g. s3://bg-hack2-aw-datalake2/athena-results/
 
-def run_athena(sql: str, db: str = DB):
+# caché de resultados y telemetría por sentencia en el CONTROL_TABLE
+# (opcional: sin la variable solo ResultReuse de Athena y sin telemetría)
+CONTROL_TABLE = os.environ.get("CONTROL_TABLE")
+_control = boto3.resource("dynamodb").Table(CONTROL_TABLE) if CONTROL_TABLE else None
+CACHE = ResultCache(_control) if _control else None
+TELEMETRY = QueryTelemetry(_control, "h2-factsales-upsert-month") if _control else None
+
+# cliente común (shared/athena_client.py): backoff de polling, reintentos, timeout
+CLIENT = AthenaClient(ATHENA, DB, OUT, WG, cache=CACHE, telemetry=TELEMETRY)
+
+def run_athena(sql: str, db: str = DB, resubmit: int = 1, step: str = None):
     """
     Ejecuta UNA sentencia SQL en Athena y espera a que termine.
-    Devuelve el QueryExecutionId. Lanza excepción si falla.
+    Devuelve el QueryExecutionId. Lanza AthenaError (RuntimeError) si falla.
+    resubmit=0 para sentencias no idempotentes (INSERT).
     """
-    qid = ATHENA.start_query_execution(
-        QueryString=sql,
-        QueryExecutionContext={"Database": db},
-        WorkGroup=WG,
-        ResultConfiguration={"OutputLocation": OUT}
-    )["QueryExecutionId"]
-
-    # Espera activa corta
-    while True:
-        resp = ATHENA.get_query_execution(QueryExecutionId=qid)
-        state = resp["QueryExecution"]["Status"]["State"]
-        if state in ("SUCCEEDED", "FAILED", "CANCELLED"):
-            break
-        time.sleep(0.3)
-
-    if state != "SUCCEEDED":
-        reason = resp["QueryExecution"]["Status"].get("StateChangeReason", "Unknown")
-        raise RuntimeError(f"Athena failed: {state} - {reason}")
-
-    return qid
-
-def get_scalar_int(sql: str, default: int = 0) -> int:
+    stats = CLIENT.run(sql, database=db, resubmit=resubmit, step=step)
+    print("ATHENA STATS:", stats.as_dict())
+    return stats.qid
+
+def table_input(table: str, location: str = None) -> dict:
+    """Huella de una tabla: versión (sube con cada INSERT del cliente) + listado S3 de su LOCATION."""
+    inputs = {f"table:{table}": CLIENT.table_version(table)}
+    if location:
+        inputs[location] = s3_fingerprint(S3, location)
+    return inputs
+
+def s3_input(s3_path: str) -> dict:
+    """Huella de un objeto S3 leído por la consulta (ETag)."""
+    return {s3_path: s3_fingerprint(S3, s3_path)}
+
+def get_scalar_int(sql: str, default: int = 0, inputs: dict = None, step: str = None) -> int:
     """
     Ejecuta una SELECT que devuelve una sola celda numérica (ej: COUNT(*)).
     Athena API devuelve la primera fila como HEADER; usamos la segunda fila.
+    inputs: huellas de lo que lee (table_input / s3_input) -> resultado cacheado.
     """
-    qid = run_athena(sql)
-    res = ATHENA.get_query_results(QueryExecutionId=qid)
-    rows = res.get("ResultSet", {}).get("Rows", [])
+    rows = CLIENT.query(sql, inputs=inputs, max_results=2, step=step)
     # rows[0] = header; rows[1] = first data row (si existe)
-    if len(rows) < 2:
-        return default
-    data = rows[1].get("Data", [])
-    if not data or "VarCharValue" not in data[0]:
+    if len(rows) < 2 or not rows[1] or rows[1][0] is None:
         return default
     try:
-        return int(float(data[0]["VarCharValue"]))
+        return int(float(rows[1][0]))
     except Exception:
         return default
@@ -1,5 +1,6 @@
-import os, re, urllib.parse, json, logging
-from athena_utils import run_athena, get_scalar_int
+import os, re, urllib.parse, logging
+import boto3
+from athena_utils import CLIENT, run_athena, get_scalar_int, table_input, s3_input
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -7,17 +8,43 @@ logger.setLevel(logging.INFO)
 # Ajustar si el bucket / prefijo cambia
 BUCKET = os.environ.get("BUCKET", "bg-hack2-aw-datalake2")
 ORDERS_PREFIX = "bronze/source=github/table=orders/"
+FACT_SALES = "hack2_aw_catalog.fact_sales"
+# LOCATION de fact_sales (athena_etl_warehouse/2_estructura_warehouse/fact_sales.sql)
+FACT_SALES_LOC = os.environ.get("FACT_SALES_LOCATION", f"s3://{BUCKET}/warehouse/fact_sales/")
+
+s3 = boto3.client("s3")
+
+# Bronze puede venir comprimido (sources.json "compression": gzip | zstd)
+CSV_SUFFIXES = (".csv", ".csv.gz", ".csv.zst")
 
 # Regex para extraer run_month del nombre del archivo
-RX_MONTH = re.compile(r"orders_(\d{4}-\d{2})\.csv$")
+RX_MONTH = re.compile(r"orders_(\d{4}-\d{2})\.csv(?:\.gz|\.zst)?$")
+# Carpeta Hive del mes (ext_orders: PARTITIONED BY year, month con projection)
+RX_PARTITION = re.compile(r"/year=(\d{4})/month=(\d{1,2})/[^/]+$")
 
 def parse_run_month_from_key(key: str):
     m = RX_MONTH.search(key)
     return m.group(1) if m else None
 
+def parse_partition_from_key(key: str):
+    """(year, month) de .../year=Y/month=M/orders_...; None si el objeto está en el layout plano."""
+    m = RX_PARTITION.search(key)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+def month_partition(run_month: str) -> str:
+    y, m = run_month.split("-")
+    return f"year={int(y)}/month={int(m)}/"
+
 def make_s3_path(bucket: str, key: str) -> str:
     return f"s3://{bucket}/{key}"
 
+def find_orders_key(run_month: str) -> str:
+    """Key del mes en Bronze con la extensión que tenga (.csv, .csv.gz, .csv.zst)."""
+    base = f"{ORDERS_PREFIX}{month_partition(run_month)}orders_{run_month}.csv"
+    resp = s3.list_objects_v2(Bucket=BUCKET, Prefix=base)
+    keys = [o["Key"] for o in resp.get("Contents", []) if o["Key"].endswith(CSV_SUFFIXES)]
+    return sorted(keys)[0] if keys else base
+
 def sql_count_month(run_month: str) -> str:
     return f"""
     SELECT COUNT(*) AS n
@@ -25,14 +52,17 @@ def sql_count_month(run_month: str) -> str:
     WHERE RunMonth = '{run_month}'
     """
 
-def sql_count_file_rows(s3_path: str) -> str:
+# year/month primero: con projection Athena lista y planifica solo la carpeta del mes;
+# "$path" deja solo el archivo del evento dentro de ella.
+def sql_count_file_rows(s3_path: str, year: int, month: int) -> str:
     return f"""
     SELECT COUNT(*) AS n
     FROM hack2_aw_catalog.ext_orders
-    WHERE "$path" = '{s3_path}'
+    WHERE year = {year} AND month = {month}
+      AND "$path" = '{s3_path}'
     """
 
-def sql_insert_for(s3_path: str, run_month: str) -> str:
+def sql_insert_for(s3_path: str, run_month: str, year: int, month: int) -> str:
     # Una sola sentencia (INSERT). El DELETE se evita gracias al "skip si ya existe".
     return f"""
     INSERT INTO hack2_aw_catalog.fact_sales
@@ -56,7 +86,8 @@ def sql_insert_for(s3_path: str, run_month: str) -> str:
       o.LineTotal,
       '{run_month}'             AS RunMonth
     FROM hack2_aw_catalog.ext_orders o
-    WHERE "$path" = '{s3_path}'
+    WHERE o.year = {year} AND o.month = {month}
+      AND "$path" = '{s3_path}'
     """
 
 def process_one_object(bucket: str, key: str):
@@ -64,8 +95,9 @@ def process_one_object(bucket: str, key: str):
     Procesa un solo objeto S3 si y solo si:
       - Está bajo bronze/source...
       - Contiene table=orders/
-      - Termina en .csv
-      - Cumple patrón orders_YYYY-MM.csv
+      - Termina en .csv (o .csv.gz / .csv.zst)
+      - Cumple patrón orders_YYYY-MM.csv[.gz|.zst]
+      - Está en la carpeta de su mes: .../year=YYYY/month=M/
     """
     if bucket != BUCKET:
         return {"key": key, "status": "IGNORED_OTHER_BUCKET"}
@@ -75,7 +107,7 @@ def process_one_object(bucket: str, key: str):
         return {"key": key, "status": "IGNORED_PREFIX"}
     if "table=orders/" not in key:
         return {"key": key, "status": "IGNORED_NOT_ORDERS"}
-    if not key.endswith(".csv"):
+    if not key.endswith(CSV_SUFFIXES):
         return {"key": key, "status": "IGNORED_NOT_CSV"}
 
     run_month = parse_run_month_from_key(key)
@@ -83,37 +115,51 @@ def process_one_object(bucket: str, key: str):
         # Ej.: bronze/source=github/table=orders/some_file.csv → lo ignoramos
         return {"key": key, "status": "IGNORED_BAD_NAME"}
 
+    partition = parse_partition_from_key(key)
+    if partition is None:
+        # Layout plano anterior: ext_orders ya no lo lee (mover con migrate_orders_layout.py)
+        return {"key": key, "run_month": run_month, "status": "IGNORED_NOT_PARTITIONED"}
+    if "%04d-%02d" % partition != run_month:
+        return {"key": key, "run_month": run_month, "status": "IGNORED_PARTITION_MISMATCH"}
+    year, month = partition
+
     s3_path = make_s3_path(bucket, key)
     logger.info(f"Processing {s3_path} run_month={run_month}")
+    CLIENT.run_month = run_month   # etiqueta de la telemetría de las consultas de este objeto
 
+    # Los COUNT se cachean por huella de entradas: re-procesar el mismo evento sin
+    # cambios no vuelve a escanear; el INSERT de abajo invalida los de fact_sales.
     # 1) ¿ya existe ese mes en fact_sales?
-    n_month = get_scalar_int(sql_count_month(run_month), default=0)
+    n_month = get_scalar_int(sql_count_month(run_month), default=0,
+                             inputs=table_input(FACT_SALES, FACT_SALES_LOC), step="count_month")
     if n_month > 0:
         logger.info(f"RunMonth {run_month} already present ({n_month} rows). Skipping.")
         return {"key": key, "run_month": run_month, "status": "SKIPPED_EXISTS", "rows_existing": n_month}
 
     # 2) ¿el archivo tiene filas?
-    n_file = get_scalar_int(sql_count_file_rows(s3_path), default=0)
+    n_file = get_scalar_int(sql_count_file_rows(s3_path, year, month), default=0, inputs=s3_input(s3_path),
+                            step="count_file")
     if n_file == 0:
         logger.info(f"File has 0 rows. Skipping insert. path={s3_path}")
         return {"key": key, "run_month": run_month, "status": "SKIPPED_EMPTY_FILE", "rows_file": 0}
 
     # 3) INSERT solo ese archivo
-    sql = sql_insert_for(s3_path, run_month)
-    run_athena(sql)
+    sql = sql_insert_for(s3_path, run_month, year, month)
+    run_athena(sql, resubmit=0, step="insert_month")   # INSERT no idempotente: nunca re-enviar
     logger.info(f"Inserted month {run_month} from {s3_path} (file_rows_estimate={n_file})")
 
     # 4) Confirmación post-insert
-    n_after = get_scalar_int(sql_count_month(run_month), default=0)
+    n_after = get_scalar_int(sql_count_month(run_month), default=0,
+                             inputs=table_input(FACT_SALES, FACT_SALES_LOC), step="count_month_after")
     return {"key": key, "run_month": run_month, "status": "SUCCEEDED", "rows_inserted": n_after}
 
 
-def lambda_handler(event, context):
+def _handle(event, context):
     """
     Soporta:
       - Evento S3 (Records[])
       - Invocación manual: {"run_month":"YYYY-MM"} (procesa el archivo con ese nombre)
-      - Invocación manual: {"s3_key":"bronze/source=github/table=orders/orders_YYYY-MM.csv"}
+      - Invocación manual: {"s3_key":"bronze/source=github/table=orders/year=YYYY/month=M/orders_YYYY-MM.csv"}
     """
     results = []
 
@@ -143,8 +189,8 @@ def lambda_handler(event, context):
         return {"results": results}
 
     if run_month:
-        # Construye el key estándar para ese mes
-        key = f"{ORDERS_PREFIX}orders_{run_month}.csv"
+        # Construye el key estándar para ese mes (respetando la compresión usada)
+        key = find_orders_key(run_month)
         try:
             results.append(process_one_object(BUCKET, key))
         except Exception as e:
@@ -154,3 +200,9 @@ def lambda_handler(event, context):
 
     # Si no reconocemos el formato del evento
     return {"results": [], "status": "IGNORED_NO_INPUT"}
+
+def lambda_handler(event, context):
+    try:
+        return _handle(event, context)
+    finally:
+        CLIENT.flush()   # telemetría de las consultas al CONTROL_TABLE
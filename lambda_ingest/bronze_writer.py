@@ -0,0 +1,286 @@
+# bronze_writer.py
+"""
+Writers de Bronze configurados desde el manifest (sources.json).
+
+Por fuente:
+  "format": "csv" (default) | "parquet"
+  "parquet_compression": "snappy" (default) | "zstd"
+  "archive_csv": true          # con format=parquet, deja además la copia CSV cruda
+  "schema": {"Col": "int"}     # int | bigint | double | decimal(p,s) | boolean | string
+  "parquet_prefix": "..."      # opcional
+  "compression": "gzip" | "zstd"   # solo CSV; Athena detecta el codec por extensión
+  "partitioning": "year-month"     # objetos mensuales en carpetas Hive year=Y/month=M/
+
+- CSV:     <target_bronze_prefix>[year=Y/month=M/]<name>.csv[.gz|.zst]
+- Parquet: <parquet_prefix o bronze/.../table=<t>_parquet/>[year=Y/month=M/]<name>.parquet
+  (prefijo hermano: Athena lee recursivamente la LOCATION de las tablas CSV,
+   así que el Parquet no puede quedar debajo de ella)
+
+Las columnas sin tipo en "schema" quedan como string. Los valores que no
+convierten al tipo declarado se escriben como null (mismo criterio que
+TRY(CAST(...)) en silver); la copia CSV conserva el valor crudo.
+pyarrow solo se importa si alguna fuente pide Parquet.
+"""
+import io, re
+from decimal import Decimal, InvalidOperation
+from s3_stream import CsvS3Writer, S3MultipartWriter, compression_ext, COMPRESSION_EXT
+
+ROW_GROUP_SIZE = 100_000
+_DECIMAL_RX = re.compile(r"decimal\((\d+)\s*,\s*(\d+)\)", re.I)
+
+def bronze_format(src):
+    return (src.get("format") or "csv").lower()
+
+def parquet_prefix(src):
+    return src.get("parquet_prefix") or src['target_bronze_prefix'].rstrip("/") + "_parquet/"
+
+def month_partition(src, run_month):
+    """
+    Subcarpeta Hive del mes ("year=2012/month=7/", mes sin cero: igual que la
+    projection integer de bronze_orders / ext_orders) si la fuente declara
+    "partitioning": "year-month"; "" en otro caso.
+    """
+    if (src.get("partitioning") or "").lower() != "year-month":
+        return ""
+    y, m = run_month.split("-")
+    return f"year={int(y)}/month={int(m)}/"
+
+def csv_key(src, name, csv_prefix=None, compression=None, partition=""):
+    return f"{csv_prefix or src['target_bronze_prefix']}{partition}{name}.csv{compression_ext(compression)}"
+
+def bronze_key(src, name, csv_prefix=None, partition=""):
+    """Key del objeto principal (el que se usa para idempotencia y control)."""
+    if bronze_format(src) == "parquet":
+        return f"{parquet_prefix(src)}{partition}{name}.parquet"
+    return csv_key(src, name, csv_prefix, src.get("compression"), partition)
+
+def _stale_csv_keys(src, name, csv_prefix, current, partition=""):
+    """Variantes del mismo CSV con otra compresión: si quedan, Athena las leería duplicadas."""
+    keys = [csv_key(src, name, csv_prefix, c, partition) for c in [None] + list(COMPRESSION_EXT)]
+    return [k for k in keys if k != current]
+
+def open_bronze_writer(s3, bucket, src, name, fieldnames, csv_prefix=None, header_if_empty=True,
+                       partition=""):
+    """
+    Devuelve un writer con writerow/close/abort/rows/key según el formato de la fuente.
+    Con format=parquet + archive_csv=true escribe ambos en la misma pasada.
+    """
+    compression = src.get("compression")
+    ckey = csv_key(src, name, csv_prefix, compression, partition)
+    writers = []
+    if bronze_format(src) == "parquet":
+        writers.append(ParquetS3Writer(s3, bucket, bronze_key(src, name, partition=partition), fieldnames,
+                                       schema=src.get("schema") or {},
+                                       compression=src.get("parquet_compression", "snappy")))
+    if bronze_format(src) != "parquet" or src.get("archive_csv"):
+        writers.append(CsvS3Writer(s3, bucket, ckey, fieldnames,
+                                   header_if_empty=header_if_empty, compression=compression))
+        # al activar compresión, el .csv plano previo se borra para no duplicar filas en Athena
+        stale = _stale_csv_keys(src, name, csv_prefix, ckey, partition) if compression_ext(compression) else []
+    else:
+        stale = []
+    if len(writers) == 1 and not stale:
+        return writers[0]
+    return TeeWriter(writers, s3=s3, bucket=bucket, stale_keys=stale)
+
+# ---------- Conversión de tipos ----------
+def _to_int(v):
+    v = v.strip()
+    if not v:
+        return None
+    try:
+        return int(v)
+    except ValueError:
+        f = float(v)
+        return int(f) if f.is_integer() else None
+
+def _to_float(v):
+    v = v.strip()
+    return float(v) if v else None
+
+def _to_bool(v):
+    v = v.strip().upper()
+    if v in ("1", "TRUE", "Y", "YES"):
+        return True
+    if v in ("0", "FALSE", "N", "NO"):
+        return False
+    return None
+
+def _converter(type_name):
+    """(tipo pyarrow, función str -> valor) para un tipo declarado en el manifest."""
+    import pyarrow as pa
+    t = (type_name or "string").strip().lower()
+    m = _DECIMAL_RX.fullmatch(t)
+    if m:
+        p, s = int(m.group(1)), int(m.group(2))
+        q = Decimal(1).scaleb(-s)
+        def _to_dec(v):
+            v = v.strip()
+            return Decimal(v).quantize(q) if v else None
+        return pa.decimal128(p, s), _to_dec
+    if t in ("int", "integer"):
+        return pa.int32(), _to_int
+    if t in ("bigint", "long"):
+        return pa.int64(), _to_int
+    if t in ("double", "float"):
+        return pa.float64(), _to_float
+    if t in ("boolean", "bool"):
+        return pa.bool_(), _to_bool
+    return pa.string(), None
+
+def _to_str(v):
+    return None if v is None else str(v)
+
+def _safe(conv):
+    def f(v):
+        if v is None:
+            return None
+        try:
+            return conv(str(v))
+        except (ValueError, ArithmeticError, InvalidOperation):
+            return None
+    return f
+
+# ---------- Writers ----------
+class ParquetS3Writer:
+    """
+    Acumula filas por columnas hasta ROW_GROUP_SIZE y escribe un row group
+    por bloque sobre un S3MultipartWriter (memoria ~ un row group + una parte).
+    """
+    def __init__(self, s3, bucket, key, fieldnames, schema=None, compression="snappy",
+                 row_group_size=ROW_GROUP_SIZE):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("format=parquet requiere pyarrow en el paquete/capa de la Lambda") from e
+        self._pa, self._pq = pa, pq
+        self.fieldnames = list(fieldnames or [])
+        schema = schema or {}
+        fields, self._convs = [], []
+        for name in self.fieldnames:
+            pa_type, conv = _converter(schema.get(name))
+            fields.append(pa.field(name, pa_type))
+            self._convs.append(_safe(conv) if conv else _to_str)
+        self.schema = pa.schema(fields)
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._cols = [[] for _ in self.fieldnames]
+        self._pending = 0
+        self._out = S3MultipartWriter(s3, bucket, key)
+        self._writer = None
+
+    @property
+    def key(self):
+        return self._out.key
+
+    @property
+    def bytes_written(self):
+        return self._out.bytes_written
+
+    def writerow(self, row):
+        for i, name in enumerate(self.fieldnames):
+            self._cols[i].append(self._convs[i](row.get(name)))
+        self.rows += 1
+        self._pending += 1
+        if self._pending >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        pa = self._pa
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(_Sink(self._out), self.schema, compression=self.compression)
+        if self._pending:
+            arrays = [pa.array(col, type=f.type) for col, f in zip(self._cols, self.schema)]
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self._cols = [[] for _ in self.fieldnames]
+        self._pending = 0
+
+    def close(self):
+        self._flush()          # también crea un Parquet válido (solo schema) si no hubo filas
+        self._writer.close()
+        self._out.close()
+
+    def abort(self):
+        self._out.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+class _Sink(io.RawIOBase):
+    """Adaptador file-like (solo escritura) de S3MultipartWriter para pyarrow."""
+    def __init__(self, out):
+        self._out = out
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._out.write(bytes(b))
+        return len(b)
+
+    def tell(self):
+        return self._out.bytes_written
+
+    def close(self):
+        # el cierre real (complete_multipart_upload) lo hace ParquetS3Writer
+        super().close()
+
+class TeeWriter:
+    """
+    Escribe las mismas filas en varios writers (p. ej. Parquet + CSV de archivo).
+    Al cerrar bien, borra stale_keys (variantes previas con otra compresión).
+    """
+    def __init__(self, writers, s3=None, bucket=None, stale_keys=()):
+        self.writers = writers
+        self.s3 = s3
+        self.bucket = bucket
+        self.stale_keys = list(stale_keys)
+
+    @property
+    def rows(self):
+        return self.writers[0].rows
+
+    @property
+    def key(self):
+        return self.writers[0].key
+
+    @property
+    def keys(self):
+        return [w.key for w in self.writers]
+
+    @property
+    def bytes_written(self):
+        return sum(w.bytes_written for w in self.writers)
+
+    def writerow(self, row):
+        for w in self.writers:
+            w.writerow(row)
+
+    def close(self):
+        for w in self.writers:
+            w.close()
+        for k in self.stale_keys:
+            self.s3.delete_object(Bucket=self.bucket, Key=k)
+
+    def abort(self):
+        for w in self.writers:
+            w.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,225 @@
+# connectors.py
+"""
+Lectores por tipo de fuente (type en sources.json) para engine.py.
+
+  csv_github  url_or_query = URL del CSV (streaming HTTP; GET condicional opcional)
+  mysql       url_or_query = SQL; credenciales en Secrets Manager (secret_name),
+              conexión reutilizada entre invocaciones (mysql_conn); admite
+              rangos de pk en paralelo (pk_ranges)
+  excel       un .xlsx del inbox (excel_source_prefix) en modo read_only;
+              columnas StoreID/Budget
+
+READERS (type -> lector) y BOUNDS (type -> MIN/MAX del pk) al final del módulo
+son la tabla que usa engine.py; un tipo nuevo se agrega ahí.
+pymysql y openpyxl se importan solo al abrir una fuente de ese tipo.
+"""
+import os, queue, shutil, tempfile, threading
+from contextlib import contextmanager
+import boto3
+from source_rows import SourceRows
+from s3_stream import open_csv_url
+from watermark import watermark_config, incremental_query
+from mysql_conn import CONNECTIONS
+from pk_ranges import pk_column, bounds_query, range_query
+from excel_inbox import list_inbox
+from money_normalizer import MoneyNormalizer
+
+BUCKET = os.environ['BUCKET_NAME']
+s3 = boto3.client('s3')
+
+# ---------- csv_github ----------
+@contextmanager
+def open_csv_github(src, etag=None, last_modified=None, encoding='utf-8'):
+    """Entrega None si la fuente responde 304 al GET condicional."""
+    with open_csv_url(src['url_or_query'], encoding=encoding, etag=etag, last_modified=last_modified) as reader:
+        if reader is None:
+            yield None
+            return
+        meta = {"etag": reader.http_headers.get("ETag"),
+                "last_modified": reader.http_headers.get("Last-Modified")}
+        yield SourceRows(reader.fieldnames, reader, meta=meta)
+
+# ---------- mysql ----------
+FETCH_SIZE = int(os.environ.get("MYSQL_FETCH_SIZE", "5000"))
+PREFETCH_BATCHES = int(os.environ.get("MYSQL_PREFETCH_BATCHES", "2"))
+def _prefetch(fetch_batch, depth=PREFETCH_BATCHES):
+    """
+    Lee lotes con fetch_batch() en un hilo propio, hasta `depth` lotes por
+    delante del consumidor: el siguiente fetchmany corre mientras se sube el
+    lote actual. Memoria acotada a (depth + 1) lotes.
+    """
+    q = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _producer():
+        try:
+            while not stop.is_set():
+                batch = fetch_batch()
+                if not batch:
+                    break
+                if not _put(("batch", batch)):
+                    return
+            _put(("done", None))
+        except BaseException as e:
+            _put(("error", e))
+
+    t = threading.Thread(target=_producer, name="mysql-fetch", daemon=True)
+    t.start()
+    try:
+        while True:
+            kind, val = q.get()
+            if kind == "batch":
+                yield val
+            elif kind == "error":
+                raise val
+            else:
+                return
+    finally:
+        stop.set()
+        t.join()
+
+@contextmanager
+def open_mysql(src, secret_name=None, fetch_size=FETCH_SIZE, since=None, pk_range=None):
+    """
+    Ejecuta src["url_or_query"] con un cursor de servidor (SSDictCursor, sin
+    buffer en el cliente) y entrega lotes de fetchmany(fetch_size) en streaming.
+    Las columnas salen de los alias del SELECT.
+    since: solo filas con la columna watermark > since (extracción incremental).
+    pk_range: solo el rango de pk indicado (ver pk_ranges.split_ranges).
+    """
+    import pymysql
+    secret = secret_name or src.get("secret_name") or os.environ['MYSQL_SECRET_NAME']
+    conn = CONNECTIONS.get(secret)   # reutilizada entre invocaciones en caliente
+    connect = dict(CONNECTIONS.stats)
+    print("METRIC mysql_connect:", connect)
+    batches, clean = None, False
+    try:
+        cur = conn.cursor(pymysql.cursors.SSDictCursor)
+        if pk_range is not None:
+            query, params = range_query(src['url_or_query'], pk_column(src), pk_range)
+        elif since is None:
+            query, params = src['url_or_query'], None
+        else:
+            query, params = incremental_query(src['url_or_query'], watermark_config(src)["column"]), (since,)
+        cur.execute(query, params)
+        fieldnames = [d[0] for d in cur.description]
+        batches = _prefetch(lambda: cur.fetchmany(fetch_size))
+        yield SourceRows.from_batches(fieldnames, batches, meta={"query": query, "connect": connect})
+        cur.close()
+        clean = True
+    finally:
+        if batches is not None:
+            batches.close()   # detiene el hilo de fetch antes de soltar la conexión
+        if clean:
+            CONNECTIONS.release(secret, conn)
+        else:
+            # con SSCursor, cerrar la conexión descarta el resto del result set sin leerlo
+            CONNECTIONS.discard(conn)
+
+def mysql_pk_bounds(src, column, secret_name=None):
+    """(MIN, MAX) de la columna pk sobre el SELECT del manifest."""
+    secret = secret_name or src.get("secret_name") or os.environ['MYSQL_SECRET_NAME']
+    conn = CONNECTIONS.get(secret)
+    try:
+        cur = conn.cursor()
+        cur.execute(bounds_query(src['url_or_query'], column))
+        row = cur.fetchone() or {}
+        cur.close()
+    except Exception:
+        CONNECTIONS.discard(conn)
+        raise
+    CONNECTIONS.release(secret, conn)
+    return row.get("lo"), row.get("hi")
+
+# ---------- excel ----------
+EXCEL_FIELDS = ['StoreID', 'Budget']
+_SID_HEADERS = ["storeid", "store_id", "id", "tienda", "store"]
+_BUDGET_HEADERS = ["budget", "presupuesto", "monto", "importe"]
+
+def _excel_header(rows):
+    """
+    Avanza `rows` (iter_rows values_only) hasta el encabezado: primera fila con
+    al menos 2 celdas no vacías. Devuelve (idx_sid, idx_bud, headers).
+    """
+    for row in rows:
+        if row and sum(1 for c in row if c not in (None, "")) >= 2:
+            headers = [str(c).strip().lower() if c is not None else "" for c in row]
+            def _idx(options):
+                for name in options:
+                    if name in headers:
+                        return headers.index(name)
+                return None
+            return _idx(_SID_HEADERS), _idx(_BUDGET_HEADERS), headers
+    raise RuntimeError("No se encontró fila de encabezado en la hoja")
+
+def _excel_rows(rows, idx_sid, idx_bud, money):
+    for row in rows:
+        if row is None: continue
+        sid = row[idx_sid] if idx_sid < len(row) else None
+        bud = row[idx_bud] if idx_bud < len(row) else None
+        if sid in (None, "") or bud in (None, ""):
+            continue
+        # normaliza valores
+        sid_str = str(sid).strip()
+        bud_clean = money.normalize(bud)
+        if not sid_str or not bud_clean:
+            continue
+        yield {'StoreID': sid_str, 'Budget': bud_clean}
+
+EXCEL_SPOOL_BYTES = int(os.environ.get("EXCEL_SPOOL_MB", "64")) * 1024 * 1024
+
+@contextmanager
+def open_excel(src, key=None, sheet_name=None):
+    """
+    Lee el .xlsx `key` (por defecto el primero del inbox; ver excel_inbox) en modo
+    read_only: las filas se leen en streaming del XML de la hoja, sin armar el
+    modelo de celdas completo, y el encabezado se detecta en la misma pasada.
+    Budget se normaliza con el formato monetario detectado para la columna
+    (money_normalizer). meta = {"source_key", "source_etag", "money"}.
+    """
+    from openpyxl import load_workbook
+    sheet_name = sheet_name or os.environ.get('EXCEL_SHEET_NAME', 'storesBudget')
+
+    # 1) sin key explícita: el primer .xlsx del inbox
+    if key is None:
+        inbox = src.get("excel_source_prefix") or os.environ['EXCEL_SOURCE_PREFIX']
+        files = list_inbox(s3, BUCKET, inbox)
+        if not files:
+            raise RuntimeError(f"No se encontró .xlsx en s3://{BUCKET}/{inbox}")
+        key = files[0]["Key"]
+
+    # 2) el zip se baja a un archivo temporal (en memoria hasta EXCEL_SPOOL_MB)
+    obj = s3.get_object(Bucket=BUCKET, Key=key)
+    with tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_BYTES) as tmp:
+        shutil.copyfileobj(obj['Body'], tmp, 1024 * 1024)
+        tmp.seek(0)
+        wb = load_workbook(tmp, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.worksheets[0]
+
+            # 3) encabezado y filas en una sola pasada sobre la hoja
+            rows = ws.iter_rows(values_only=True)
+            idx_sid, idx_bud, headers = _excel_header(rows)
+            if idx_sid is None or idx_bud is None:
+                raise RuntimeError(f"No se hallaron columnas StoreID/Budget en encabezados: {headers}")
+
+            # formato monetario de la columna Budget detectado una vez con una muestra
+            money, rows = MoneyNormalizer.from_rows(rows, lambda r: r[idx_bud] if r and idx_bud < len(r) else None)
+            meta = {"source_key": key, "source_etag": obj.get('ETag'), "money": money}
+            yield SourceRows(EXCEL_FIELDS, _excel_rows(rows, idx_sid, idx_bud, money), meta=meta)
+            print("METRIC money_normalizer:", money.report())
+        finally:
+            wb.close()   # read_only deja el archivo abierto hasta close()
+
+# ---------- tabla de lectores (engine.open_source / engine._plan_ranges) ----------
+READERS = {"csv_github": open_csv_github, "mysql": open_mysql, "excel": open_excel}
+BOUNDS = {"mysql": mysql_pk_bounds}
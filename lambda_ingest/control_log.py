@@ -0,0 +1,120 @@
+# control_log.py
+"""
+Logging de control/errores en DynamoDB, compartido por las Lambdas de ingest.
+
+- Los Table/resource se crean una vez (por hilo) y se reutilizan entre
+  invocaciones en caliente.
+- control()/error() solo encolan el item en memoria (thread-safe): no hay
+  round trip a DynamoDB dentro del loop de filas/meses.
+- flush() se llama en los límites de etapa y al salir del handler; envía
+  lotes de 25 con BatchWriteItem y reintenta UnprocessedItems con backoff
+  exponencial + jitter (batch_writer de boto3 los reenvía sin espera).
+- Un fallo de logging nunca rompe la ingesta: se imprime y se sigue.
+
+Esquema de claves (el mismo que usan los get_item de checkpoints, huellas,
+watermarks y la caché de Athena):
+  - CONTROL_TABLE: hash key run_id (sin sort key). Por eso cada item lleva un
+    run_id propio: "<run_id>#<tabla>", "fingerprint#...", "watermark#...".
+  - ERROR_TABLE: hash key run_id + sort key ts.
+"""
+import os, time, random, threading
+import boto3
+from botocore.exceptions import ClientError
+
+BATCH_SIZE = 25                      # límite de BatchWriteItem
+MAX_RETRIES = int(os.environ.get("LOG_MAX_RETRIES", "6"))
+BASE_DELAY = 0.05                    # segundos
+MAX_DELAY = 2.0
+CONTROL_KEYS = ("run_id",)
+ERROR_KEYS = ("run_id", "ts")
+
+class ControlLogger:
+    def __init__(self, control_table, error_table,
+                 control_keys=CONTROL_KEYS, error_keys=ERROR_KEYS):
+        self.control_table = control_table
+        self.error_table = error_table
+        # atributos clave por tabla: dentro de un lote, el último item con la misma
+        # clave gana (igual que put_item secuencial y evita claves duplicadas en el lote)
+        self.key_attrs = {control_table: tuple(control_keys), error_table: tuple(error_keys)}
+        self._lock = threading.Lock()
+        self._buf = {}               # table_name -> [items]
+        self._local = threading.local()
+
+    # ---------- recursos cacheados ----------
+    def _resource(self):
+        # los resources de boto3 no son thread-safe: uno por hilo, reutilizado
+        if not hasattr(self._local, "resource"):
+            self._local.resource = boto3.session.Session().resource('dynamodb')
+            self._local.tables = {}
+        return self._local.resource
+
+    def table(self, name):
+        res = self._resource()
+        t = self._local.tables.get(name)
+        if t is None:
+            t = self._local.tables[name] = res.Table(name)
+        return t
+
+    # ---------- encolado ----------
+    def put(self, table_name, item):
+        with self._lock:
+            self._buf.setdefault(table_name, []).append(item)
+
+    def control(self, item):
+        self.put(self.control_table, item)
+
+    def error(self, item):
+        self.put(self.error_table, item)
+
+    def pending(self):
+        with self._lock:
+            return sum(len(v) for v in self._buf.values())
+
+    # ---------- envío ----------
+    def flush(self):
+        """Envía todo lo encolado. Devuelve el número de items que no se pudieron escribir."""
+        with self._lock:
+            buf, self._buf = self._buf, {}
+        failed = 0
+        for table_name, items in buf.items():
+            items = self._dedupe(items, self.key_attrs.get(table_name, CONTROL_KEYS))
+            for i in range(0, len(items), BATCH_SIZE):
+                failed += self._write_batch(table_name, items[i:i + BATCH_SIZE])
+        return failed
+
+    def _dedupe(self, items, key_attrs):
+        by_key = {}
+        for it in items:
+            k = tuple(it.get(a) for a in key_attrs)
+            by_key.pop(k, None)      # conserva el orden de la última escritura
+            by_key[k] = it
+        return list(by_key.values())
+
+    def _write_batch(self, table_name, items):
+        res = self._resource()
+        request = {table_name: [{"PutRequest": {"Item": it}} for it in items]}
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                resp = res.batch_write_item(RequestItems=request)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") == "ValidationException":
+                    # p. ej. items que no respetan el esquema de claves: reintentar no sirve
+                    print(f"LOG BATCH ERROR ({table_name}):", e)
+                    return sum(len(v) for v in request.values())
+                print(f"LOG BATCH ERROR ({table_name}) intento {attempt + 1}:", e)
+                if attempt == MAX_RETRIES:
+                    return sum(len(v) for v in request.values())
+            except Exception as e:
+                print(f"LOG BATCH ERROR ({table_name}) intento {attempt + 1}:", e)
+                if attempt == MAX_RETRIES:
+                    return sum(len(v) for v in request.values())
+            else:
+                request = resp.get("UnprocessedItems") or {}
+                if not request:
+                    return 0
+                if attempt == MAX_RETRIES:
+                    break
+            time.sleep(min(MAX_DELAY, BASE_DELAY * (2 ** attempt)) * (0.5 + random.random()))
+        left = sum(len(v) for v in request.values())
+        print(f"LOG BATCH ERROR ({table_name}): {left} items sin procesar tras {MAX_RETRIES} reintentos")
+        return left
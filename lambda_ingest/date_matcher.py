@@ -0,0 +1,159 @@
+# date_matcher.py
+"""
+Detección del formato de fecha UNA vez por archivo y parser compilado por fila.
+
+Antes: por cada fila se probaban hasta 7 datetime.strptime capturando excepciones.
+Ahora:
+  - DateMatcher.detect() usa el date_format del manifest si interpreta alguna
+    fila de la muestra (así cada fila sale igual que con el cascade, que lo
+    prueba primero); solo si no interpreta ninguna elige otro con la muestra.
+  - year_month() usa una regex precompilada (sin strptime) y solo cae al
+    cascade original para filas que no cumplen el formato detectado.
+  - Las filas fuera de formato se cuentan y se guardan algunas muestras.
+"""
+import re, calendar
+from datetime import datetime
+from itertools import islice, chain
+
+# formato strptime -> regex con grupos y/m/d (admite hora al final: "T..." o " ...")
+_REGEX = {
+    "%m/%d/%Y": r"(?P<m>\d{1,2})/(?P<d>\d{1,2})/(?P<y>\d{4})",
+    "%m-%d-%Y": r"(?P<m>\d{1,2})-(?P<d>\d{1,2})-(?P<y>\d{4})",
+    "%Y-%m-%d": r"(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})",
+    "%Y/%m/%d": r"(?P<y>\d{4})/(?P<m>\d{1,2})/(?P<d>\d{1,2})",
+    "%d-%m-%Y": r"(?P<d>\d{1,2})-(?P<m>\d{1,2})-(?P<y>\d{4})",
+}
+_COMPILED = {f: re.compile(r"\s*" + rx + r"(?:[T\s]|$)") for f, rx in _REGEX.items()}
+# posición de (y, m, d) dentro de match.groups() para cada formato
+_ORDER = {f: tuple(rx.groupindex[g] - 1 for g in ("y", "m", "d")) for f, rx in _COMPILED.items()}
+
+# patrón declarado en sources.json -> formato strptime
+MANIFEST_FORMATS = {
+    "M/d/yyyy": "%m/%d/%Y", "MM/dd/yyyy": "%m/%d/%Y",
+    "MM-dd-yyyy": "%m-%d-%Y", "M-d-yyyy": "%m-%d-%Y",
+}
+# alternativas comunes (mismo orden que el cascade original)
+FALLBACK_FORMATS = ["%Y-%m-%d", "%Y/%m/%d", "%d-%m-%Y", "%m/%d/%Y", "%m-%d-%Y"]
+
+SAMPLE_SIZE = 200
+MAX_MISMATCH_SAMPLES = 5
+
+def candidate_formats(pattern):
+    fmts = []
+    if pattern in MANIFEST_FORMATS:
+        fmts.append(MANIFEST_FORMATS[pattern])
+    return fmts + FALLBACK_FORMATS
+
+def parse_year_month_slow(date_str, pattern):
+    """
+    Cascade original (strptime por formato). Se usa solo como fallback.
+    Devuelve (year, month) o None.
+    """
+    if not date_str:
+        return None
+    date_str = date_str.strip().split("T")[0].split(" ")[0]
+    for f in candidate_formats(pattern):
+        try:
+            dt = datetime.strptime(date_str, f)
+            return dt.year, dt.month
+        except Exception:
+            continue
+    return None
+
+def date_validator(pattern=None):
+    """
+    Predicado value -> bool ("es una fecha válida") compilado una vez:
+    regex de los formatos candidatos, sin strptime por fila.
+    """
+    parsers = [(_COMPILED[f].match, _ORDER[f]) for f in dict.fromkeys(candidate_formats(pattern))]
+    def is_valid(value):
+        if not value:
+            return False
+        return any(_fast_parse(match, order, value) is not None for match, order in parsers)
+    return is_valid
+
+class DateMatcher:
+    """
+    Parser de (year, month) compilado para un formato concreto.
+    Atributos de reporte: rows, empty, mismatches, mismatch_samples.
+    """
+    def __init__(self, fmt, pattern=None):
+        self.fmt = fmt
+        self.pattern = pattern
+        self._rx = _COMPILED[fmt].match
+        self._order = _ORDER[fmt]
+        self.rows = 0
+        self.empty = 0
+        self.mismatches = 0
+        self.mismatch_samples = []
+
+    @classmethod
+    def detect(cls, pattern, sample_values):
+        """
+        Formato del manifest si interpreta al menos una fila de la muestra: las
+        que no cumple van al cascade por fila, igual que antes (una fila con día
+        > 12 no cambia cómo se leen las ambiguas). Si no hay formato de manifest
+        o no interpreta ninguna, el primer candidato que cubre toda la muestra,
+        o el que más acierta.
+        """
+        values = [v for v in sample_values if v and v.strip()]
+        fmts = candidate_formats(pattern)
+        if pattern in MANIFEST_FORMATS:
+            f = MANIFEST_FORMATS[pattern]
+            if not values or any(_fast_parse(_COMPILED[f].match, _ORDER[f], v) is not None for v in values):
+                return cls(f, pattern)
+        best, best_hits = fmts[0], -1
+        for f in dict.fromkeys(fmts):
+            hits = sum(1 for v in values if _fast_parse(_COMPILED[f].match, _ORDER[f], v) is not None)
+            if hits == len(values):
+                return cls(f, pattern)
+            if hits > best_hits:
+                best, best_hits = f, hits
+        return cls(best, pattern)
+
+    @classmethod
+    def from_rows(cls, pattern, rows, field, sample_size=SAMPLE_SIZE):
+        """
+        Detecta el formato con las primeras sample_size filas del iterador.
+        Devuelve (matcher, rows) donde rows vuelve a incluir la muestra.
+        """
+        rows = iter(rows)
+        sample = list(islice(rows, sample_size))
+        matcher = cls.detect(pattern, [r.get(field, "") for r in sample])
+        return matcher, chain(sample, rows)
+
+    def year_month(self, value):
+        """(year, month) de value o None. Las filas fuera de formato se reportan."""
+        self.rows += 1
+        if not value:
+            self.empty += 1
+            return None
+        ym = _fast_parse(self._rx, self._order, value)
+        if ym is not None:
+            return ym
+        self.mismatches += 1
+        if len(self.mismatch_samples) < MAX_MISMATCH_SAMPLES:
+            self.mismatch_samples.append(value)
+        return parse_year_month_slow(value, self.pattern)
+
+    def report(self):
+        return {
+            "date_format": self.fmt,
+            "rows": self.rows,
+            "empty": self.empty,
+            "mismatches": self.mismatches,
+            "mismatch_samples": list(self.mismatch_samples),
+        }
+
+def _fast_parse(match, order, value):
+    m = match(value)
+    if m is None:
+        return None
+    g = m.groups()
+    y, mo, d = int(g[order[0]]), int(g[order[1]]), int(g[order[2]])
+    if not (1 <= mo <= 12 and 1 <= d <= 31):
+        return None
+    # días 29-31 solo si existen en ese mes (strptime también los rechaza)
+    if d > 28 and d > calendar.monthrange(y, mo)[1]:
+        return None
+    return y, mo
@@ -0,0 +1,128 @@
+# dq_rules.py
+"""
+Reglas de calidad del manifest (dq_rules) evaluadas en streaming durante el ingest.
+
+Reglas soportadas ("<regla>:<columna>"):
+  not_null:Col      valor no vacío
+  valid_date:Col    fecha interpretable (formatos de date_matcher; date_format del manifest primero)
+  gte_zero:Col      numérico >= 0 (vacío pasa: eso lo controla not_null)
+
+- Las reglas se compilan UNA vez a predicados por columna.
+- DQGate.accept(row) -> True si la fila pasa; si no, la fila va al objeto de
+  cuarentena bronze/quarantine/source=<s>/table=<t>/<name>.csv[.gz|.zst]
+  (fuera de las LOCATION de Athena) con la columna extra dq_failed_rules.
+- El objeto de cuarentena solo se crea si hay rechazos (y se borra el de una
+  corrida previa del mismo objeto si ahora no los hay).
+- report() -> conteos por regla para el CONTROL_TABLE.
+"""
+from s3_stream import CsvS3Writer, compression_ext
+from date_matcher import date_validator
+
+QUARANTINE_PREFIX = "bronze/quarantine/"
+FAILED_RULES_FIELD = "dq_failed_rules"
+
+def _not_null(v):
+    return v is not None and str(v).strip() != ""
+
+def _gte_zero(v):
+    if v is None:
+        return True
+    v = str(v).strip()
+    if not v:
+        return True
+    try:
+        return float(v) >= 0
+    except ValueError:
+        return False
+
+class Rule:
+    __slots__ = ("name", "column", "_pred")
+
+    def __init__(self, name, column, pred):
+        self.name = name
+        self.column = column
+        self._pred = pred
+
+    def check(self, row):
+        return self._pred(row.get(self.column))
+
+def compile_rules(rule_specs, date_pattern=None, fieldnames=None):
+    """Lista de Rule a partir de los strings del manifest. Regla desconocida -> ValueError."""
+    rules = []
+    for spec in rule_specs or []:
+        kind, sep, column = spec.partition(":")
+        kind, column = kind.strip(), column.strip()
+        if not sep or not column:
+            raise ValueError(f"dq_rule inválida (se espera '<regla>:<columna>'): {spec}")
+        if kind == "not_null":
+            pred = _not_null
+        elif kind == "valid_date":
+            is_date = date_validator(date_pattern)
+            pred = lambda v, _f=is_date: _f(str(v).strip()) if v is not None else False
+        elif kind == "gte_zero":
+            pred = _gte_zero
+        else:
+            raise ValueError(f"dq_rule no soportada: {spec}")
+        if fieldnames is not None and column not in fieldnames:
+            print(f"DQ WARNING: la columna {column} de '{spec}' no está en la fuente")
+        rules.append(Rule(f"{kind}:{column}", column, pred))
+    return rules
+
+def quarantine_key(src, name):
+    source = src.get("source") or src.get("type", "unknown").split("_")[-1]
+    return f"{QUARANTINE_PREFIX}source={source}/table={src['table']}/{name}.csv{compression_ext(src.get('compression'))}"
+
+class DQGate:
+    """
+    Filtro de calidad por objeto Bronze.
+    Uso:
+        gate = DQGate(s3, bucket, src, name, fieldnames)
+        for row in rows:
+            if gate.accept(row): writer.writerow(row)
+        gate.close()          # o gate.abort() si el objeto Bronze se descarta
+    """
+    def __init__(self, s3, bucket, src, name, fieldnames):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = quarantine_key(src, name)
+        self.fieldnames = list(fieldnames or [])
+        self.compression = src.get("compression")
+        self.rules = compile_rules(src.get("dq_rules"), src.get("date_format"), self.fieldnames)
+        self.violations = {r.name: 0 for r in self.rules}
+        self.rows = 0
+        self.rejected = 0
+        self._q = None
+
+    def accept(self, row):
+        self.rows += 1
+        if not self.rules:
+            return True
+        failed = [r.name for r in self.rules if not r.check(row)]
+        if not failed:
+            return True
+        for name in failed:
+            self.violations[name] += 1
+        self.rejected += 1
+        if self._q is None:
+            self._q = CsvS3Writer(self.s3, self.bucket, self.key, self.fieldnames + [FAILED_RULES_FIELD],
+                                  compression=self.compression)
+        q_row = dict(row)
+        q_row[FAILED_RULES_FIELD] = ";".join(failed)
+        self._q.writerow(q_row)
+        return False
+
+    def close(self):
+        if self._q is not None:
+            self._q.close()
+        elif self.rules:
+            self.s3.delete_object(Bucket=self.bucket, Key=self.key)
+
+    def abort(self):
+        if self._q is not None:
+            self._q.abort()
+
+    def report(self):
+        r = {"dq_rows": self.rows, "dq_rejected": self.rejected, "dq_violations": dict(self.violations)}
+        if self.rejected:
+            r["dq_quarantine_key"] = self.key
+        return r
@@ -0,0 +1,404 @@
+# engine.py
+"""
+Motor común de ingest: lectores enchufables por tipo de fuente + etapa de
+escritura Bronze compartida.
+
+    sources.json "type" --> READERS[type] --(lotes de filas)--> BronzeSink --> S3
+                                                                 |-> CONTROL_TABLE
+
+- Un lector es un contextmanager open(src, **opts) que entrega un SourceRows
+  (source_rows.py: fieldnames + filas en streaming + meta). Los lectores y su
+  tabla por tipo (READERS, BOUNDS) viven en connectors.py.
+- BronzeSink concentra formato/compresión (bronze_writer), multipart upload
+  (s3_stream), dq_rules (DQGate) y métricas; log_table_result escribe el
+  resultado en el CONTROL_TABLE (buffer de control_log).
+- ingest_table() ingesta cualquier tabla del manifest con su lector: una fuente
+  nueva solo necesita su entrada en sources.json (y un lector si el tipo es nuevo).
+"""
+import os, re, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import boto3
+from bronze_writer import open_bronze_writer, bronze_key, csv_key
+from connectors import READERS, BOUNDS
+from control_log import ControlLogger
+from dq_rules import DQGate, quarantine_key
+from manifest import load_manifest
+from s3_stream import COMPRESSION_EXT
+import pk_ranges
+from watermark import watermark_config, watermark_id, needs_full_snapshot, WatermarkTracker
+
+# ---------- Env / clients compartidos ----------
+BUCKET = os.environ['BUCKET_NAME']
+CONTROL_TABLE = os.environ['CONTROL_TABLE']
+ERROR_TABLE = os.environ['ERROR_TABLE']
+
+s3 = boto3.client('s3')   # los clients de boto3 son thread-safe
+# control/errores: Tables cacheadas por hilo + items en buffer (flush por etapa)
+LOG = ControlLogger(CONTROL_TABLE, ERROR_TABLE)
+
+# ---------- Utils ----------
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+def ts():
+    return int(datetime.now(timezone.utc).timestamp())
+
+def source_name(src):
+    """'github' | 'mysql' | 'excel' (o src["source"] si el manifest lo declara)."""
+    return src.get("source") or src.get("type", "unknown").split("_")[-1]
+
+def log_table_result(run_id, run_month, table, status, records_out, note=None, source="github", extra=None,
+                     part=None):
+    # CONTROL_TABLE tiene solo hash key run_id: part distingue las entradas de una misma
+    # corrida y tabla (mes de orders, rango de pk, archivo del inbox)
+    item = {
+        "run_id": f"{run_id}#{table}#{part}" if part else f"{run_id}#{table}",
+        "run_month": run_month,
+        "source": source,
+        "table": table,
+        "status": status,
+        "records_out": int(records_out),
+        "started_at": now_iso(),
+        "ended_at": now_iso()
+    }
+    if note:
+        item["note"] = note
+    if extra:
+        item.update(extra)
+    LOG.control(item)   # se envía en el próximo LOG.flush()
+
+def log_error(run_id, source, table, error_code, message, step="ingest", extra=None):
+    item = {
+        "run_id": run_id, "ts": ts(),
+        "source": source, "table": table, "step": step,
+        "severity": "ERROR", "error_code": error_code, "message": message
+    }
+    if extra:
+        item.update(extra)
+    LOG.error(item)
+
+# ---------- Lectores (connectors.READERS) ----------
+def open_source(src, **opts):
+    try:
+        reader = READERS[src["type"]]
+    except KeyError:
+        raise ValueError(f"Tipo de fuente sin lector registrado: {src.get('type')}") from None
+    return reader(src, **opts)
+
+# ---------- Etapa de escritura ----------
+class BronzeSink:
+    """
+    Writer Bronze (CSV/Parquet, compresión según manifest) + dq_rules + métricas.
+    write(row) -> True si la fila pasó DQ y se escribió.
+    """
+    def __init__(self, src, name, fieldnames, csv_prefix=None, header_if_empty=True, partition=""):
+        self.src = src
+        self.name = name
+        self._t0 = time.monotonic()
+        self.gate = DQGate(s3, BUCKET, src, name, fieldnames)
+        self.writer = open_bronze_writer(s3, BUCKET, src, name, fieldnames,
+                                         csv_prefix=csv_prefix, header_if_empty=header_if_empty,
+                                         partition=partition)
+        self.elapsed_ms = None
+
+    @property
+    def key(self):
+        return self.writer.key
+
+    @property
+    def rows(self):
+        return self.writer.rows
+
+    def write(self, row):
+        if self.gate.accept(row):
+            self.writer.writerow(row)
+            return True
+        return False
+
+    def write_batch(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def close(self):
+        self.writer.close()
+        self.gate.close()
+        self.elapsed_ms = int((time.monotonic() - self._t0) * 1000)
+
+    def abort(self):
+        self.writer.abort()
+        self.gate.abort()
+
+    def dq(self):
+        return self.gate.report()
+
+    def metrics(self):
+        ms = self.elapsed_ms if self.elapsed_ms is not None else int((time.monotonic() - self._t0) * 1000)
+        m = {"rows_in": self.gate.rows, "rows_out": self.rows, "elapsed_ms": ms,
+             "rows_per_s": int(self.gate.rows * 1000 / ms) if ms else 0}
+        nbytes = getattr(self.writer, "bytes_written", None)
+        if nbytes is not None:
+            m["bytes_out"] = int(nbytes)
+        return m
+
+    def report(self):
+        """Campos extra para el CONTROL_TABLE."""
+        return {**self.dq(), "metrics": self.metrics()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+def _get_state(state_id):
+    try:
+        return LOG.table(CONTROL_TABLE).get_item(Key={"run_id": state_id}).get("Item")
+    except Exception as e:
+        print("STATE READ ERROR:", e)
+        return None
+
+def _list_keys(prefix):
+    keys = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=BUCKET, Prefix=prefix):
+        keys += [o['Key'] for o in page.get('Contents', [])]
+    return keys
+
+def _delete_keys(keys):
+    keys = [{"Key": k} for k in keys]
+    for i in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=BUCKET, Delete={"Objects": keys[i:i + 1000], "Quiet": True})
+    return len(keys)
+
+def _delete_prefix(prefix):
+    return _delete_keys(_list_keys(prefix))
+
+def _extract(src, name, source_opts, csv_prefix=None, tracker=None, skip_empty=False):
+    """
+    Lector -> BronzeSink para un objeto. Devuelve (sink, meta); sink=None si
+    skip_empty y la fuente no entregó filas (no se crea el objeto).
+    """
+    with open_source(src, **source_opts) as rows:
+        sink = BronzeSink(src, name, rows.fieldnames, csv_prefix=csv_prefix)
+        try:
+            for batch in rows.batches():
+                sink.write_batch(batch)
+                if tracker:
+                    for row in batch:
+                        tracker.update(row)
+        except Exception:
+            sink.abort()
+            raise
+        if skip_empty and sink.gate.rows == 0:
+            sink.abort()
+            return None, rows.meta
+        sink.close()
+        return sink, rows.meta
+
+def _connect_metrics(meta):
+    return {"connect": meta["connect"]} if "connect" in meta else {}   # p. ej. conexión MySQL
+
+# ---------- Rangos de pk en paralelo (pk_ranges.py) ----------
+RANGE_WORKERS = int(os.environ.get("INGEST_RANGE_WORKERS", "8"))
+_PART_RX = re.compile(r"_part-(\d{4})-of-(\d{4})\.")
+
+def _part_prefixes(src, name, csv_prefix):
+    keys = {bronze_key(src, name, csv_prefix), csv_key(src, name, csv_prefix), quarantine_key(src, name)}
+    return sorted({k.rsplit("/", 1)[0] + "/" + pk_ranges.part_prefix(name) for k in keys})
+
+def _part_keys(src, name, csv_prefix):
+    return [k for p in _part_prefixes(src, name, csv_prefix) for k in _list_keys(p)]
+
+def _stale_parts(src, name, csv_prefix, keep_count=None):
+    """Part files de otro plan de rangos (o todos si keep_count=None)."""
+    keep = f"-of-{int(keep_count):04d}." if keep_count else None
+    return [k for k in _part_keys(src, name, csv_prefix) if not keep or keep not in k]
+
+def _single_keys(src, name, csv_prefix):
+    """El objeto único <name>.csv[.gz] (y variantes de compresión) de un snapshot sin rangos."""
+    return sorted({bronze_key(src, name, csv_prefix)} |
+                  {csv_key(src, name, csv_prefix, c) for c in [None] + list(COMPRESSION_EXT)})
+
+def _ranges_complete(src, name, csv_prefix, count):
+    """True si existen los part files de todos los rangos de un plan de `count`."""
+    found = set()
+    for k in _part_keys(src, name, csv_prefix):
+        m = _PART_RX.search(k)
+        if m and int(m.group(2)) == count:
+            found.add(int(m.group(1)))
+    return found >= set(range(count))
+
+def _plan_ranges(src, count, source_opts):
+    column = pk_ranges.pk_column(src)
+    try:
+        bounds = BOUNDS[src["type"]]
+    except KeyError:
+        raise ValueError(f"El tipo {src.get('type')} no soporta parallel_ranges") from None
+    lo, hi = bounds(src, column, **{k: v for k, v in source_opts.items() if k == "secret_name"})
+    if lo is None or hi is None:
+        return []   # tabla vacía: snapshot normal
+    return pk_ranges.split_ranges(lo, hi, count)
+
+def _ingest_range(src, rng, run_id, run_month, name, csv_prefix, wm_cfg, source_opts):
+    """Un rango -> su part file + su entrada de control. No propaga el error: lo registra."""
+    table, source = src["table"], source_name(src)
+    part = pk_ranges.part_name(name, rng)
+    tracker = WatermarkTracker(wm_cfg["column"]) if wm_cfg else None
+    extra = {"pk_range": dict(rng), "pk_column": pk_ranges.pk_column(src)}
+    try:
+        sink, meta = _extract(src, part, dict(source_opts, pk_range=rng), csv_prefix=csv_prefix, tracker=tracker)
+    except Exception as e:
+        print(f"RANGE ERROR {table} {part}:", e)
+        log_error(f"{run_id}#{pk_ranges.range_label(rng)}", source, table, "RANGE_FAILED", str(e), extra=extra)
+        log_table_result(run_id, run_month, table, "FAILED", 0, note=str(e), source=source,
+                         extra=extra, part=pk_ranges.range_label(rng))
+        return {"pk_range": rng, "status": "FAILED", "rows": 0, "key": None, "error": str(e),
+                "tracker": None, "dq": {}, "metrics": {}}
+    extra.update(sink.report())
+    extra["metrics"].update(_connect_metrics(meta))
+    log_table_result(run_id, run_month, table, "SUCCEEDED", sink.rows, note=f"wrote {sink.key}",
+                     source=source, extra=extra, part=pk_ranges.range_label(rng))
+    return {"pk_range": rng, "status": "SUCCEEDED", "rows": sink.rows, "key": sink.key,
+            "tracker": tracker, "dq": sink.dq(), "metrics": extra["metrics"]}
+
+def _ingest_ranges(src, ranges, run_id, run_month, name, csv_prefix, wm_cfg, source_opts):
+    workers = max(1, min(len(ranges), RANGE_WORKERS))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(lambda r: _ingest_range(src, r, run_id, run_month, name, csv_prefix,
+                                                   wm_cfg, source_opts), ranges))
+
+def _sum_reports(results):
+    dq, metrics = {"dq_rows": 0, "dq_rejected": 0}, {"rows_in": 0, "rows_out": 0, "bytes_out": 0}
+    for r in results:
+        for k in dq:
+            dq[k] += int(r["dq"].get(k, 0))
+        for k in metrics:
+            metrics[k] += int(r["metrics"].get(k, 0))
+    metrics["elapsed_ms"] = max([int(r["metrics"].get("elapsed_ms", 0)) for r in results] or [0])
+    return dq, metrics
+
+def _range_summary(results):
+    return [{"index": r["pk_range"]["index"], "status": r["status"], "rows": r["rows"], "key": r["key"],
+             **({"retry_range": r["pk_range"]} if r["status"] == "FAILED" else {})} for r in results]
+
+def ingest_table(table, run_id, run_month, name=None, csv_prefix=None, full_snapshot=False,
+                 ranges=None, retry_range=None, part=None, **source_opts):
+    """
+    Ingesta completa de una tabla del manifest: lector del tipo -> BronzeSink -> control.
+    Con "watermark" en el manifest (ver watermark.py) extrae solo el delta y lo
+    escribe en <prefix>delta/<name>_delta_<ts> (bronze_to_silver los lee junto al
+    snapshot, ver etl_dim_store.py); el snapshot completo limpia los deltas.
+    Con "parallel_ranges" (o ranges=N) el snapshot completo se parte en rangos de
+    pk leídos en paralelo (ver pk_ranges.py); retry_range reintenta solo un rango.
+    part: sufijo de la entrada de control cuando una corrida escribe varios objetos
+    de la misma tabla (p. ej. un workbook por archivo del inbox).
+    Devuelve {"table","status","rows","key","dq","metrics"} (+ "ranges").
+    """
+    src = load_manifest(s3, BUCKET).source(table)
+    if src is None:
+        raise RuntimeError(f"No se encontró descriptor '{table}' en el manifest.")
+    name = name or table
+    source = source_name(src)
+    if retry_range:
+        return _retry_range(src, retry_range, run_id, run_month, name, csv_prefix, source_opts)
+
+    wm_cfg = watermark_config(src)
+    tracker, mode, wm_state = None, "full", None
+    if wm_cfg:
+        tracker = WatermarkTracker(wm_cfg["column"])
+        wm_state = _get_state(watermark_id(source, table))
+        if not needs_full_snapshot(wm_state, wm_cfg, force=full_snapshot):
+            mode = "delta"
+            source_opts["since"] = wm_state["value"]
+
+    plan = []
+    if mode == "full" and pk_ranges.range_count(src, ranges) > 1:
+        plan = _plan_ranges(src, pk_ranges.range_count(src, ranges), source_opts)
+
+    results, failed = None, []
+    if plan:
+        results = _ingest_ranges(src, plan, run_id, run_month, name, csv_prefix, wm_cfg, source_opts)
+        failed = [r for r in results if r["status"] == "FAILED"]
+        for r in results:
+            if tracker and r["tracker"]:
+                tracker.merge(r["tracker"])
+        sink, meta = None, {}
+    elif mode == "delta":
+        sink, meta = _extract(src, f"{name}_delta_{ts()}", source_opts,
+                              csv_prefix=f"{csv_prefix or src['target_bronze_prefix']}delta/",
+                              tracker=tracker, skip_empty=True)   # sin cambios: no se crea un delta vacío
+    else:
+        sink, meta = _extract(src, name, source_opts, csv_prefix=csv_prefix, tracker=tracker)
+
+    extra = {}
+    if mode == "full" and not failed:
+        # el snapshot reemplaza al layout anterior (objeto único <-> part files)
+        if plan:
+            _delete_keys(_stale_parts(src, name, csv_prefix, keep_count=len(plan)) +
+                         _single_keys(src, name, csv_prefix))
+        else:
+            _delete_keys(_stale_parts(src, name, csv_prefix))
+    if wm_cfg and not failed:
+        new_value = tracker.value or (wm_state or {}).get("value")
+        extra = {"extract_mode": mode, "watermark_column": wm_cfg["column"],
+                 "watermark_from": (wm_state or {}).get("value") if mode == "delta" else None,
+                 "watermark_to": new_value}
+        if mode == "full":
+            # el snapshot completo reemplaza a los deltas acumulados
+            extra["deltas_removed"] = _delete_prefix(f"{csv_prefix or src['target_bronze_prefix']}delta/")
+        last_full = now_iso() if mode == "full" else (wm_state or {}).get("last_full_at")
+        LOG.control({
+            "run_id": watermark_id(source, table), "source": source, "table": table,
+            "status": "WATERMARK", "column": wm_cfg["column"], "value": new_value or "",
+            "last_full_at": last_full, "last_run_id": run_id, "updated_at": now_iso()
+        })
+    elif wm_cfg:
+        # con rangos fallidos el watermark no avanza: el snapshot queda incompleto
+        extra = {"extract_mode": mode, "watermark_column": wm_cfg["column"],
+                 "watermark_from": None, "watermark_to": (wm_state or {}).get("value")}
+
+    if plan:
+        dq, metrics = _sum_reports(results)
+        rows = sum(r["rows"] for r in results)
+        status = "PARTIAL" if failed else "SUCCEEDED"
+        extra.update(dq_rows=dq["dq_rows"], dq_rejected=dq["dq_rejected"], metrics=metrics,
+                     pk_column=pk_ranges.pk_column(src), ranges_total=len(plan), ranges_failed=len(failed))
+        log_table_result(run_id, run_month, table, status, rows,
+                         note=f"{len(plan) - len(failed)}/{len(plan)} rangos de pk", source=source, extra=extra)
+        return {"table": table, "status": status, "rows": rows, "key": None, "dq": dq, "metrics": metrics,
+                "meta": {}, "ranges": _range_summary(results),
+                **{k: v for k, v in extra.items() if k.startswith(("extract_", "watermark_"))}}
+
+    metrics = _connect_metrics(meta)
+    if sink is None:
+        extra["metrics"] = metrics
+        log_table_result(run_id, run_month, table, "UNCHANGED", 0, note="sin filas nuevas desde el watermark",
+                         source=source, extra=extra, part=part)
+        return {"table": table, "status": "UNCHANGED", "rows": 0, "key": None,
+                "dq": {}, "meta": meta, **extra}
+
+    extra.update(sink.report())
+    extra["metrics"].update(metrics)
+    log_table_result(run_id, run_month, table, "SUCCEEDED", sink.rows, note=f"wrote {sink.key}",
+                     source=source, extra=extra, part=part)
+    return {"table": table, "status": "SUCCEEDED", "rows": sink.rows, "key": sink.key,
+            "dq": sink.dq(), "metrics": extra["metrics"], "meta": meta,
+            **{k: v for k, v in extra.items() if k.startswith(("extract_", "watermark_"))}}
+
+def _retry_range(src, rng, run_id, run_month, name, csv_prefix, source_opts):
+    """
+    Reintenta un rango fallido (pk_range tal como quedó en el CONTROL_TABLE).
+    Si con él quedan todos los part files del plan, limpia el layout anterior.
+    El watermark no se toca: el próximo snapshot completo lo fija.
+    """
+    rng = {k: (bool(v) if k == "last" else int(v)) for k, v in rng.items()}
+    res = _ingest_range(src, rng, run_id, run_month, name, csv_prefix, None, source_opts)
+    if res["status"] == "SUCCEEDED" and _ranges_complete(src, name, csv_prefix, rng["count"]):
+        _delete_keys(_stale_parts(src, name, csv_prefix, keep_count=rng["count"]) +
+                     _single_keys(src, name, csv_prefix))
+    return {"table": src["table"], "status": res["status"], "rows": res["rows"], "key": res["key"],
+            "dq": res["dq"], "metrics": res["metrics"], "meta": {}, "ranges": _range_summary([res])}
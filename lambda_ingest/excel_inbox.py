@@ -0,0 +1,32 @@
+# excel_inbox.py
+"""
+Inbox de workbooks .xlsx (fuentes excel) con checkpoint por archivo.
+
+- Se procesan TODOS los .xlsx del inbox (excel_source_prefix) que no tengan
+  checkpoint con el mismo ETag; un archivo ya procesado nunca se vuelve a parsear.
+- Checkpoint en CONTROL_TABLE, run_id = "checkpoint#<source>#<table>#<key>":
+    source_etag   ETag del .xlsx procesado (si el archivo se reemplaza, cambia)
+    dest_key      objeto Bronze generado
+- Cada workbook va a su propio objeto Bronze <table>__<nombre del archivo>
+  (sobrescribe solo el suyo si el archivo se reemplaza).
+"""
+import os, re
+
+def checkpoint_id(source, table, key):
+    return f"checkpoint#{source}#{table}#{key}"
+
+def list_inbox(s3, bucket, prefix):
+    """[{"Key","ETag","Size"}] de los .xlsx del inbox, en orden de key."""
+    files = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        files += [{"Key": o['Key'], "ETag": o.get('ETag'), "Size": o.get('Size')}
+                  for o in page.get('Contents', []) if o['Key'].lower().endswith('.xlsx')]
+    return sorted(files, key=lambda f: f["Key"])
+
+def already_processed(checkpoint, etag):
+    return bool(checkpoint) and bool(etag) and checkpoint.get("source_etag") == etag
+
+def output_name(table, key):
+    """storesBudget + inbox/Budget 2025.xlsx -> storesBudget__Budget_2025"""
+    stem = os.path.splitext(key.rsplit("/", 1)[-1])[0]
+    return f"{table}__{re.sub(r'[^A-Za-z0-9_.-]+', '_', stem).strip('_') or 'workbook'}"
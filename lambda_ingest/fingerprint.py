@@ -0,0 +1,42 @@
+# fingerprint.py
+"""
+Huella de contenido por tabla para detectar snapshots sin cambios.
+
+La huella guarda:
+  - source_etag / source_last_modified: cabeceras HTTP de la fuente
+  - sha256: hash de las filas normalizadas (encabezado + valores con strip)
+
+Se persiste en CONTROL_TABLE con run_id = "fingerprint#<source>#<table>".
+"""
+import hashlib
+
+FIELD_SEP = "\x1f"
+ROW_SEP = "\x1e"
+
+def fingerprint_id(source, table):
+    return f"fingerprint#{source}#{table}"
+
+class RowHasher:
+    """SHA-256 incremental de filas dict; el orden de columnas lo fija fieldnames."""
+    def __init__(self, fieldnames):
+        self.fieldnames = list(fieldnames or [])
+        self._h = hashlib.sha256()
+        self._h.update((FIELD_SEP.join(f.strip() for f in self.fieldnames) + ROW_SEP).encode('utf-8'))
+
+    def update(self, row):
+        vals = []
+        for f in self.fieldnames:
+            v = row.get(f)
+            vals.append("" if v is None else str(v).strip())
+        self._h.update((FIELD_SEP.join(vals) + ROW_SEP).encode('utf-8'))
+
+    def hexdigest(self):
+        return self._h.hexdigest()
+
+def source_unchanged(prev, etag, last_modified):
+    """True si las cabeceras HTTP coinciden con la huella previa (sin leer el cuerpo)."""
+    if not prev:
+        return False
+    if etag and prev.get("source_etag") == etag:
+        return True
+    return bool(last_modified) and not etag and prev.get("source_last_modified") == last_modified
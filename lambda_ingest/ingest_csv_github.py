@@ -1,160 +1,380 @@
-import os, json, csv, io, urllib.request
-from datetime import datetime, timezone
+import os, csv, tempfile
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from botocore.exceptions import ClientError
+from bronze_writer import bronze_key, month_partition
+from date_matcher import DateMatcher
+from fingerprint import RowHasher, fingerprint_id, source_unchanged
+from manifest import load_manifest
+from engine import (s3, BUCKET, CONTROL_TABLE, LOG, now_iso, ts, source_name,
+                    log_table_result, log_error, open_source, BronzeSink)
 
-s3 = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+# ---------- Env ----------
+DIMS_MAX_WORKERS = int(os.environ.get('DIMS_MAX_WORKERS', '4'))
+# meses del backfill con writer S3 abierto a la vez (el resto pasa por /tmp)
+BACKFILL_OPEN_WRITERS = max(1, int(os.environ.get('BACKFILL_OPEN_WRITERS', '3')))
 
-BUCKET = os.environ['BUCKET_NAME']
-CONTROL_TABLE = os.environ['CONTROL_TABLE']
-ERROR_TABLE = os.environ['ERROR_TABLE']
-
-def _now_iso():
-    return datetime.now(timezone.utc).isoformat()
-
-def _put_control(item):
+# ---------- Utils ----------
+def _object_exists(bucket: str, key: str) -> bool:
     try:
-        dynamodb.Table(CONTROL_TABLE).put_item(Item=item)
-    except Exception as e:
-        print("CONTROL LOG ERROR:", e)
-
-def _put_error(item):
-    try:
-        dynamodb.Table(ERROR_TABLE).put_item(Item=item)
-    except Exception as e:
-        print("ERROR LOG ERROR:", e)
-
-def _load_manifest():
-    key = "bronze/source_metadata/sources.json"
-    body = s3.get_object(Bucket=BUCKET, Key=key)['Body'].read()
-    m = json.loads(body.decode('utf-8'))
-    return m.get('sources', []), m.get('run_defaults', {})
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        code = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if code == 404:
+            return False
+        raise
 
-def _upload_bytes(key, data: bytes):
-    s3.put_object(Bucket=BUCKET, Key=key, Body=data)
+def _clear_prefix(bucket, prefix):
+    # borra objetos bajo el prefijo (para overwrite seguro)
+    s3r = boto3.resource('s3')
+    b = s3r.Bucket(bucket)
+    b.objects.filter(Prefix=prefix).delete()
 
 def _month_parts(run_month: str):
     y, m = run_month.split("-")
     return int(y), int(m)
 
-def _match_run_month(date_str, pattern, run_month):
-    if not date_str:
-        return False
-    date_str = date_str.strip().split("T")[0].split(" ")[0]
+# ---------- Core ----------
+def _process_orders_month(src, run_month, allow_overwrite, run_id):
+    """
+    Procesa un solo mes para 'orders'.
+    - Filtra por fecha (run_month) leyendo el CSV de origen en streaming.
+    - Escribe bronze/[year=Y/month=M/]orders_YYYY-MM.csv (o .parquet según el manifest) por partes
+      (respeta allow_overwrite; carpeta Hive si el manifest declara "partitioning": "year-month").
+    - Loguea resultado en CONTROL_TABLE.
+    """
+    table = src['table']                      # "orders"
+    source_type = source_name(src)
+
+    partition = month_partition(src, run_month)
+    key = bronze_key(src, f"{table}_{run_month}", partition=partition)
+
+    # Idempotencia en Bronze (antes de descargar):
+    if not allow_overwrite and _object_exists(BUCKET, key):
+        log_table_result(run_id, run_month, table, "SKIPPED_EXISTS", 0, note=f"{key} ya existe", source=source_type,
+                         part=run_month)
+        return {"table": table, "run_month": run_month, "status": "SKIPPED_EXISTS", "rows": 0, "key": key}
 
-    fmts = []
-    # respeta el patrón declarado en sources.json si existe
-    if pattern in ("M/d/yyyy", "MM/dd/yyyy"):
-        fmts.append("%m/%d/%Y")
-    elif pattern in ("MM-dd-yyyy", "M-d-yyyy"):
-        fmts.append("%m-%d-%Y")
+    date_field = src.get("date_field", "OrderDate")
+    date_fmt = src.get("date_format", "MM-dd-yyyy")
 
-    # formatos alternativos comunes
-    fmts += ["%Y-%m-%d", "%Y/%m/%d", "%d-%m-%Y", "%m/%d/%Y", "%m-%d-%Y"]
+    target = _month_parts(run_month)   # se calcula una vez, no por fila
+
+    with open_source(src) as reader:
+        # formato de fecha detectado una vez (manifest + muestra de filas)
+        matcher, rows = DateMatcher.from_rows(date_fmt, reader, date_field)
+        # BronzeSink: formato/compresión + dq_rules (rechazos a cuarentena) + métricas
+        with BronzeSink(src, f"{table}_{run_month}", reader.fieldnames, header_if_empty=False,
+                        partition=partition) as sink:
+            for row in rows:
+                if matcher.year_month(row.get(date_field, "")) == target:
+                    sink.write(row)
+    cnt = sink.rows
+    dates = matcher.report()
+    if dates["mismatches"]:
+        print("DATE FORMAT MISMATCHES:", dates)
+
+    log_table_result(run_id, run_month, table, "SUCCEEDED", cnt, note=f"wrote {key}", source=source_type,
+                     extra={"date_format": dates["date_format"], "date_mismatches": dates["mismatches"],
+                            **sink.report()}, part=run_month)
+    return {"table": table, "run_month": run_month, "status": "SUCCEEDED", "rows": cnt, "key": key,
+            "dates": dates, "dq": sink.dq()}
+
+def _process_orders_backfill(src, run_months, allow_overwrite, run_id):
+    """
+    Backfill de varios meses de 'orders' en UNA sola pasada.
+    - Descarga y recorre el CSV fuente una única vez (streaming).
+    - Enruta cada fila al mes pedido que le corresponde (year, month).
+    - Escribe un bronze/[year=Y/month=M/]orders_YYYY-MM.csv por mes (respeta allow_overwrite).
+    - Loguea cada mes por separado en CONTROL_TABLE, en cuanto su objeto se sube.
+    Memoria: solo los primeros BACKFILL_OPEN_WRITERS meses tienen un BronzeSink
+    abierto durante la pasada (~PART_SIZE cada uno); las filas de los demás van a
+    un archivo temporal en /tmp por mes y se suben después, de a un mes. El pico
+    queda en BACKFILL_OPEN_WRITERS x PART_SIZE sin importar cuántos meses pida el
+    backfill; /tmp necesita a lo sumo el tamaño del CSV fuente.
+    """
+    table = src['table']
+    source_type = source_name(src)
+    date_field = src.get("date_field", "OrderDate")
+    date_fmt = src.get("date_format", "MM-dd-yyyy")
+
+    results = {}
+    pending = {}   # (year, month) -> run_month
+    for rm in dict.fromkeys(run_months):
+        key = bronze_key(src, f"{table}_{rm}", partition=month_partition(src, rm))
+        # Idempotencia en Bronze: se decide antes de descargar
+        if not allow_overwrite and _object_exists(BUCKET, key):
+            log_table_result(run_id, rm, table, "SKIPPED_EXISTS", 0, note=f"{key} ya existe", source=source_type,
+                             part=rm)
+            results[rm] = {"table": table, "run_month": rm, "status": "SKIPPED_EXISTS", "rows": 0, "key": key}
+        else:
+            pending[_month_parts(rm)] = rm
+
+    if pending:
+        sinks = {}    # (year, month) -> BronzeSink abierto (writer + DQ + métricas por mes)
+        spools = {}   # (year, month) -> archivo temporal con las filas del mes
+
+        def log_month(ym, sink, dates):
+            # cada mes se registra apenas su objeto queda subido: si falla un mes
+            # posterior, los ya escritos tienen su SUCCEEDED con filas y DQ
+            rm = pending[ym]
+            log_table_result(run_id, rm, table, "SUCCEEDED", sink.rows, note=f"wrote {sink.key}", source=source_type,
+                             extra={"date_format": dates["date_format"], "date_mismatches": dates["mismatches"],
+                                    "spooled": ym in spools, **sink.report()}, part=rm)
+            results[rm] = {"table": table, "run_month": rm, "status": "SUCCEEDED", "rows": sink.rows,
+                           "key": sink.key, "dq": sink.dq()}
 
-    for f in fmts:
         try:
-            dt = datetime.strptime(date_str, f)
-            y, m = _month_parts(run_month)
-            return dt.year == y and dt.month == m
+            with open_source(src) as reader:
+                matcher, rows = DateMatcher.from_rows(date_fmt, reader, date_field)
+                fieldnames = reader.fieldnames
+                for i, (ym, rm) in enumerate(sorted(pending.items())):
+                    if i < BACKFILL_OPEN_WRITERS:
+                        sinks[ym] = BronzeSink(src, f"{table}_{rm}", fieldnames, header_if_empty=False,
+                                               partition=month_partition(src, rm))
+                    else:
+                        spools[ym] = tempfile.TemporaryFile("w+", newline="", encoding="utf-8")
+                writers = {ym: csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+                           for ym, f in spools.items()}
+                for row in rows:
+                    ym = matcher.year_month(row.get(date_field, ""))
+                    sink = sinks.get(ym)
+                    if sink is not None:
+                        sink.write(row)
+                    elif ym in writers:
+                        writers[ym].writerow(row)
+            dates = matcher.report()
+            if dates["mismatches"]:
+                print("DATE FORMAT MISMATCHES:", dates)
+            for ym in list(sinks):
+                sinks[ym].close()
+                log_month(ym, sinks.pop(ym), dates)
+            # meses en /tmp: un writer abierto a la vez
+            for ym, f in spools.items():
+                f.seek(0)
+                rm = pending[ym]
+                with BronzeSink(src, f"{table}_{rm}", fieldnames, header_if_empty=False,
+                                partition=month_partition(src, rm)) as sink:
+                    for row in csv.DictReader(f, fieldnames=fieldnames):
+                        sink.write(row)
+                log_month(ym, sink, dates)
         except Exception:
-            continue
-    return False
+            for sink in sinks.values():   # los que siguen abiertos; los cerrados ya están registrados
+                sink.abort()
+            raise
+        finally:
+            for f in spools.values():
+                f.close()
+
+    return [results[rm] for rm in dict.fromkeys(run_months)]
+
+def _get_fingerprint(source, table):
+    try:
+        resp = LOG.table(CONTROL_TABLE).get_item(Key={"run_id": fingerprint_id(source, table)})
+        return resp.get("Item")
+    except Exception as e:
+        print("FINGERPRINT READ ERROR:", e)
+        return None
+
+def _put_fingerprint(source, table, key, etag, last_modified, sha256, run_id):
+    LOG.control({
+        "run_id": fingerprint_id(source, table),
+        "source": source,
+        "table": table,
+        "status": "FINGERPRINT",
+        "key": key,
+        "source_etag": etag or "",
+        "source_last_modified": last_modified or "",
+        "sha256": sha256,
+        "last_run_id": run_id,
+        "updated_at": now_iso()
+    })
+
+def _process_dim(src, allow_overwrite, run_id, log_run_month_for_dims):
+    """
+    Snapshot de UNA dimensión.
+    Detección de cambios por huella (CONTROL_TABLE, run_id="fingerprint#<source>#<table>"):
+    - GET condicional con el ETag/Last-Modified previo: 304 -> UNCHANGED sin descargar.
+    - Si la fuente responde 200, se calcula SHA-256 de las filas normalizadas mientras
+      se escriben; si coincide con la huella previa se aborta la escritura -> UNCHANGED.
+    - Sin allow_overwrite y con el objeto ya en Bronze, la huella se compara igual
+      (sin escribir): UNCHANGED si coincide, SKIPPED_EXISTS si la fuente cambió o no
+      hay huella previa. bronze_to_silver solo se salta la dim con UNCHANGED.
+    """
+    table = src['table']
+    source_type = source_name(src)
+
+    key = bronze_key(src, table)
 
+    exists = _object_exists(BUCKET, key)
+    # la huella solo vale si el objeto Bronze sigue ahí
+    prev = _get_fingerprint(source_type, table) if exists else None
+    keep_existing = exists and not allow_overwrite
+    if keep_existing and prev is None:
+        log_table_result(run_id, log_run_month_for_dims, table, "SKIPPED_EXISTS", 0, note=f"{key} ya existe", source=source_type)
+        return {"table": table, "status": "SKIPPED_EXISTS", "rows": 0, "key": key}
+    prev_etag = (prev or {}).get("source_etag") or None
+    prev_lm = (prev or {}).get("source_last_modified") or None
 
+    # descarga + escritura en streaming (solo huella si no se puede reescribir)
+    with open_source(src, etag=prev_etag, last_modified=prev_lm) as reader:
+        if reader is None:
+            etag, last_modified, digest, sink = prev_etag, prev_lm, prev.get("sha256"), None
+        else:
+            etag = reader.meta.get("etag")
+            last_modified = reader.meta.get("last_modified")
+            if source_unchanged(prev, etag, last_modified):
+                digest, sink = prev.get("sha256"), None
+            else:
+                hasher = RowHasher(reader.fieldnames)   # huella de la fuente completa (antes de DQ)
+                sink = None if keep_existing else BronzeSink(src, table, reader.fieldnames)
+                try:
+                    for batch in reader.batches():
+                        for row in batch:
+                            hasher.update(row)
+                            if sink is not None:
+                                sink.write(row)
+                except Exception:
+                    if sink is not None:
+                        sink.abort()
+                    raise
+                digest = hasher.hexdigest()
+                if prev and prev.get("sha256") == digest:
+                    if sink is not None:
+                        sink.abort()   # mismo contenido: no se reescribe Bronze
+                    sink = None
+                elif keep_existing:
+                    log_table_result(run_id, log_run_month_for_dims, table, "SKIPPED_EXISTS", 0,
+                                     note=f"{key} ya existe (la fuente cambió)", source=source_type)
+                    return {"table": table, "status": "SKIPPED_EXISTS", "rows": 0, "key": key}
+                else:
+                    sink.close()
+
+    if sink is None:
+        _put_fingerprint(source_type, table, key, etag, last_modified, digest, run_id)
+        log_table_result(run_id, log_run_month_for_dims, table, "UNCHANGED", 0, note=f"{key} sin cambios", source=source_type)
+        return {"table": table, "status": "UNCHANGED", "rows": 0, "key": key}
+
+    cnt = sink.rows
+    _put_fingerprint(source_type, table, key, etag, last_modified, digest, run_id)
+    log_table_result(run_id, log_run_month_for_dims, table, "SUCCEEDED", cnt, note=f"wrote {key}", source=source_type,
+                     extra=sink.report())
+    return {"table": table, "status": "SUCCEEDED", "rows": cnt, "key": key, "dq": sink.dq()}
+
+def _process_dim_safe(src, allow_overwrite, run_id, log_run_month_for_dims):
+    """_process_dim con captura de error propia: una tabla fallida no detiene a las demás."""
+    table = src['table']
+    source_type = source_name(src)
+    try:
+        return _process_dim(src, allow_overwrite, run_id, log_run_month_for_dims)
+    except Exception as e:
+        log_error(run_id, source_type, table, "DIMS_SNAPSHOT", str(e))
+        return {"table": table, "status": "ERROR", "rows": 0, "error": str(e)}
+
+def _process_dims_once(csv_sources, allow_overwrite, run_id, log_run_month_for_dims, max_workers=DIMS_MAX_WORKERS):
+    """
+    Procesa snapshots de dimensiones UNA SOLA VEZ en esta ejecución
+    (customers, employees, products, productSubCategories, productCategories, stores, storesBudget, etc.)
+    - Las fuentes se procesan en un pool de hilos acotado (max_workers): casi todo es espera de red.
+    - Cada fuente captura su propio error (ERROR_TABLE) sin detener a las demás.
+    - Los resultados vuelven en el orden del manifest.
+    """
+    dim_sources = [s for s in csv_sources if s['table'] != "orders"]   # dims only
+    if not dim_sources:
+        return []
+    workers = max(1, min(int(max_workers), len(dim_sources)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dims") as pool:
+        return list(pool.map(
+            lambda src: _process_dim_safe(src, allow_overwrite, run_id, log_run_month_for_dims),
+            dim_sources))
 
+# ---------- Handler ----------
 def handler(event, context):
-    run_month = event.get("run_month")  # "YYYY-MM"
+    """
+    Ejemplos de invocación:
+    - Un mes:
+      { "run_month": "2011-06" }
+
+    - Varios meses (backfill, una sola descarga/pasada del CSV):
+      { "run_months": ["2011-06","2011-07","2011-08"] }
+
+    Flags:
+      "refresh_dims": false | true        # si true, procesa snapshots de dims 1 vez
+      "allow_overwrite": false | true     # si true, reescribe archivos existentes en Bronze
+      "dims_concurrency": 4               # hilos para dims (default env DIMS_MAX_WORKERS)
+    """
+    try:
+        return _run(event)
+    finally:
+        LOG.flush()   # lo que quede en buffer (también si hubo excepción)
+
+def _run(event):
+    # Normaliza entrada
+    run_months = []
+    if "run_months" in event and isinstance(event["run_months"], list):
+        run_months = event["run_months"]
+    elif "run_month" in event and isinstance(event["run_month"], str):
+        run_months = [event["run_month"]]
+    else:
+        raise ValueError("Debes enviar 'run_month' (string) o 'run_months' (lista de strings YYYY-MM).")
+
+    refresh_dims = bool(event.get("refresh_dims", False))
     allow_overwrite = bool(event.get("allow_overwrite", False))
-    run_id = f"csv_{run_month}_{int(datetime.utcnow().timestamp())}"
 
-    sources, defaults = _load_manifest()
-    csv_sources = [s for s in sources if s.get("type") == "csv_github"]
+    run_id = f"csv_{'_'.join(run_months)}_{ts()}"
+
+    # Carga manifest
+    try:
+        manifest = load_manifest(s3, BUCKET)   # cacheado entre invocaciones (ETag)
+    except Exception as e:
+        log_error(run_id, "github", "_manifest", "LOAD_MANIFEST", str(e))
+        raise
 
-    started = _now_iso()
-    total_written = 0
+    # Fuentes CSV (índice por tipo del manifest)
+    csv_sources = manifest.of_type("csv_github")
 
-    for src in csv_sources:
-        table = src['table']
-        url = src['url_or_query']
-        target_prefix = src['target_bronze_prefix']
+    results = {"run_id": run_id, "orders": [], "dims": []}
 
+    # 1) Dims una sola vez (si se pide)
+    if refresh_dims:
+        # Para logs de dims usamos el primer run_month (o "static" si prefieres)
+        log_rm = run_months[0] if run_months else "static"
         try:
-            # descarga
-            with urllib.request.urlopen(url) as resp:
-                raw = resp.read().decode('utf-8', errors='replace')
-            reader = csv.DictReader(io.StringIO(raw))
-
-            if table == "orders":
-                date_field = src.get("date_field", "OrderDate")
-                date_fmt = src.get("date_format", "MM-dd-yyyy")
-                y, m = _month_parts(run_month)
-                # salida particionada por year/month
-                key_prefix = f"{target_prefix}"
-                # opcional: limpiar partición si allow_overwrite
-                if allow_overwrite:
-                    _clear_prefix(BUCKET, key_prefix)
-
-                out_buf = io.StringIO()
-                writer = None
-                cnt = 0
-                for row in reader:
-                    if _match_run_month(row.get(date_field, ""), date_fmt, run_month):
-                        if writer is None:
-                            writer = csv.DictWriter(out_buf, fieldnames=reader.fieldnames)
-                            writer.writeheader()
-                        writer.writerow(row)
-                        cnt += 1
-                data = out_buf.getvalue().encode('utf-8')
-                key = f"{key_prefix}{table}_{run_month}.csv"
-                _upload_bytes(key, data)
-                total_written += cnt
+            workers = int(event.get("dims_concurrency", DIMS_MAX_WORKERS))
+            results["dims"] = _process_dims_once(csv_sources, allow_overwrite, run_id, log_rm, workers)
+            # para bronze_to_silver: {"dims_status": {...}} permite saltar run_dim_* sin cambios
+            results["dims_status"] = {d["table"]: d["status"] for d in results["dims"]}
+        except Exception as e:
+            log_error(run_id, "github", "_dims", "DIMS_SNAPSHOT", str(e))
+            raise
+        LOG.flush()   # fin de etapa dims
 
-            else:
-                # snapshot por mes
-                key_prefix = f"{target_prefix}"
-                if allow_overwrite:
-                    _clear_prefix(BUCKET, key_prefix)
-                data = io.StringIO()
-                w = csv.DictWriter(data, fieldnames=reader.fieldnames)
-                w.writeheader()
-                for row in reader:
-                    w.writerow(row)
-                _upload_bytes(f"{key_prefix}{table}.csv", data.getvalue().encode('utf-8'))
-
-            # log control por tabla
-            _put_control({
-                "run_id": run_id,
-                "run_month": run_month,
-                "source": "github",
-                "table": table,
-                "status": "SUCCEEDED",
-                "records_out": total_written,
-                "started_at": started,
-                "ended_at": _now_iso()
-            })
+    # 2) Orders: busca el descriptor de 'orders'
+    orders_src = manifest.source("orders")
+    if not orders_src or orders_src.get("type") != "csv_github":
+        log_error(run_id, "github", "orders", "ORDERS_SRC_NOT_FOUND", "No se encontró descriptor 'orders' en el manifest.")
+        raise RuntimeError("No se encontró descriptor 'orders' en el manifest.")
 
+    # 2a) Backfill: varios meses en una sola pasada sobre la fuente
+    if len(run_months) > 1:
+        try:
+            results["orders"] = _process_orders_backfill(orders_src, run_months, allow_overwrite, run_id)
         except Exception as e:
-            _put_error({
-                "run_id": run_id,
-                "ts": int(datetime.utcnow().timestamp()),
-                "source": "github",
-                "table": table,
-                "step": "ingest",
-                "severity": "ERROR",
-                "error_code": "CSV_GITHUB_INGEST",
-                "message": str(e)
-            })
+            log_error(run_id, source_name(orders_src), "orders", "ORDERS_BACKFILL_INGEST", str(e))
             raise
+        return results
 
-    return {"run_id": run_id, "written": total_written, "run_month": run_month}
-
-def _clear_prefix(bucket, prefix):
-    # borra objetos bajo el prefijo (para overwrite seguro)
-    s3r = boto3.resource('s3')
-    b = s3r.Bucket(bucket)
-    b.objects.filter(Prefix=prefix).delete()
+    # 2b) Un solo mes
+    for rm in run_months:
+        try:
+            res = _process_orders_month(orders_src, rm, allow_overwrite, run_id)
+            results["orders"].append(res)
+        except Exception as e:
+            log_error(run_id, source_name(orders_src), "orders", "ORDERS_MONTH_INGEST", str(e))
+            raise
 
+    return results
 
 def lambda_handler(event, context):
     return handler(event, context)
@@ -1,53 +1,31 @@
 # lambda_function.py
-import os, json, csv, io, boto3, pymysql
-from datetime import datetime, timezone
-
-s3 = boto3.client('s3')
-secrets = boto3.client('secretsmanager')
-dynamodb = boto3.resource('dynamodb')
-
-BUCKET = os.environ['BUCKET_NAME']
-CONTROL_TABLE = os.environ['CONTROL_TABLE']
-ERROR_TABLE = os.environ['ERROR_TABLE']
-SECRET_NAME = os.environ['MYSQL_SECRET_NAME']
-
-def _now_iso(): return datetime.now(timezone.utc).isoformat()
+"""
+Ingest MySQL -> Bronze. El SQL sale de url_or_query del manifest (tabla 'stores');
+lectura, formato, DQ y control los hace engine.ingest_table.
+
+Con "watermark" en el manifest la extracción es incremental (delta);
+{"full_snapshot": true} fuerza el snapshot completo de reconciliación.
+Con "parallel_ranges" en el manifest (o {"ranges": N}) el snapshot completo se
+lee en N rangos de pk en paralelo; un rango fallido se reintenta solo con
+{"run_id": <run_id original>, "retry_range": <ranges[i].retry_range>}.
+"""
+from engine import ingest_table, ts, LOG
 
 def handler(event, context):
     run_month = event.get("run_month")
-    run_id = f"stores_{run_month}_{int(datetime.utcnow().timestamp())}"
-
-    # lee secreto
-    sec = json.loads(secrets.get_secret_value(SecretId=SECRET_NAME)['SecretString'])
-    conn = pymysql.connect(
-        host=sec['host'], user=sec['username'], password=sec['password'],
-        database=sec.get('database'), port=int(sec.get('port',3306)),
-        connect_timeout=10, cursorclass=pymysql.cursors.DictCursor
-    )
-
-    sql = ("SELECT BusinessEntityID AS StoreID, "
-           "       Name AS StoreName, "
-           "       SalesPersonID AS EmployeeID "
-           "FROM Store;")
-    with conn.cursor() as cur:
-        cur.execute(sql); rows = cur.fetchall()
-    conn.close()
-
-    out = io.StringIO()
-    fn = ['StoreID','StoreName','EmployeeID']
-    w = csv.DictWriter(out, fieldnames=fn); w.writeheader()
-    for r in rows: w.writerow(r)
-
-    prefix = f"bronze/source=mysql/table=stores/"
-    s3.put_object(Bucket=BUCKET, Key=f"{prefix}stores.csv",
-                  Body=out.getvalue().encode('utf-8'))
-
-    dynamodb.Table(CONTROL_TABLE).put_item(Item={
-        "run_id": run_id, "run_month": run_month, "source":"mysql", "table":"stores",
-        "status":"SUCCEEDED","records_out": len(rows),
-        "started_at": _now_iso(), "ended_at": _now_iso()
-    })
-    return {"run_id": run_id, "records_out": len(rows)}
+    table = event.get("table", "stores")
+    run_id = event.get("run_id") or f"{table}_{run_month}_{ts()}"
+    try:
+        res = ingest_table(table, run_id, run_month, full_snapshot=bool(event.get("full_snapshot", False)),
+                           ranges=event.get("ranges"), retry_range=event.get("retry_range"))
+    finally:
+        LOG.flush()
+    out = {"run_id": run_id, "status": res["status"], "records_out": res["rows"], "dest_key": res["key"],
+           "extract_mode": res.get("extract_mode", "full"), "watermark_to": res.get("watermark_to"),
+           "dq": res["dq"], "metrics": res["metrics"]}
+    if "ranges" in res:
+        out["ranges"] = res["ranges"]
+    return out
 
 def lambda_handler(event, context):
     return handler(event, context)
@@ -0,0 +1,68 @@
+# manifest.py
+"""
+Manifest de fuentes (s3://<bucket>/bronze/source_metadata/sources.json)
+cacheado a nivel de módulo entre invocaciones en caliente.
+
+- La primera carga hace get_object + validación + índices.
+- Las siguientes revalidan con IfNoneMatch=<ETag>: si S3 responde 304 se
+  reutiliza el objeto ya parseado (sin bajar ni parsear el JSON).
+- Manifest.by_table / by_type evitan los next(...) sobre la lista de fuentes.
+
+Formato:
+    {
+      "sources": [
+        {"type": "csv_github", "table": "orders",
+         "url_or_query": "https://raw.githubusercontent.com/.../orders.csv",
+         "target_bronze_prefix": "bronze/source=github/table=orders/",
+         "date_field": "OrderDate", "date_format": "MM-dd-yyyy"},
+        {"type": "mysql", "table": "stores", "url_or_query": "SELECT ...", ...},
+        ...
+      ],
+      "run_defaults": {}
+    }
+"""
+import json, threading
+from botocore.exceptions import ClientError
+
+MANIFEST_KEY = "bronze/source_metadata/sources.json"
+
+_cache = {}                 # (bucket, key) -> Manifest
+_lock = threading.Lock()
+
+class Manifest:
+    def __init__(self, data, etag=None):
+        self.sources = data.get('sources', [])
+        self.run_defaults = data.get('run_defaults', {})
+        self.etag = etag
+        self.by_table = {}
+        self.by_type = {}
+        for s in self.sources:
+            if not s.get("table") or not s.get("type"):
+                raise ValueError(f"Fuente sin 'table'/'type' en el manifest: {s.get('source_name', s)}")
+            if s["table"] in self.by_table:
+                raise ValueError(f"Tabla duplicada en el manifest: {s['table']}")
+            self.by_table[s["table"]] = s
+            self.by_type.setdefault(s["type"], []).append(s)
+
+    def source(self, table, default=None):
+        return self.by_table.get(table, default)
+
+    def of_type(self, source_type):
+        return self.by_type.get(source_type, [])
+
+def load_manifest(s3, bucket, key=MANIFEST_KEY):
+    """Manifest validado e indexado; reutiliza el cacheado si el ETag no cambió."""
+    with _lock:
+        cached = _cache.get((bucket, key))
+    kwargs = {"IfNoneMatch": cached.etag} if cached and cached.etag else {}
+    try:
+        resp = s3.get_object(Bucket=bucket, Key=key, **kwargs)
+    except ClientError as e:
+        status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if cached and (status == 304 or e.response.get('Error', {}).get('Code') in ("304", "NotModified")):
+            return cached
+        raise
+    m = Manifest(json.loads(resp['Body'].read().decode('utf-8')), etag=resp.get('ETag'))
+    with _lock:
+        _cache[(bucket, key)] = m
+    return m
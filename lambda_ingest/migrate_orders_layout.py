@@ -0,0 +1,90 @@
+# migrate_orders_layout.py
+"""
+Mueve los objetos mensuales de Bronze del layout plano al particionado Hive:
+
+    table=orders/orders_2012-07.csv.gz  ->  table=orders/year=2012/month=7/orders_2012-07.csv.gz
+
+(también la variante table=orders_parquet/ si existe). ext_orders y bronze_orders
+están particionadas por year/month con projection: lo que quede en la raíz del
+prefijo ya no se lee.
+
+Uso:
+    python lambda_ingest/migrate_orders_layout.py <bucket> [--table orders] [--apply]
+
+- Sin --apply solo lista lo que haría (dry run).
+- Copia con la transferencia administrada de boto3 (multipart si hace falta),
+  verifica el tamaño del destino y recién ahí borra el original.
+- Si el destino ya existe (el mes se re-ingirió con el layout nuevo): mismo
+  tamaño -> borra el original; distinto -> CONFLICT, no toca nada.
+- Idempotente: re-ejecutarlo después de un corte sigue donde quedó.
+"""
+import re, sys, json, argparse
+import boto3
+from botocore.exceptions import ClientError
+from bronze_writer import month_partition, parquet_prefix
+
+# Solo objetos directamente en la raíz del prefijo (sin "/" en el resto del key)
+_FLAT_RX = re.compile(r"^(?P<table>[^/]+)_(?P<ym>\d{4}-\d{2})\.(?:csv(?:\.gz|\.zst)?|parquet)$")
+_PARTITIONED = {"partitioning": "year-month"}
+
+def _size(s3, bucket, key):
+    try:
+        return s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+def plan(s3, bucket, prefix, table):
+    """[(key origen, key destino, tamaño)] de los objetos planos de <prefix>."""
+    moves = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix, Delimiter="/"):
+        for o in page.get("Contents", []):
+            name = o["Key"][len(prefix):]
+            m = _FLAT_RX.match(name)
+            if not m or m.group("table") != table:
+                continue
+            moves.append((o["Key"], f"{prefix}{month_partition(_PARTITIONED, m.group('ym'))}{name}", o["Size"]))
+    return moves
+
+def migrate(s3, bucket, prefix, table, apply=False):
+    counts = {"MOVED": 0, "DEDUPED": 0, "CONFLICT": 0, "PLANNED": 0}
+    conflicts = []
+    for src, dst, size in plan(s3, bucket, prefix, table):
+        have = _size(s3, bucket, dst)
+        if have is not None and have != size:
+            counts["CONFLICT"] += 1
+            conflicts.append({"src": src, "dst": dst, "src_bytes": size, "dst_bytes": have})
+            print(f"CONFLICT {src} -> {dst} ({size} vs {have} bytes)")
+            continue
+        status = "DEDUPED" if have is not None else "MOVED"
+        if not apply:
+            counts["PLANNED"] += 1
+            print(f"DRY-RUN {status} {src} -> {dst}")
+            continue
+        if have is None:
+            s3.copy({"Bucket": bucket, "Key": src}, bucket, dst)
+            if _size(s3, bucket, dst) != size:
+                raise RuntimeError(f"Copia incompleta {dst}: el original {src} no se borra")
+        s3.delete_object(Bucket=bucket, Key=src)
+        counts[status] += 1
+        print(f"{status} {src} -> {dst}")
+    return {"prefix": prefix, "applied": apply, **counts, "conflicts": conflicts}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Bronze plano -> year=/month= (partition projection)")
+    ap.add_argument("bucket")
+    ap.add_argument("--table", default="orders")
+    ap.add_argument("--source", default="github")
+    ap.add_argument("--apply", action="store_true", help="mover de verdad (default: dry run)")
+    args = ap.parse_args(argv)
+
+    s3 = boto3.client("s3")
+    src = {"target_bronze_prefix": f"bronze/source={args.source}/table={args.table}/"}
+    results = [migrate(s3, args.bucket, p, args.table, args.apply)
+               for p in (src["target_bronze_prefix"], parquet_prefix(src))]
+    print(json.dumps(results, indent=2))
+    return results
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
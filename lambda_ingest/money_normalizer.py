@@ -0,0 +1,154 @@
+# money_normalizer.py
+"""
+Detección del formato monetario UNA vez por columna y conversión compilada por celda.
+
+Antes: clean_money() resolvía en cada celda la ambigüedad miles/decimal con
+varias re.sub y ramas heurísticas, aunque la columna entera viene en un solo
+formato (p. ej. "$60.749.820.000" en StoresBudget_master).
+Ahora:
+  - MoneyNormalizer.detect() elige separadores de miles/decimal con una muestra.
+  - normalize() valida con una regex precompilada y convierte con str.replace;
+    solo las celdas que no cumplen el formato detectado pasan por clean_money.
+  - Las celdas fuera de formato se cuentan y se guardan algunas muestras.
+"""
+import re
+from itertools import islice, chain
+
+# (miles, decimal) en orden de preferencia: ante empate gana el primero, que es
+# la lectura de clean_money (puntos de miles, coma decimal)
+FORMATS = [(".", ","), (",", "."), (" ", ","), (" ", "."), ("'", ".")]
+_PAD = r"[\s$€£]*"   # espacios y símbolo de moneda a cualquier lado
+
+SAMPLE_SIZE = 200
+MAX_OUTLIER_SAMPLES = 5
+
+def _compile(thousands, decimal):
+    th, dec = re.escape(thousands), re.escape(decimal)
+    number = rf"(?:\d{{1,3}}(?:{th}\d{{3}})+|\d+)(?:{dec}\d+)?"
+    return re.compile(rf"{_PAD}({number}){_PAD}")
+
+_COMPILED = {f: _compile(*f) for f in FORMATS}
+
+def clean_money(v):
+    """
+    Normaliza valores monetarios sin perder magnitud (heurística por celda).
+    Ejemplos:
+      "$60.749.820.000"    -> "60749820000"
+      "60.749.820,50"      -> "60749820.50"
+      60749820000 (num)    -> "60749820000"
+      "  60 749 820 000 "  -> "60749820000"
+    """
+    if v is None:
+        return None
+    # Si openpyxl ya entrega número, no fuerces a float (pierde formato), solo int si es entero
+    if isinstance(v, (int, float)):
+        return _number(v)
+
+    s = str(v).strip()
+    if not s:
+        return None
+
+    # Mantén solo dígitos, coma y punto (para decidir decimal)
+    s = re.sub(r"[^\d,\.]", "", s)
+
+    # Caso con ambos separadores: toma el ÚLTIMO como decimal, el resto son miles
+    if ("," in s) and ("." in s):
+        last = max(s.rfind(","), s.rfind("."))
+        int_part = re.sub(r"\D", "", s[:last])           # quita miles
+        dec_part = re.sub(r"\D", "", s[last+1:]) or "0"  # decimales (si hay)
+        return f"{int_part}.{dec_part}"
+
+    # Solo un tipo de separador
+    if "," in s:
+        # Asume coma decimal (estilo es-ES). Quita puntos/espacios y cambia coma por punto.
+        s = s.replace(".", "")
+        s = s.replace(",", ".")
+        return s
+    if "." in s:
+        # Ambiguo: podría ser miles o decimal. Si hay exactamente 3 dígitos tras el punto repetidos (miles),
+        # elimina todos los puntos (asume solo miles). Si parece decimal (p.ej. 123.45), deja el punto.
+        parts = s.split(".")
+        if all(len(p) == 3 for p in parts[1:]):  # patrón de miles 1.234.567
+            return "".join(parts)
+        else:
+            return s  # probablemente decimal
+
+    # Sin separadores: deja solo dígitos
+    digits = re.sub(r"\D", "", s)
+    return digits or None
+
+def _number(v):
+    # si es entero exacto, devuélvelo como entero; si no, el número con sus decimales
+    return str(int(v)) if float(v).is_integer() else f"{v}"
+
+class MoneyNormalizer:
+    """
+    Conversión compilada para un formato (miles, decimal) concreto.
+    Atributos de reporte: rows, empty, outliers, outlier_samples.
+    """
+    def __init__(self, fmt=FORMATS[0]):
+        self.fmt = fmt
+        self._match = _COMPILED[fmt].fullmatch
+        self._thousands, self._decimal = fmt
+        self.rows = 0
+        self.empty = 0
+        self.outliers = 0
+        self.outlier_samples = []
+
+    @classmethod
+    def detect(cls, sample_values):
+        """
+        Elige el formato que interpreta más celdas de texto de la muestra;
+        los números ya tipados (int/float de openpyxl) no cuentan.
+        """
+        values = [v for v in sample_values if isinstance(v, str) and v.strip()]
+        best, best_hits = FORMATS[0], -1
+        for f in FORMATS:
+            hits = sum(1 for v in values if _COMPILED[f].fullmatch(v))
+            if hits == len(values):
+                return cls(f)
+            if hits > best_hits:
+                best, best_hits = f, hits
+        return cls(best)
+
+    @classmethod
+    def from_rows(cls, rows, value, sample_size=SAMPLE_SIZE):
+        """
+        Detecta el formato con las primeras sample_size filas del iterador
+        (value(row) -> celda). Devuelve (normalizer, rows) con la muestra incluida.
+        """
+        rows = iter(rows)
+        sample = list(islice(rows, sample_size))
+        return cls.detect([value(r) for r in sample]), chain(sample, rows)
+
+    def normalize(self, v):
+        """Monto como string decimal ("60749820000", "1234.50") o None."""
+        self.rows += 1
+        if type(v) is str:
+            m = self._match(v)
+            if m is not None:
+                s = m.group(1).replace(self._thousands, "")
+                return s if self._decimal == "." else s.replace(self._decimal, ".")
+        elif v is None:
+            self.empty += 1
+            return None
+        elif isinstance(v, (int, float)):
+            return _number(v)
+        else:
+            return clean_money(v)
+        if not v.strip():
+            self.empty += 1
+            return None
+        self.outliers += 1
+        if len(self.outlier_samples) < MAX_OUTLIER_SAMPLES:
+            self.outlier_samples.append(v)
+        return clean_money(v)
+
+    def report(self):
+        return {
+            "money_format": {"thousands": self.fmt[0], "decimal": self.fmt[1]},
+            "rows": self.rows,
+            "empty": self.empty,
+            "outliers": self.outliers,
+            "outlier_samples": list(self.outlier_samples),
+        }
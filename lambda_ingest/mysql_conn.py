@@ -0,0 +1,124 @@
+# mysql_conn.py
+"""
+Conexiones MySQL reutilizadas entre invocaciones en caliente.
+
+- El secreto (Secrets Manager) se cachea MYSQL_SECRET_TTL_S segundos.
+- La conexión queda abierta a nivel de módulo; antes de reusarla se valida
+  con ping(reconnect=True).
+- connect() reintenta con backoff exponencial + jitter; un "Access denied"
+  (secreto rotado) invalida el secreto cacheado antes del reintento.
+- Pool pequeño por secreto (MYSQL_POOL_SIZE) para extracciones en paralelo
+  (un hilo = una conexión; ver pk_ranges en engine).
+- stats de la última obtención en el hilo actual (connect_ms, reused,
+  attempts, secret_cached) para métricas en el CONTROL_TABLE.
+"""
+import os, json, time, random, threading
+import boto3
+
+SECRET_TTL_S = int(os.environ.get("MYSQL_SECRET_TTL_S", "300"))
+CONNECT_RETRIES = int(os.environ.get("MYSQL_CONNECT_RETRIES", "3"))
+CONNECT_TIMEOUT_S = int(os.environ.get("MYSQL_CONNECT_TIMEOUT_S", "10"))
+POOL_SIZE = int(os.environ.get("MYSQL_POOL_SIZE", "4"))
+BASE_DELAY = 0.2
+MAX_DELAY = 5.0
+_ACCESS_DENIED = 1045
+
+class MySQLConnectionManager:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._secrets_client = None
+        self._secrets = {}   # secret_name -> (dict, fetched_at)
+        self._conns = {}     # secret_name -> [conexiones libres]
+        self._local = threading.local()
+
+    @property
+    def stats(self):
+        return getattr(self._local, "stats", {})
+
+    @stats.setter
+    def stats(self, value):
+        self._local.stats = value
+
+    # ---------- secreto ----------
+    def secret(self, name):
+        hit = self._secrets.get(name)
+        if hit and time.monotonic() - hit[1] < SECRET_TTL_S:
+            return hit[0], True
+        with self._lock:
+            if self._secrets_client is None:
+                self._secrets_client = boto3.client('secretsmanager')
+        sec = json.loads(self._secrets_client.get_secret_value(SecretId=name)['SecretString'])
+        self._secrets[name] = (sec, time.monotonic())
+        return sec, False
+
+    def invalidate_secret(self, name):
+        self._secrets.pop(name, None)
+
+    # ---------- conexión ----------
+    def _open(self, sec):
+        import pymysql
+        return pymysql.connect(
+            host=sec['host'], user=sec['username'], password=sec['password'],
+            database=sec.get('database'), port=int(sec.get('port', 3306)),
+            connect_timeout=CONNECT_TIMEOUT_S, cursorclass=pymysql.cursors.DictCursor
+        )
+
+    def get(self, name):
+        """Conexión lista para usar (reutilizada si sigue viva)."""
+        t0 = time.monotonic()
+        with self._lock:
+            free = self._conns.get(name)
+            conn = free.pop() if free else None
+        if conn is not None:
+            try:
+                conn.ping(reconnect=True)
+                self.stats = {"connect_ms": int((time.monotonic() - t0) * 1000), "reused": True,
+                              "attempts": 0, "secret_cached": True}
+                return conn
+            except Exception as e:
+                print("MYSQL PING ERROR:", e)
+                self._close(conn)
+        return self.connect(name, t0)
+
+    def connect(self, name, t0=None):
+        """Conexión nueva con reintentos (backoff exponencial + jitter)."""
+        t0 = t0 or time.monotonic()
+        last = None
+        for attempt in range(CONNECT_RETRIES + 1):
+            sec, cached = self.secret(name)
+            try:
+                conn = self._open(sec)
+                self.stats = {"connect_ms": int((time.monotonic() - t0) * 1000), "reused": False,
+                              "attempts": attempt + 1, "secret_cached": cached}
+                return conn
+            except Exception as e:
+                last = e
+                print(f"MYSQL CONNECT ERROR (intento {attempt + 1}):", e)
+                if getattr(e, "args", None) and e.args[0] == _ACCESS_DENIED:
+                    self.invalidate_secret(name)   # posible rotación del secreto
+                if attempt < CONNECT_RETRIES:
+                    time.sleep(random.uniform(0, min(MAX_DELAY, BASE_DELAY * (2 ** attempt))))
+        raise last
+
+    def release(self, name, conn):
+        """Devuelve la conexión al pool para la próxima invocación (solo si quedó limpia)."""
+        with self._lock:
+            free = self._conns.setdefault(name, [])
+            if len(free) < POOL_SIZE:
+                free.append(conn)
+                return
+        self._close(conn)
+
+    def discard(self, conn):
+        """Cierra una conexión en estado incierto (p. ej. result set sin leer)."""
+        self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+# única instancia por contenedor Lambda
+CONNECTIONS = MySQLConnectionManager()
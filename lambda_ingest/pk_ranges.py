@@ -0,0 +1,72 @@
+# pk_ranges.py
+"""
+Extracción en paralelo por rangos de primary key (fuentes mysql).
+
+En sources.json:
+  "pk": ["StoreID"],
+  "parallel_ranges": 4        # o {"ranges": 4} en el evento de la Lambda
+
+- Se usa el pk del manifest; solo se soporta un pk de una columna entera.
+- MIN/MAX del pk sobre el SELECT de url_or_query y N rangos contiguos
+  [lo, hi) (el último incluye hi; el primero también toma los pk NULL para que
+  no se pierdan filas que DQ luego manda a cuarentena).
+- Cada rango va por su propia conexión y a su propio objeto
+  <target_bronze_prefix><table>_part-<i>-of-<n>.csv[.gz], con entrada propia en
+  el CONTROL_TABLE (run_id = <run_id>#<table>#part-<i>-of-<n>) para reintentarlo
+  solo: {"run_id": <run_id original>, "retry_range": <pk_range del control>}.
+- Solo aplica al snapshot completo; el delta por watermark sigue siendo una consulta.
+"""
+import re
+
+_COLUMN_RX = re.compile(r"^\w+$")
+
+def pk_column(src):
+    """Columna pk para partir en rangos (ValueError si el pk es compuesto o falta)."""
+    pk = src.get("pk") or []
+    if len(pk) != 1 or not _COLUMN_RX.match(pk[0] or ""):
+        raise ValueError(f"parallel_ranges requiere un pk de una columna en '{src.get('table')}': {pk}")
+    return pk[0]
+
+def range_count(src, requested=None):
+    return max(1, int(requested or src.get("parallel_ranges") or 1))
+
+def split_ranges(lo, hi, count):
+    """
+    N rangos contiguos sobre [lo, hi] (enteros); menos si no hay claves suficientes.
+    Cada rango: {"index", "count", "lo", "hi", "last"} (hi exclusivo salvo en el último).
+    """
+    lo, hi = int(lo), int(hi)
+    count = max(1, min(int(count), hi - lo + 1))
+    step = -(-(hi - lo + 1) // count)   # ceil
+    out = []
+    for i in range(count):
+        start = lo + i * step
+        if start > hi:
+            break
+        last = start + step > hi
+        out.append({"index": i, "count": count, "lo": start, "hi": hi if last else start + step, "last": last})
+    for r in out:
+        r["count"] = len(out)
+    return out
+
+def range_label(rng):
+    return f"part-{int(rng['index']):04d}-of-{int(rng['count']):04d}"
+
+def part_name(name, rng):
+    return f"{name}_{range_label(rng)}"
+
+def part_prefix(name):
+    return f"{name}_part-"
+
+def bounds_query(query, column):
+    q = query.strip().rstrip(";")
+    return f"SELECT MIN(pk_src.`{column}`) AS lo, MAX(pk_src.`{column}`) AS hi FROM ({q}) AS pk_src"
+
+def range_query(query, column, rng):
+    """Envuelve el SELECT del manifest con el filtro del rango: (sql, params)."""
+    q = query.strip().rstrip(";")
+    col = f"pk_src.`{column}`"
+    cond = f"{col} >= %s AND {col} {'<=' if rng.get('last') else '<'} %s"
+    if int(rng["index"]) == 0:
+        cond = f"({cond}) OR {col} IS NULL"
+    return f"SELECT * FROM ({q}) AS pk_src WHERE {cond}", (int(rng["lo"]), int(rng["hi"]))
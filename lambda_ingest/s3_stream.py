@@ -0,0 +1,220 @@
+# s3_stream.py
+"""
+Streaming HTTP -> CSV -> S3 con memoria acotada.
+
+- open_csv_url: lee la respuesta HTTP por chunks y entrega filas (dict) una a una.
+- S3MultipartWriter: acumula bytes hasta PART_SIZE y los sube como partes de
+  un multipart upload; si el objeto completo cabe en una parte usa put_object.
+- CsvS3Writer: csv.DictWriter que vuelca a un S3MultipartWriter
+  (opcionalmente comprimido en streaming con gzip o zstd).
+
+El pico de memoria queda en ~PART_SIZE por objeto abierto,
+independiente del tamaño de la fuente.
+"""
+import os, io, csv, zlib, urllib.request, urllib.error
+from contextlib import contextmanager
+
+MIN_PART_SIZE = 5 * 1024 * 1024   # mínimo de S3 para partes (excepto la última)
+PART_SIZE = max(MIN_PART_SIZE, int(os.environ.get("S3_PART_SIZE_MB", "8")) * 1024 * 1024)
+HTTP_CHUNK_SIZE = 64 * 1024
+CSV_FLUSH_SIZE = 256 * 1024       # buffer de texto antes de codificar a bytes
+
+# compresión -> extensión que Athena usa para detectar el codec en tablas de texto
+COMPRESSION_EXT = {"gzip": ".gz", "zstd": ".zst"}
+
+def compression_ext(compression):
+    if not compression or compression == "none":
+        return ""
+    if compression not in COMPRESSION_EXT:
+        raise ValueError(f"compression no soportada: {compression} (gzip | zstd)")
+    return COMPRESSION_EXT[compression]
+
+class _Compressor:
+    """Compresión incremental (chunk a chunk) para no materializar el objeto completo."""
+    def __init__(self, compression):
+        if compression == "gzip":
+            self._c = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31 -> formato gzip
+            self._finish = self._c.flush
+        elif compression == "zstd":
+            try:
+                import zstandard
+            except ImportError as e:
+                raise RuntimeError("compression=zstd requiere el paquete zstandard en la Lambda") from e
+            self._c = zstandard.ZstdCompressor(level=3).compressobj()
+            self._finish = self._c.flush
+        else:
+            raise ValueError(f"compression no soportada: {compression}")
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data)
+
+    def flush(self) -> bytes:
+        return self._finish()
+
+@contextmanager
+def open_csv_url(url, encoding='utf-8', etag=None, last_modified=None):
+    """
+    csv.DictReader sobre la respuesta HTTP leída por chunks (sin resp.read() completo).
+    Uso:
+        with open_csv_url(url) as reader:
+            for row in reader: ...
+    - reader.http_headers: cabeceras de la respuesta (ETag, Last-Modified, ...).
+    - Con etag/last_modified se hace GET condicional; si la fuente responde
+      304 Not Modified se entrega None en lugar del reader.
+    """
+    req = urllib.request.Request(url)
+    if etag:
+        req.add_header("If-None-Match", etag)
+    if last_modified:
+        req.add_header("If-Modified-Since", last_modified)
+    try:
+        resp = urllib.request.urlopen(req)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            yield None
+            return
+        raise
+    with resp:
+        text = io.TextIOWrapper(io.BufferedReader(resp, buffer_size=HTTP_CHUNK_SIZE),
+                                encoding=encoding, errors='replace', newline='')
+        reader = csv.DictReader(text)
+        reader.http_headers = resp.headers
+        yield reader
+
+class S3MultipartWriter:
+    """
+    Escritura incremental a s3://bucket/key.
+    Uso:
+        with S3MultipartWriter(s3, bucket, key) as w:
+            w.write(b"...")
+    Si ocurre una excepción dentro del with, el multipart se aborta
+    (no queda objeto parcial en S3).
+    """
+    def __init__(self, s3, bucket, key, part_size=PART_SIZE, **put_kwargs):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(MIN_PART_SIZE, part_size)
+        self.put_kwargs = put_kwargs
+        self._buf = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self.bytes_written = 0
+        self.closed = False
+
+    def write(self, data: bytes):
+        self._buf += data
+        self.bytes_written += len(data)
+        if len(self._buf) >= self.part_size:
+            self._flush_part()
+
+    def _flush_part(self):
+        if self._upload_id is None:
+            self._upload_id = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **self.put_kwargs)['UploadId']
+        n = len(self._parts) + 1
+        etag = self.s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                   PartNumber=n, Body=bytes(self._buf))['ETag']
+        self._parts.append({"ETag": etag, "PartNumber": n})
+        self._buf = bytearray()
+
+    def close(self):
+        if self.closed:
+            return
+        if self._upload_id is None:
+            # objeto pequeño: una sola llamada
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buf), **self.put_kwargs)
+        else:
+            if self._buf:
+                self._flush_part()
+            self.s3.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                              MultipartUpload={"Parts": self._parts})
+        self._buf = bytearray()
+        self.closed = True
+
+    def abort(self):
+        if self.closed:
+            return
+        if self._upload_id is not None:
+            try:
+                self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception as e:
+                print("MULTIPART ABORT ERROR:", e)
+        self._buf = bytearray()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+class CsvS3Writer:
+    """
+    DictWriter en streaming hacia S3.
+    - El encabezado se escribe con la primera fila.
+    - header_if_empty=True escribe solo el encabezado si no hubo filas
+      (False deja el objeto vacío, como el comportamiento previo de orders).
+    - compression="gzip"|"zstd" comprime en streaming; el key debe llevar la
+      extensión (.gz/.zst) para que Athena la detecte.
+    """
+    def __init__(self, s3, bucket, key, fieldnames, header_if_empty=True, compression=None, **put_kwargs):
+        self.fieldnames = list(fieldnames or [])
+        self.header_if_empty = header_if_empty
+        self.rows = 0
+        self._out = S3MultipartWriter(s3, bucket, key, **put_kwargs)
+        self._zip = _Compressor(compression) if compression_ext(compression) else None
+        self.raw_bytes = 0
+        self._text = io.StringIO()
+        self._w = csv.DictWriter(self._text, fieldnames=self.fieldnames, extrasaction='ignore')
+
+    @property
+    def key(self):
+        return self._out.key
+
+    def writerow(self, row):
+        if self.rows == 0:
+            self._w.writeheader()
+        self._w.writerow(row)
+        self.rows += 1
+        if self._text.tell() >= CSV_FLUSH_SIZE:
+            self._drain()
+
+    @property
+    def bytes_written(self):
+        return self._out.bytes_written
+
+    def _drain(self):
+        data = self._text.getvalue()
+        if data:
+            raw = data.encode('utf-8')
+            self.raw_bytes += len(raw)
+            self._out.write(self._zip.compress(raw) if self._zip else raw)
+        self._text.seek(0)
+        self._text.truncate(0)
+
+    def close(self):
+        if self.rows == 0 and self.header_if_empty:
+            self._w.writeheader()
+        self._drain()
+        if self._zip:
+            # aun sin filas se cierra un stream válido (Athena falla con .gz de 0 bytes)
+            self._out.write(self._zip.flush())
+        self._out.close()
+
+    def abort(self):
+        self._out.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,43 @@
+# source_rows.py
+"""
+SourceRows: lo que entrega cada lector de connectors.py a engine.BronzeSink.
+"""
+import os
+from itertools import islice, chain
+
+BATCH_ROWS = int(os.environ.get("INGEST_BATCH_ROWS", "1000"))
+
+class SourceRows:
+    """
+    Filas de una fuente en streaming.
+    - fieldnames: columnas en orden de salida.
+    - iter(rows) fila a fila; rows.batches() en lotes de BATCH_ROWS.
+    - meta: datos del origen (cabeceras HTTP, key del archivo, ...).
+    """
+    def __init__(self, fieldnames, rows, meta=None, batch_size=BATCH_ROWS):
+        self.fieldnames = list(fieldnames or [])
+        self._rows = iter(rows)
+        self._batches = None
+        self.meta = meta or {}
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_batches(cls, fieldnames, batches, meta=None):
+        """Para lectores que ya leen por lotes (p. ej. fetchmany): se entregan tal cual."""
+        batches = iter(batches)
+        inst = cls(fieldnames, chain.from_iterable(batches), meta=meta)
+        inst._batches = batches
+        return inst
+
+    def __iter__(self):
+        return self._rows
+
+    def batches(self):
+        if self._batches is not None:
+            yield from self._batches
+            return
+        while True:
+            batch = list(islice(self._rows, self.batch_size))
+            if not batch:
+                return
+            yield batch
@@ -0,0 +1,86 @@
+# watermark.py
+"""
+Extracción incremental por watermark (fuentes mysql).
+
+En sources.json:
+  "watermark": {"column": "ModifiedDate", "full_snapshot_every_days": 30}
+  (o solo "watermark": "ModifiedDate")
+
+- La columna debe salir en el SELECT de url_or_query (con ese alias).
+- Estado en CONTROL_TABLE, run_id = "watermark#<source>#<table>":
+    value         último valor extraído (string; MySQL lo compara con la columna)
+    last_full_at  fecha del último snapshot completo
+- Sin estado, con full_snapshot=true o vencido full_snapshot_every_days se
+  hace snapshot completo (reconciliación); si no, solo WHERE col > value.
+"""
+import re
+from datetime import date, datetime, timezone, timedelta
+
+_COLUMN_RX = re.compile(r"^\w+$")
+
+def watermark_id(source, table):
+    return f"watermark#{source}#{table}"
+
+def watermark_config(src):
+    """{"column", "full_snapshot_every_days"} o None si la fuente no es incremental."""
+    wm = src.get("watermark")
+    if not wm:
+        return None
+    if isinstance(wm, str):
+        wm = {"column": wm}
+    if not _COLUMN_RX.match(wm.get("column") or ""):
+        raise ValueError(f"watermark.column inválida en '{src.get('table')}': {wm.get('column')}")
+    return wm
+
+def needs_full_snapshot(state, cfg, force=False, now=None):
+    if force or not state or not state.get("value"):
+        return True
+    days = cfg.get("full_snapshot_every_days")
+    if not days:
+        return False
+    last_full = state.get("last_full_at")
+    if not last_full:
+        return True
+    now = now or datetime.now(timezone.utc)
+    return now - datetime.fromisoformat(last_full) >= timedelta(days=int(days))
+
+def incremental_query(query, column):
+    """Envuelve el SELECT del manifest: solo filas con column > %s."""
+    q = query.strip().rstrip(";")
+    return f"SELECT * FROM ({q}) AS wm_src WHERE wm_src.`{column}` > %s"
+
+def _comparable(v):
+    """
+    Fechas -> texto ISO ("YYYY-MM-DD HH:MM:SS"): pymysql entrega datetime, pero
+    str para fechas que no puede convertir ('0000-00-00 ...'), y str vs datetime
+    no se comparan. El texto ISO ordena igual que la fecha; números quedan tal cual.
+    """
+    if isinstance(v, datetime):
+        return v.isoformat(sep=" ")
+    if isinstance(v, date):
+        return v.isoformat()
+    return v
+
+class WatermarkTracker:
+    """Máximo de la columna watermark sobre las filas leídas (incluye rechazadas por DQ)."""
+    def __init__(self, column):
+        self.column = column
+        self.max = None
+        self.rows = 0
+
+    def update(self, row):
+        self.rows += 1
+        v = _comparable(row.get(self.column))
+        if v is not None and v != "" and (self.max is None or v > self.max):
+            self.max = v
+
+    def merge(self, other):
+        """Suma otro tracker (p. ej. de un rango de pk leído en otro hilo)."""
+        self.rows += other.rows
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    @property
+    def value(self):
+        return None if self.max is None else str(self.max)
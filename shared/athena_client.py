@@ -0,0 +1,398 @@
+# athena_client.py
+"""
+Cliente Athena común a bronze_to_silver y h2-factsales-upsert-month.
+
+Vive en shared/ y cada lambda lo incluye con un symlink, así hay UNA sola
+implementación; el zip de despliegue se arma con shared/package_lambda.py, que
+escribe el contenido del archivo y no el enlace. Cada athena_utils.py
+arma su AthenaClient con sus variables de entorno y conserva run_athena /
+get_scalar_int como envoltorios.
+
+- Polling con backoff exponencial: primer poll a POLL_MIN_S (0.1 s), luego
+  x1.5 hasta POLL_MAX_S (2 s). Un DDL se ve terminado en ~0.1-0.3 s en lugar
+  de esperar el sleep fijo de 1 s; un CTAS largo no martilla la API.
+- Llamadas a la API reintentadas con backoff + jitter ante ThrottlingException,
+  TooManyRequestsException, 5xx y errores de red (API_RETRIES).
+- Consultas FAILED con AthenaError.Retryable (error de sistema de Athena) se
+  re-envían hasta `resubmit` veces; por defecto 1, 0 para sentencias no
+  idempotentes (INSERT).
+- timeout_s por consulta: al vencer se cancela (stop_query_execution) y se
+  levanta AthenaError.
+- QueryStats: Statistics de la ejecución con atributos tipados.
+- query(sql, inputs): caché de resultados (ResultCache, DynamoDB) con clave =
+  SQL normalizado + huellas de las entradas (ETag de objetos S3, versión de
+  tablas). Sin caché configurada usa el ResultReuse de Athena con la huella
+  en el texto de la consulta. Un INSERT/DELETE/MERGE/UPDATE exitoso sube la
+  versión de la tabla escrita: las entradas que dependían de ella dejan de
+  coincidir.
+- QueryTelemetry: una fila por sentencia ejecutada en el CONTROL_TABLE
+  (qid, paso, run_month, tiempos y bytes escaneados); ver athena_report.py.
+"""
+import os, re, json, time, random, uuid, hashlib, threading
+from datetime import datetime, timezone
+from botocore.exceptions import (ClientError, EndpointConnectionError, ConnectTimeoutError,
+                                 ReadTimeoutError, ConnectionClosedError)
+
+POLL_MIN_S = float(os.environ.get("ATHENA_POLL_MIN_S", "0.1"))
+POLL_MAX_S = float(os.environ.get("ATHENA_POLL_MAX_S", "2.0"))
+POLL_FACTOR = 1.5
+TIMEOUT_S = float(os.environ.get("ATHENA_TIMEOUT_S", "840"))   # bajo el máximo de Lambda (15 min)
+API_RETRIES = int(os.environ.get("ATHENA_API_RETRIES", "6"))
+API_BACKOFF_S = 0.2
+
+_THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException", "Throttling",
+                   "RequestLimitExceeded", "ProvisionedThroughputExceededException"}
+# errores de red / timeouts transitorios del SDK; el resto (ParamValidationError,
+# NoCredentialsError, NoRegionError, ...) no mejora reintentando
+_TRANSIENT_ERRORS = (EndpointConnectionError, ConnectTimeoutError, ReadTimeoutError, ConnectionClosedError)
+_TERMINAL = ("SUCCEEDED", "FAILED", "CANCELLED")
+
+CACHE_TTL_S = int(os.environ.get("ATHENA_CACHE_TTL_S", str(7 * 24 * 3600)))
+REUSE_MINUTES = int(os.environ.get("ATHENA_RESULT_REUSE_MIN", "60"))   # 0 = sin ResultReuse
+_CACHE_MAX_BYTES = 300_000   # límite de ítem DynamoDB (400 KB) con margen
+_WRITE_RX = re.compile(r'^\s*(?:INSERT\s+INTO|DELETE\s+FROM|MERGE\s+INTO|UPDATE)\s+([\w."]+)', re.I)
+
+class AthenaError(RuntimeError):
+    """Consulta FAILED / CANCELLED / timeout. qid y state para diagnóstico."""
+    def __init__(self, message, qid=None, state=None, retryable=False):
+        super().__init__(message)
+        self.qid = qid
+        self.state = state
+        self.retryable = retryable   # AthenaError.Retryable de la ejecución
+
+class QueryStats:
+    """Statistics de get_query_execution con tipos fijos (0 si Athena no lo informa)."""
+    def __init__(self, qid: str, state: str, statistics: dict = None):
+        s = statistics or {}
+        self.qid = qid
+        self.state = state
+        self.engine_ms: int = int(s.get("EngineExecutionTimeInMillis", 0))
+        self.queue_ms: int = int(s.get("QueryQueueTimeInMillis", 0))
+        self.planning_ms: int = int(s.get("QueryPlanningTimeInMillis", 0))
+        self.total_ms: int = int(s.get("TotalExecutionTimeInMillis", 0))
+        self.scanned_bytes: int = int(s.get("DataScannedInBytes", 0))
+        self.reused: bool = bool((s.get("ResultReuseInformation") or {}).get("ReusedPreviousResult", False))
+        self.wall_ms: int = 0        # start -> fin visto por el cliente (incluye latencia de poll)
+
+    @classmethod
+    def from_execution(cls, qe: dict):
+        return cls(qe["QueryExecutionId"], qe["Status"]["State"], qe.get("Statistics"))
+
+    @property
+    def poll_overhead_ms(self) -> int:
+        """Tiempo entre el fin real de la consulta y que el cliente lo vio."""
+        return max(0, self.wall_ms - self.total_ms) if self.wall_ms else 0
+
+    def as_dict(self):
+        return {"qid": self.qid, "state": self.state, "engine_ms": self.engine_ms,
+                "queue_ms": self.queue_ms, "planning_ms": self.planning_ms,
+                "total_ms": self.total_ms, "wall_ms": self.wall_ms,
+                "scanned_bytes": self.scanned_bytes, "reused": self.reused}
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, ClientError):
+        err = e.response.get("Error", {})
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return err.get("Code") in _THROTTLE_CODES or int(status) >= 500
+    return isinstance(e, _TRANSIENT_ERRORS)
+
+# ---------- caché de resultados ----------
+def normalize_sql(sql: str) -> str:
+    """Colapsa espacios fuera de literales y quita el ';' final (mismo SQL -> misma clave)."""
+    s = re.sub(r"('(?:[^']|'')*')|\s+", lambda m: m.group(1) or " ", sql).strip()
+    return s.rstrip(";").rstrip()
+
+def cache_key(sql: str, inputs: dict, database: str = "") -> str:
+    payload = json.dumps([database, normalize_sql(sql), sorted((inputs or {}).items())])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def written_table(sql: str, database: str) -> str:
+    """Tabla destino de un INSERT/DELETE/MERGE/UPDATE ("db.tabla"), o None."""
+    m = _WRITE_RX.match(sql)
+    if not m:
+        return None
+    name = m.group(1).replace('"', "").lower()
+    return name if "." in name else f"{database.lower()}.{name}"
+
+def s3_fingerprint(s3, uri: str) -> str:
+    """ETag del objeto s3://bucket/key, o huella del listado si uri termina en '/'."""
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    if not uri.endswith("/"):
+        return s3.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+    h, n = hashlib.sha256(), 0
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=key):
+        for o in page.get("Contents", []):
+            h.update(f"{o['Key']}\0{o['ETag']}\n".encode("utf-8"))
+            n += 1
+    return f"{n}:{h.hexdigest()[:16]}"
+
+class ResultCache:
+    """
+    Resultados de consultas en una tabla DynamoDB con hash key run_id (el
+    CONTROL_TABLE), como los checkpoints/fingerprints del ingest:
+      run_id = "athena_cache#<sha256>"  -> rows (JSON), qid, inputs, expires_at
+      run_id = "table_version#<db.tabla>" -> version (contador atómico)
+    """
+    def __init__(self, table, ttl_s: int = CACHE_TTL_S):
+        self.table = table
+        self.ttl_s = ttl_s
+
+    def get(self, key: str):
+        try:
+            item = self.table.get_item(Key={"run_id": f"athena_cache#{key}"}).get("Item")
+        except Exception as e:
+            print("ATHENA CACHE READ ERROR:", e)
+            return None
+        if not item or int(item.get("expires_at", 0)) < time.time():
+            return None
+        return json.loads(item["rows"])
+
+    def put(self, key: str, rows: list, qid: str, inputs: dict):
+        body = json.dumps(rows)
+        if len(body) > _CACHE_MAX_BYTES:
+            return
+        try:
+            self.table.put_item(Item={
+                "run_id": f"athena_cache#{key}",
+                "status": "CACHE",
+                "rows": body,
+                "qid": qid,
+                "inputs": json.dumps(inputs, sort_keys=True),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "expires_at": int(time.time()) + self.ttl_s,
+            })
+        except Exception as e:
+            print("ATHENA CACHE WRITE ERROR:", e)
+
+    def version(self, table_name: str) -> int:
+        item = self.table.get_item(Key={"run_id": f"table_version#{table_name}"},
+                                   ConsistentRead=True).get("Item")
+        return int(item["version"]) if item else 0
+
+    def bump(self, table_name: str):
+        # si falla, las entradas con huella del prefijo S3 de la tabla igual quedan invalidadas
+        try:
+            self.table.update_item(
+                Key={"run_id": f"table_version#{table_name}"},
+                UpdateExpression="ADD version :one SET updated_at = :now",
+                ExpressionAttributeValues={":one": 1, ":now": datetime.now(timezone.utc).isoformat()})
+        except Exception as e:
+            print(f"ATHENA CACHE BUMP ERROR {table_name}:", e)
+
+# ---------- telemetría por sentencia ----------
+_MONTH_SUFFIX = re.compile(r"_\d{4}_\d{1,2}$")
+
+def step_name(node: str) -> str:
+    """Paso sin el sufijo de mes ("ctas:tmp_dim_store_2012_7" -> "ctas:tmp_dim_store"), para agregar entre meses."""
+    return _MONTH_SUFFIX.sub("", node or "adhoc")
+
+class QueryTelemetry:
+    """
+    Filas run_id = "athena_query#<qid>", status = "ATHENA_QUERY" en el
+    CONTROL_TABLE (sin atributo 'table': el scheduler filtra por table/status).
+    record() solo encola; flush() escribe en lote al final del handler/DAG.
+    Un fallo de telemetría nunca rompe el ETL: se imprime y se sigue.
+    """
+    def __init__(self, table, source: str):
+        self.table = table
+        self.source = source
+        self._lock = threading.Lock()
+        self._buf = []
+
+    def record(self, stats: QueryStats, node: str = None, run_month: str = None):
+        item = {
+            "run_id": f"athena_query#{stats.qid}",
+            "status": "ATHENA_QUERY",
+            "source": self.source,
+            "step": step_name(node),
+            "node": node or "adhoc",
+            "state": stats.state,
+            "queue_ms": stats.queue_ms,
+            "planning_ms": stats.planning_ms,
+            "engine_ms": stats.engine_ms,
+            "total_ms": stats.total_ms,
+            "wall_ms": stats.wall_ms,
+            "scanned_bytes": stats.scanned_bytes,
+            "reused": stats.reused,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if run_month:
+            item["run_month"] = run_month
+        with self._lock:
+            self._buf.append(item)
+
+    def flush(self):
+        with self._lock:
+            items, self._buf = self._buf, []
+        if not items:
+            return
+        try:
+            with self.table.batch_writer(overwrite_by_pkeys=["run_id"]) as bw:
+                for it in items:
+                    bw.put_item(Item=it)
+        except Exception as e:
+            print(f"ATHENA TELEMETRY ERROR ({len(items)} filas):", e)
+
+class AthenaClient:
+    def __init__(self, client, database: str, output: str, workgroup: str = "primary",
+                 timeout_s: float = None, cache: ResultCache = None, telemetry: QueryTelemetry = None):
+        self.client = client
+        self.database = database
+        self.output = output
+        self.workgroup = workgroup
+        self.timeout_s = TIMEOUT_S if timeout_s is None else timeout_s
+        self.cache = cache
+        self.result_reuse = REUSE_MINUTES > 0
+        self.telemetry = telemetry
+        self.run_month = None   # etiqueta de telemetría por defecto (la fija el handler)
+
+    # ---------- llamadas a la API con reintentos ----------
+    def call(self, op: str, **kwargs):
+        """self.client.<op>(**kwargs) reintentando throttling / 5xx / red con backoff + jitter."""
+        for attempt in range(API_RETRIES + 1):
+            try:
+                return getattr(self.client, op)(**kwargs)
+            except Exception as e:
+                if attempt == API_RETRIES or not _retryable(e):
+                    raise
+                delay = API_BACKOFF_S * (2 ** attempt) * (0.5 + random.random())
+                print(f"ATHENA RETRY {op} ({attempt + 1}/{API_RETRIES}) en {delay:.2f}s: {e}")
+                time.sleep(delay)
+
+    def start(self, sql: str, database: str = None, reuse: bool = False) -> str:
+        kw = dict(QueryString=sql,
+                  QueryExecutionContext={"Database": database or self.database},
+                  ResultConfiguration={"OutputLocation": self.output},
+                  WorkGroup=self.workgroup)
+        if reuse and self.result_reuse:
+            kw["ResultReuseConfiguration"] = {"ResultReuseByAgeConfiguration": {
+                "Enabled": True, "MaxAgeInMinutes": REUSE_MINUTES}}
+        try:
+            # mismo token en los reintentos: si el primer intento llegó a Athena, no se duplica la consulta
+            return self.call("start_query_execution", ClientRequestToken=uuid.uuid4().hex, **kw)["QueryExecutionId"]
+        except ClientError as e:
+            if "ResultReuseConfiguration" not in kw or e.response.get("Error", {}).get("Code") != "InvalidRequestException":
+                raise
+            # workgroup sin engine v3: ResultReuse no disponible
+            print("ATHENA: ResultReuse no soportado por el workgroup, se desactiva:", e)
+            self.result_reuse = False
+            kw.pop("ResultReuseConfiguration")
+            return self.call("start_query_execution", ClientRequestToken=uuid.uuid4().hex, **kw)["QueryExecutionId"]
+
+    def execution(self, qid: str) -> dict:
+        return self.call("get_query_execution", QueryExecutionId=qid)["QueryExecution"]
+
+    def executions(self, qids) -> list:
+        """batch_get_query_execution (hasta 50 ids por llamada)."""
+        out = []
+        qids = list(qids)
+        for i in range(0, len(qids), 50):
+            out += self.call("batch_get_query_execution", QueryExecutionIds=qids[i:i + 50]).get("QueryExecutions", [])
+        return out
+
+    def stop(self, qid: str):
+        try:
+            self.call("stop_query_execution", QueryExecutionId=qid)
+        except Exception as e:
+            print(f"ATHENA STOP ERROR {qid}: {e}")
+
+    # ---------- telemetría ----------
+    def record(self, stats: QueryStats, step: str = None, run_month: str = None):
+        if self.telemetry and stats is not None:
+            self.telemetry.record(stats, step, run_month or self.run_month)
+
+    def flush(self):
+        if self.telemetry:
+            self.telemetry.flush()
+
+    # ---------- ejecución síncrona ----------
+    def wait(self, qid: str, timeout_s: float = None, started: float = None, step: str = None) -> QueryStats:
+        """Espera a un estado terminal con backoff. Devuelve QueryStats; AthenaError si no SUCCEEDED."""
+        t0 = started or time.monotonic()
+        deadline = t0 + (self.timeout_s if timeout_s is None else timeout_s)
+        delay = POLL_MIN_S
+        while True:
+            time.sleep(delay)
+            qe = self.execution(qid)
+            if qe["Status"]["State"] in _TERMINAL:
+                break
+            if time.monotonic() >= deadline:
+                self.stop(qid)
+                raise AthenaError(f"Athena TIMEOUT tras {int(time.monotonic() - t0)}s (qid={qid})",
+                                  qid=qid, state="TIMEOUT")
+            delay = min(POLL_MAX_S, delay * POLL_FACTOR, max(0.0, deadline - time.monotonic()) + 0.01)
+        stats = QueryStats.from_execution(qe)
+        stats.wall_ms = int((time.monotonic() - t0) * 1000)
+        self.record(stats, step)
+        if stats.state != "SUCCEEDED":
+            status = qe["Status"]
+            raise AthenaError(f"Athena {stats.state}: {status.get('StateChangeReason', 'Unknown')}",
+                              qid=qid, state=stats.state,
+                              retryable=bool((status.get("AthenaError") or {}).get("Retryable")))
+        return stats
+
+    def run(self, sql: str, database: str = None, timeout_s: float = None, resubmit: int = 1,
+            reuse: bool = False, step: str = None) -> QueryStats:
+        """
+        Ejecuta UNA sentencia y espera a que termine. Devuelve QueryStats.
+        resubmit: re-envíos ante FAILED con AthenaError.Retryable (0 = nunca).
+        step: nombre del paso para la telemetría.
+        Si la sentencia escribe una tabla, invalida su caché (sube la versión).
+        """
+        for attempt in range(resubmit + 1):
+            t0 = time.monotonic()
+            qid = self.start(sql, database, reuse=reuse)
+            try:
+                stats = self.wait(qid, timeout_s, started=t0, step=step)
+                break
+            except AthenaError as e:
+                if attempt == resubmit or not e.retryable:
+                    raise
+                print(f"ATHENA RESUBMIT ({attempt + 1}/{resubmit}) qid={qid}: {e}")
+        target = written_table(sql, database or self.database)
+        if target and self.cache:
+            self.cache.bump(target)
+        return stats
+
+    def table_version(self, table_name: str) -> int:
+        """Versión de la tabla para usar como entrada de query() (0 sin caché)."""
+        return self.cache.version(table_name.lower()) if self.cache else 0
+
+    def query(self, sql: str, inputs: dict = None, database: str = None, max_results: int = None,
+              step: str = None) -> list:
+        """
+        SELECT con resultado (filas con cabecera, ver results()).
+        inputs: {nombre: huella} de TODO lo que lee la consulta (s3_fingerprint,
+        table_version). Con inputs el resultado se cachea; sin inputs siempre va
+        a Athena (no sabemos cuándo cambia).
+        """
+        if inputs is None:
+            return self.results(self.run(sql, database, step=step).qid, max_results)
+        key = cache_key(sql, inputs, database or self.database)
+        if self.cache:
+            rows = self.cache.get(key)
+            if rows is not None:
+                print(f"ATHENA CACHE HIT {key[:12]}")
+                return rows
+        # la huella en el texto hace que el ResultReuse de Athena solo coincida con las mismas entradas
+        stats = self.run(f"-- inputs:{key}\n{sql}", database, reuse=True, step=step)
+        if stats.reused:
+            print(f"ATHENA RESULT REUSE {stats.qid}")
+        rows = self.results(stats.qid, max_results)
+        if self.cache:
+            self.cache.put(key, rows, stats.qid, inputs)
+        return rows
+
+    def results(self, qid: str, max_results: int = None) -> list:
+        """Filas (lista de listas de str|None) incluida la cabecera, paginando."""
+        rows, token = [], None
+        while True:
+            kw = {"QueryExecutionId": qid}
+            if token: kw["NextToken"] = token
+            if max_results: kw["MaxResults"] = max_results
+            resp = self.call("get_query_results", **kw)
+            rows += [[d.get("VarCharValue") for d in r.get("Data", [])]
+                     for r in resp.get("ResultSet", {}).get("Rows", [])]
+            token = resp.get("NextToken")
+            if not token or (max_results and len(rows) >= max_results):
+                return rows
@@ -0,0 +1,766 @@
+# athena_duckdb.py
+"""
+Backend local de Athena sobre DuckDB, para correr y cronometrar el ETL sin AWS.
+
+Implementa la parte de la API de boto3 que usan AthenaClient y glue_catalog:
+  - local_athena(s3): start_query_execution / get_query_execution /
+    batch_get_query_execution / stop_query_execution / get_query_results.
+    Las consultas corren en hilos (ATHENA_LOCAL_THREADS, cada una con su
+    cursor DuckDB), así el AthenaDag mantiene su paralelismo.
+  - local_glue(): get_table / create_table / update_table / delete_table /
+    get_tables / batch_delete_table.
+Así athena_utils arma el mismo AthenaClient (reintentos, caché, telemetría)
+y run_athena / get_scalar_int no cambian. Se activa con ATHENA_BACKEND=duckdb.
+
+Datos: todo I/O de S3 pasa por el cliente boto3 recibido. Apuntado a moto
+(mock_aws en proceso o moto_server / MinIO con AWS_ENDPOINT_URL) el pipeline
+completo queda local; los objetos leídos se bajan una vez a
+<ATHENA_LOCAL_DIR>/s3/ (revalidados por ETag).
+
+Catálogo: tablas en formato TableInput de Glue en <ATHENA_LOCAL_DIR>/catalog.json,
+compartido entre procesos (ingest / bronze_to_silver / h2 / scripts).
+
+Sentencias soportadas (dialecto Athena / Trino usado en este repo):
+  - CREATE EXTERNAL TABLE ... [PARTITIONED BY] [ROW FORMAT SERDE | STORED AS
+    PARQUET] LOCATION ... [TBLPROPERTIES]: CSV (OpenCSVSerde) o Parquet.
+    Con projection (storage.location.template) un WHERE clave = literal
+    lista solo esa carpeta, igual que Athena; sin projection se leen las
+    carpetas clave=valor (MSCK REPAIR / ADD PARTITION son no-op).
+  - CREATE TABLE ... WITH (format='PARQUET', external_location=...) AS SELECT:
+    falla si la ubicación no está vacía (HIVE_PATH_ALREADY_EXISTS).
+  - INSERT INTO <tabla Parquet> SELECT (columnas por posición).
+  - CREATE [OR REPLACE] VIEW, DROP TABLE / VIEW [IF EXISTS], SELECT / WITH.
+  - Traducción: date_parse / date_format (formato MySQL -> strftime),
+    TRY(CAST(..)) -> TRY_CAST, TRY(date_parse(..)) -> try_strptime,
+    regexp_like -> regexp_matches, división entera como Trino, "$path".
+No soportado (FAILED con el motivo): CTAS / INSERT particionados, CTAS a texto.
+
+DataScannedInBytes = tamaño de los objetos S3 que la consulta lee tras el
+pruning de particiones: comparable entre corridas, no con la factura.
+"""
+import os, re, copy, json, time, uuid, shutil, tempfile, threading
+from datetime import date, datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from botocore.exceptions import ClientError
+
+LOCAL_DIR = os.environ.get("ATHENA_LOCAL_DIR", os.path.join(tempfile.gettempdir(), "athena_duckdb"))
+THREADS = int(os.environ.get("ATHENA_LOCAL_THREADS", "4"))
+PAGE_SIZE = 1000   # filas por get_query_results, como Athena
+_NO_NULL = "__athena_duckdb_null__"   # OpenCSVSerde no tiene NULL en texto: campo vacío = ''
+
+_CSV_SERDE = "org.apache.hadoop.hive.serde2.OpenCSVSerde"
+_PARQUET_SERDE = "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"
+_PARQUET_IN = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat"
+
+_HIVE_TO_DUCK = {"string": "VARCHAR", "int": "INTEGER", "integer": "INTEGER", "bigint": "BIGINT",
+                 "smallint": "SMALLINT", "tinyint": "TINYINT", "double": "DOUBLE", "float": "FLOAT",
+                 "real": "FLOAT", "boolean": "BOOLEAN", "date": "DATE", "timestamp": "TIMESTAMP"}
+_DUCK_TO_HIVE = {"INTEGER": "int", "BIGINT": "bigint", "HUGEINT": "bigint", "SMALLINT": "smallint",
+                 "TINYINT": "tinyint", "DOUBLE": "double", "FLOAT": "float", "BOOLEAN": "boolean",
+                 "DATE": "date", "TIMESTAMP": "timestamp", "VARCHAR": "string"}
+
+# formato de date_parse / date_format (MySQL) -> strftime de DuckDB
+_MYSQL_FMT = {"%e": "%-d", "%c": "%-m", "%i": "%M", "%s": "%S", "%k": "%-H", "%h": "%I",
+              "%l": "%-I", "%T": "%H:%M:%S", "%r": "%I:%M:%S %p", "%M": "%B", "%W": "%A", "%v": "%V"}
+
+def _duck_type(t: str) -> str:
+    t = t.strip().lower()
+    if t.startswith("decimal"):
+        return t.upper()
+    if t.startswith(("varchar", "char")):
+        return "VARCHAR"
+    return _HIVE_TO_DUCK.get(t, "VARCHAR")
+
+def _hive_type(t: str) -> str:
+    return t.lower() if t.upper().startswith("DECIMAL") else _DUCK_TO_HIVE.get(t.upper(), "string")
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _lit(s: str) -> str:
+    return "'" + s.replace("'", "''") + "'"
+
+def _split_uri(uri: str):
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+def _client_error(code: str, message: str, op: str):
+    return ClientError({"Error": {"Code": code, "Message": message}}, op)
+
+# ---------- SQL: máscara de literales, paréntesis, traducción ----------
+_MASK_RX = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", re.S)
+
+def _mask(sql: str) -> str:
+    """Mismo largo que sql, con el interior de literales / identificadores / comentarios en blanco."""
+    return _MASK_RX.sub(lambda m: m.group()[0] + " " * (len(m.group()) - 2) + m.group()[-1]
+                        if m.group()[0] in "'\"" else " " * len(m.group()), sql)
+
+def _close_paren(masked: str, i: int) -> int:
+    """Índice del ')' que cierra el '(' en masked[i]."""
+    depth = 0
+    for j in range(i, len(masked)):
+        if masked[j] == "(":
+            depth += 1
+        elif masked[j] == ")":
+            depth -= 1
+            if depth == 0:
+                return j
+    raise ValueError("paréntesis sin cerrar")
+
+def _split_top(s: str, sep: str = ",") -> list:
+    masked, parts, depth, last = _mask(s), [], 0, 0
+    for i, c in enumerate(masked):
+        depth += (c in "([") - (c in ")]")
+        if c == sep and depth == 0:
+            parts.append(s[last:i])
+            last = i + 1
+    parts.append(s[last:])
+    return [p.strip() for p in parts if p.strip()]
+
+def _rewrite_calls(sql: str, name: str, fn) -> str:
+    """Reemplaza cada llamada name(args) por fn([args ya reescritos]) (fuera de literales)."""
+    rx = re.compile(rf"(?<![\w.]){name}\s*\(", re.I)
+    masked, out, pos = _mask(sql), [], 0
+    while True:
+        m = rx.search(masked, pos)
+        if not m:
+            return "".join(out) + sql[pos:]
+        close = _close_paren(masked, m.end() - 1)
+        args = [_rewrite_calls(a, name, fn) for a in _split_top(sql[m.end():close])]
+        out += [sql[pos:m.start()], fn(args)]
+        pos = close + 1
+
+def _strftime_format(arg: str) -> str:
+    if not (arg.startswith("'") and arg.endswith("'")):
+        return arg
+    return _lit(re.sub(r"%.", lambda m: _MYSQL_FMT.get(m.group(), m.group()), arg[1:-1].replace("''", "'")))
+
+def _try(args):
+    inner = args[0]
+    head = re.match(r"(CAST|strptime)\s*\(", inner, re.I)
+    if head and _close_paren(_mask(inner), head.end() - 1) == len(inner) - 1:
+        return ("TRY_CAST(" if head.group(1).upper() == "CAST" else "try_strptime(") + inner[head.end():]
+    return f"TRY({inner})"
+
+def translate(sql: str) -> str:
+    """Athena / Trino -> DuckDB para las funciones que usa este repo."""
+    sql = _rewrite_calls(sql, "date_parse", lambda a: f"strptime({a[0]}, {_strftime_format(a[1])})")
+    sql = _rewrite_calls(sql, "date_format", lambda a: f"strftime({a[0]}, {_strftime_format(a[1])})")
+    sql = _rewrite_calls(sql, "regexp_like", lambda a: f"regexp_matches({', '.join(a)})")
+    return _rewrite_calls(sql, "TRY", _try)
+
+def _strip_sql(sql: str) -> str:
+    """Sin comentarios iniciales (p. ej. '-- inputs:<clave>' de AthenaClient.query) ni ';' final."""
+    sql = re.sub(r"^(?:\s*(?:--[^\n]*(?:\n|$)|/\*.*?\*/))*", "", sql, flags=re.S).strip()
+    return sql.rstrip(";").strip()
+
+_PROPS_RX = re.compile(r"'((?:[^'\\]|\\.)*)'\s*=\s*'((?:[^'\\]|\\.)*)'")
+
+def _props(text: str) -> dict:
+    unescape = lambda s: re.sub(r"\\(.)", r"\1", s)
+    return {unescape(k): unescape(v) for k, v in _PROPS_RX.findall(text or "")}
+
+def _columns(text: str) -> list:
+    cols = []
+    for part in _split_top(text):
+        name, _, typ = part.partition(" ")
+        cols.append({"Name": name.strip("`\"").lower(), "Type": re.sub(r"\s+", "", typ).lower()})
+    return cols
+
+# ---------- catálogo ----------
+class LocalCatalog:
+    """{db: {tabla: TableInput}} en JSON; se relee si otro proceso lo modificó."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._mtime = None
+        self._dbs = {}
+
+    def _load(self):
+        try:
+            st = os.stat(self.path)
+            mtime = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            with open(self.path, encoding="utf-8") as f:
+                self._dbs = json.load(f)
+            self._mtime = mtime
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._dbs, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        st = os.stat(self.path)
+        self._mtime = (st.st_mtime_ns, st.st_size)
+
+    def get(self, db: str, name: str):
+        with self._lock:
+            self._load()
+            return self._dbs.get(db.lower(), {}).get(name.lower())
+
+    def tables(self, db: str) -> list:
+        with self._lock:
+            self._load()
+            return list(self._dbs.get(db.lower(), {}).values())
+
+    def put(self, db: str, table: dict):
+        with self._lock:
+            self._load()
+            self._dbs.setdefault(db.lower(), {})[table["Name"].lower()] = table
+            self._save()
+
+    def delete(self, db: str, name: str) -> bool:
+        with self._lock:
+            self._load()
+            found = self._dbs.get(db.lower(), {}).pop(name.lower(), None) is not None
+            if found:
+                self._save()
+            return found
+
+def _is_view(t: dict) -> bool:
+    return t.get("TableType") == "VIRTUAL_VIEW"
+
+def _is_parquet(t: dict) -> bool:
+    sd = t.get("StorageDescriptor", {})
+    return "parquet" in ((sd.get("SerdeInfo") or {}).get("SerializationLibrary") or "").lower() \
+        or "parquet" in (sd.get("InputFormat") or "").lower()
+
+def _parquet_table(name: str, columns: list, location: str) -> dict:
+    return {"Name": name, "TableType": "EXTERNAL_TABLE", "Parameters": {"EXTERNAL": "TRUE", "classification": "parquet"},
+            "PartitionKeys": [],
+            "StorageDescriptor": {"Columns": columns, "Location": location, "InputFormat": _PARQUET_IN,
+                                  "SerdeInfo": {"SerializationLibrary": _PARQUET_SERDE}}}
+
+# ---------- motor ----------
+class _Scan:
+    """Lo que leyó una consulta: bytes (para Statistics) y tablas ya registradas en el cursor."""
+    def __init__(self):
+        self.bytes = 0
+        self.views = set()
+
+class DuckDbEngine:
+    def __init__(self, s3, local_dir: str = None):
+        local_dir = local_dir or LOCAL_DIR
+        try:
+            import duckdb
+        except ImportError as e:
+            raise RuntimeError("ATHENA_BACKEND=duckdb requiere el paquete duckdb (pip install duckdb)") from e
+        self.s3 = s3
+        self.s3_root = os.path.join(local_dir, "s3")
+        self.tmp_dir = os.path.join(local_dir, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.catalog = catalog(local_dir)
+        self.con = duckdb.connect()
+        self._fetch_lock = threading.Lock()
+
+    # ----- S3 -----
+    def _list(self, uri: str) -> list:
+        bucket, key = _split_uri(uri)
+        out = []
+        for page in self.s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=key):
+            out += [(bucket, o) for o in page.get("Contents", [])
+                    if o["Size"] > 0 and not o["Key"].endswith(("/", "$folder$", "_SUCCESS"))]
+        return out
+
+    def _fetch(self, bucket: str, obj: dict) -> str:
+        path = os.path.join(self.s3_root, bucket, obj["Key"])
+        with self._fetch_lock:
+            tag = path + ".etag"
+            if os.path.exists(path) and os.path.exists(tag) and open(tag).read() == obj["ETag"]:
+                return path
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.s3.download_file(bucket, obj["Key"], path)
+            with open(tag, "w") as f:
+                f.write(obj["ETag"])
+        return path
+
+    def _is_empty(self, uri: str) -> bool:
+        bucket, key = _split_uri(uri)
+        return not self.s3.list_objects_v2(Bucket=bucket, Prefix=key, MaxKeys=1).get("Contents")
+
+    def _upload(self, path: str, uri: str):
+        bucket, key = _split_uri(uri)
+        self.s3.upload_file(path, bucket, key)
+
+    # ----- tablas -> vistas temporales del cursor -----
+    def _partition_layout(self, t: dict):
+        """[(clave, tipo de projection, dígitos)], template con ${clave}."""
+        params = t.get("Parameters") or {}
+        keys = [(k["Name"].lower(), params.get(f"projection.{k['Name'].lower()}.type"),
+                 params.get(f"projection.{k['Name'].lower()}.digits")) for k in t.get("PartitionKeys", [])]
+        loc = t["StorageDescriptor"]["Location"]
+        loc = loc if loc.endswith("/") else loc + "/"
+        template = params.get("storage.location.template") or loc + "".join(f"{k}=${{{k}}}/" for k, _, _ in keys)
+        return keys, loc, template
+
+    def _pinned(self, sql: str, keys) -> dict:
+        """Valores de partición fijados con clave = literal (único) en la consulta."""
+        pinned = {}
+        for k, ptype, digits in keys:
+            vals = {a or b for a, b in re.findall(
+                rf"(?<![\w$])(?:\w+\.)?{k}\s*=\s*(?:'([^']*)'|(-?\d+))(?![\w.])", sql, re.I)}
+            if len(vals) == 1:
+                v = vals.pop()
+                if ptype == "integer":
+                    v = str(int(v)).zfill(int(digits or 0))
+                pinned[k] = v
+        return pinned
+
+    def _files(self, t: dict, sql: str, scan: _Scan):
+        """Objetos de la tabla (con pruning por projection) bajados a disco: [(ruta local, uri s3)]."""
+        keys, loc, template = self._partition_layout(t)
+        prefix = loc
+        if keys:
+            pinned = self._pinned(sql, keys)
+            if len(pinned) == len(keys):
+                prefix = template
+                for k, v in pinned.items():
+                    prefix = prefix.replace(f"${{{k}}}", v)
+            else:
+                # el prefijo fijo del template (hasta la primera clave sin valor)
+                prefix = template.split("${", 1)[0]
+            prefix = prefix[:prefix.rfind("/") + 1]
+        files = []
+        for bucket, obj in self._list(prefix):
+            uri = f"s3://{bucket}/{obj['Key']}"
+            if keys and not self._partition_regex(template, keys[0][0]).match(uri):
+                continue   # fuera de una carpeta de partición: Athena no lo lee
+            scan.bytes += obj["Size"]
+            files.append((self._fetch(bucket, obj), uri))
+        return sorted(files)
+
+    @staticmethod
+    def _partition_regex(template: str, key: str):
+        rx = re.escape(template)
+        for k in re.findall(r"\$\{(\w+)\}", template):
+            rx = rx.replace(re.escape(f"${{{k}}}"), "([^/]+)" if k == key else "[^/]+")
+        return re.compile("^" + rx)
+
+    def _table_select(self, cur, t: dict, sql: str, scan: _Scan) -> str:
+        sd = t["StorageDescriptor"]
+        cols = sd.get("Columns", [])
+        keys, _, template = self._partition_layout(t)
+        files = self._files(t, sql, scan)
+        with_path = '"$path"' in sql
+        proj = [f"TRY_CAST({_q(c['Name'])} AS {_duck_type(c['Type'])}) AS {_q(c['Name'])}" for c in cols]
+        paths = "[" + ", ".join(_lit(p) for p, _ in files) + "]"
+        if files and _is_parquet(t):
+            src = f"read_parquet({paths}, union_by_name = true, filename = true)"
+            # columna declarada que no está en los archivos: NULL (como Athena con Parquet)
+            have = {r[0].lower() for r in cur.execute(f"DESCRIBE SELECT * FROM {src}").fetchall()}
+            proj = [p if c["Name"].lower() in have else f"CAST(NULL AS {_duck_type(c['Type'])}) AS {_q(c['Name'])}"
+                    for p, c in zip(proj, cols)]
+        pkeys = [{"Name": p["Name"].lower(), "Type": p["Type"]} for p in t.get("PartitionKeys", [])]
+        for p in pkeys:
+            rx = self._partition_regex(template, p["Name"]).pattern
+            proj.append(f"TRY_CAST(regexp_extract(\"$path\", {_lit(rx)}, 1) AS {_duck_type(p['Type'])}) AS {_q(p['Name'])}")
+        if with_path:
+            proj.append('"$path"')
+        if not files:
+            empty = [f"CAST(NULL AS {_duck_type(c['Type'])}) AS {_q(c['Name'])}" for c in cols + pkeys]
+            if with_path:
+                empty.append('CAST(NULL AS VARCHAR) AS "$path"')
+            return f"SELECT {', '.join(empty)} WHERE false"
+        root = os.path.join(self.s3_root, "")
+        path_expr = f"'s3://' || substr(filename, {len(root) + 1})"
+        if not _is_parquet(t):
+            serde = (sd.get("SerdeInfo") or {}).get("Parameters") or {}
+            header = int((t.get("Parameters") or {}).get("skip.header.line.count", "0")) > 0
+            # OpenCSVSerde: posicional y todo texto (vacío = ''); el tipo declarado se aplica con TRY_CAST
+            columns = "{" + ", ".join(f"{_lit(c['Name'])}: 'VARCHAR'" for c in cols) + "}"
+            delim, quote = _lit(serde.get("separatorChar", ",")), _lit(serde.get("quoteChar", '"'))
+            escape = _lit(serde.get("escapeChar", "\\"))
+            src = (f"read_csv({paths}, columns = {columns}, header = {str(header).lower()}, "
+                   f"delim = {delim}, quote = {quote}, escape = {escape}, nullstr = {_lit(_NO_NULL)}, "
+                   f"null_padding = true, filename = true)")
+        return f"SELECT {', '.join(proj)} FROM (SELECT *, {path_expr} AS \"$path\" FROM {src})"
+
+    def _bind(self, cur, sql: str, database: str, scan: _Scan) -> str:
+        """Registra en el cursor las tablas / vistas del catálogo que lee sql y las reemplaza por su vista temporal."""
+        masked = _mask(sql)
+        out, pos = [], 0
+        rx = re.compile(r"(?<![\w$.])([A-Za-z_]\w*)(?:\s*\.\s*([A-Za-z_]\w*))?")
+        for m in rx.finditer(masked):
+            db, name = (m.group(1), m.group(2)) if m.group(2) else (database, m.group(1))
+            if not m.group(2) and not re.search(r"\b(?:FROM|JOIN)\s*$", masked[:m.start()], re.I):
+                continue   # nombre sin calificar: solo como tabla después de FROM / JOIN
+            t = self.catalog.get(db, name)
+            if t is None:
+                continue
+            temp = f"{db.lower()}__{name.lower()}"
+            if temp not in scan.views:
+                scan.views.add(temp)
+                if _is_view(t):
+                    body = self._bind(cur, translate(t["ViewOriginalText"]), db, scan)
+                else:
+                    body = self._table_select(cur, t, sql, scan)
+                cur.execute(f"CREATE OR REPLACE TEMP VIEW {_q(temp)} AS {body}")
+            out += [sql[pos:m.start()], _q(temp)]
+            pos = m.end()
+        return "".join(out) + sql[pos:]
+
+    def _materialize(self, cur, select: str, database: str, scan: _Scan):
+        """SELECT traducido a una tabla temporal; devuelve [(columna, tipo DuckDB)]."""
+        cur.execute(f"CREATE OR REPLACE TEMP TABLE _result AS {self._bind(cur, translate(select), database, scan)}")
+        return [(r[0], r[1]) for r in cur.execute("DESCRIBE _result").fetchall()]
+
+    def _write_parquet(self, cur, select_sql: str, uri: str, compression: str = "snappy"):
+        path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.parquet")
+        try:
+            cur.execute(f"COPY ({select_sql}) TO {_lit(path)} (FORMAT PARQUET, COMPRESSION {_lit(compression)})")
+            self._upload(path, uri)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    # ----- sentencias -----
+    def _name(self, ref: str, database: str):
+        parts = [p.strip('`" ') for p in ref.split(".")]
+        return (parts[0].lower(), parts[1].lower()) if len(parts) == 2 else (database.lower(), parts[0].lower())
+
+    def execute(self, cur, sql: str, database: str, qid: str, output: str):
+        """Ejecuta una sentencia. Devuelve (tipo, columnas, filas, bytes leídos)."""
+        sql = _strip_sql(sql)
+        scan = _Scan()
+        m = re.match(r"CREATE\s+EXTERNAL\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?([\w.`\"]+)\s*\(", sql, re.I)
+        if m:
+            return self._create_external(sql, m, database)
+        m = re.match(r"CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?([\w.`\"]+)\s*(WITH\s*\()?", sql, re.I)
+        if m:
+            return self._ctas(cur, sql, m, database, qid, output, scan)
+        m = re.match(r"CREATE\s+(OR\s+REPLACE\s+)?VIEW\s+([\w.`\"]+)\s+AS\s+(.*)$", sql, re.I | re.S)
+        if m:
+            db, name = self._name(m.group(2), database)
+            if self.catalog.get(db, name) and not m.group(1):
+                raise ValueError(f"View already exists: {db}.{name}")
+            self.catalog.put(db, {"Name": name, "TableType": "VIRTUAL_VIEW", "ViewOriginalText": m.group(3)})
+            return "DDL", [], [], 0
+        m = re.match(r"DROP\s+(TABLE|VIEW)\s+(IF\s+EXISTS\s+)?([\w.`\"]+)$", sql, re.I)
+        if m:
+            db, name = self._name(m.group(3), database)
+            if not self.catalog.delete(db, name) and not m.group(2):
+                raise ValueError(f"Table {db}.{name} does not exist")
+            return "DDL", [], [], 0
+        m = re.match(r"INSERT\s+INTO\s+([\w.`\"]+)\s*(\(\s*[\w`\"]+(?:\s*,\s*[\w`\"]+)*\s*\))?\s*(.*)$",
+                     sql, re.I | re.S)
+        if m:
+            return self._insert(cur, m, database, qid, scan)
+        if re.match(r"(MSCK\s+REPAIR|ALTER\s+TABLE\s+\S+\s+(ADD|DROP)\s+(IF\s+(NOT\s+)?EXISTS\s+)?PARTITION"
+                    r"|CREATE\s+(DATABASE|SCHEMA))\b", sql, re.I):
+            return "DDL", [], [], 0   # las particiones se leen por listado de carpetas
+        if re.match(r"(SELECT|WITH|VALUES|\()", sql, re.I):
+            cols = self._materialize(cur, sql, database, scan)
+            rows = cur.execute("SELECT * FROM _result").fetchall()
+            return "DML", cols, rows, scan.bytes
+        raise ValueError(f"Sentencia no soportada por el backend local: {sql[:60]}")
+
+    def _create_external(self, sql, m, database):
+        db, name = self._name(m.group(2), database)
+        if self.catalog.get(db, name):
+            if m.group(1):
+                return "DDL", [], [], 0
+            raise ValueError(f"Table already exists: {db}.{name}")
+        masked = _mask(sql)
+        close = _close_paren(masked, m.end() - 1)
+        cols = _columns(sql[m.end():close])
+        rest, rest_masked = sql[close + 1:], masked[close + 1:]
+        keys = []
+        pm = re.search(r"PARTITIONED\s+BY\s*\(", rest_masked, re.I)
+        if pm:
+            pclose = _close_paren(rest_masked, pm.end() - 1)
+            keys = _columns(rest[pm.end():pclose])
+        loc = re.search(r"LOCATION\s+'([^']*)'", rest, re.I)
+        if not loc:
+            raise ValueError("CREATE EXTERNAL TABLE sin LOCATION")
+        serde = re.search(r"ROW\s+FORMAT\s+SERDE\s+'([^']*)'", rest, re.I)
+        sp = re.search(r"SERDEPROPERTIES\s*\(", rest_masked, re.I)
+        tp = re.search(r"TBLPROPERTIES\s*\(", rest_masked, re.I)
+        serde_params = _props(rest[sp.end():_close_paren(rest_masked, sp.end() - 1)]) if sp else {}
+        params = {"EXTERNAL": "TRUE", **(_props(rest[tp.end():_close_paren(rest_masked, tp.end() - 1)]) if tp else {})}
+        if re.search(r"STORED\s+AS\s+PARQUET", rest, re.I):
+            table = _parquet_table(name, cols, loc.group(1))
+            table["Parameters"].update(params)
+        else:
+            if not serde:   # ROW FORMAT DELIMITED: mismo lector con sus separadores
+                d = re.search(r"FIELDS\s+TERMINATED\s+BY\s+'([^']*)'", rest, re.I)
+                serde_params.setdefault("separatorChar", d.group(1) if d else ",")
+            table = {"Name": name, "TableType": "EXTERNAL_TABLE", "Parameters": params,
+                     "StorageDescriptor": {"Columns": cols, "Location": loc.group(1),
+                                           "InputFormat": "org.apache.hadoop.mapred.TextInputFormat",
+                                           "SerdeInfo": {"SerializationLibrary": serde.group(1) if serde else _CSV_SERDE,
+                                                         "Parameters": serde_params}}}
+        table["PartitionKeys"] = keys
+        self.catalog.put(db, table)
+        return "DDL", [], [], 0
+
+    def _ctas(self, cur, sql, m, database, qid, output, scan):
+        db, name = self._name(m.group(2), database)
+        masked = _mask(sql)
+        with_props = {}
+        body_at = m.end()
+        if m.group(3):
+            close = _close_paren(masked, m.end() - 1)
+            for k, v in re.findall(r"(\w+)\s*=\s*('(?:[^']|'')*'|ARRAY\s*\[[^\]]*\])", sql[m.end():close]):
+                with_props[k.lower()] = v
+            body_at = close + 1
+        body = re.match(r"\s*AS\s+(.*?)(\s+WITH\s+(NO\s+)?DATA)?$", sql[body_at:], re.I | re.S)
+        if not body:
+            raise ValueError("CREATE TABLE sin AS SELECT")
+        if self.catalog.get(db, name):
+            if m.group(1):
+                return "DDL", [], [], 0
+            raise ValueError(f"Table already exists: {db}.{name}")
+        fmt = with_props.get("format", "'PARQUET'").strip("'").upper()
+        if fmt != "PARQUET" or "partitioned_by" in with_props or "bucketed_by" in with_props:
+            raise ValueError("Backend local: solo CTAS Parquet sin partitioned_by / bucketed_by")
+        loc = with_props.get("external_location", "").strip("'") or f"{output.rstrip('/')}/tables/{qid}/"
+        loc = loc if loc.endswith("/") else loc + "/"
+        if not self._is_empty(loc):
+            raise ValueError(f"HIVE_PATH_ALREADY_EXISTS: Target directory for table '{db}.{name}' already exists: {loc}")
+        cols = self._materialize(cur, body.group(1), database, scan)
+        if cur.execute("SELECT count(*) FROM _result").fetchone()[0]:
+            compression = with_props.get("parquet_compression", with_props.get("write_compression", "'SNAPPY'"))
+            self._write_parquet(cur, "SELECT * FROM _result", f"{loc}{qid}_00000.parquet",
+                                compression.strip("'").lower())
+        self.catalog.put(db, _parquet_table(name, [{"Name": c.lower(), "Type": _hive_type(t)} for c, t in cols], loc))
+        return "DDL", [], [], scan.bytes
+
+    def _insert(self, cur, m, database, qid, scan):
+        db, name = self._name(m.group(1), database)
+        t = self.catalog.get(db, name)
+        if t is None or _is_view(t):
+            raise ValueError(f"Table {db}.{name} does not exist")
+        if not _is_parquet(t) or t.get("PartitionKeys"):
+            raise ValueError("Backend local: INSERT solo en tablas Parquet sin particiones")
+        target = t["StorageDescriptor"]["Columns"]
+        if m.group(2):
+            wanted = [c.strip('`" ').lower() for c in m.group(2)[1:-1].split(",")]
+            target = [c for w in wanted for c in target if c["Name"] == w]
+        cols = self._materialize(cur, m.group(3), database, scan)
+        if len(cols) != len(target):
+            raise ValueError(f"Insert query has mismatched column sizes: {len(target)} vs {len(cols)}")
+        select = ", ".join(f"CAST({_q(src)} AS {_duck_type(dst['Type'])}) AS {_q(dst['Name'])}"
+                           for (src, _), dst in zip(cols, target))
+        if cur.execute("SELECT count(*) FROM _result").fetchone()[0]:
+            loc = t["StorageDescriptor"]["Location"]
+            loc = loc if loc.endswith("/") else loc + "/"
+            self._write_parquet(cur, f"SELECT {select} FROM _result", f"{loc}{qid}_00000.parquet")
+        return "DML", [], [], scan.bytes
+
+# ---------- API Athena ----------
+def _cell(v):
+    if v is None:
+        return {}
+    if isinstance(v, bool):
+        s = "true" if v else "false"
+    elif isinstance(v, datetime):
+        s = v.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    elif isinstance(v, date):
+        s = v.isoformat()
+    else:
+        s = str(v)
+    return {"VarCharValue": s}
+
+class LocalAthena:
+    """Subconjunto de boto3.client("athena") que usa AthenaClient, sobre DuckDbEngine."""
+    def __init__(self, engine: DuckDbEngine, threads: int = THREADS):
+        self.engine = engine
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="athena-duckdb")
+        self._lock = threading.Lock()
+        self._qe = {}        # qid -> QueryExecution
+        self._rows = {}      # qid -> (columnas, filas)
+        self._cursors = {}   # qid -> cursor en curso (para stop)
+        self._tokens = {}    # ClientRequestToken -> qid
+        self._reuse = {}     # SQL -> qid SUCCEEDED (ResultReuse)
+
+    def start_query_execution(self, QueryString, QueryExecutionContext=None, ResultConfiguration=None,
+                              WorkGroup="primary", ClientRequestToken=None, ResultReuseConfiguration=None):
+        with self._lock:
+            if ClientRequestToken in self._tokens:
+                return {"QueryExecutionId": self._tokens[ClientRequestToken]}
+            qid = str(uuid.uuid4())
+            if ClientRequestToken:
+                self._tokens[ClientRequestToken] = qid
+            database = (QueryExecutionContext or {}).get("Database", "default")
+            output = (ResultConfiguration or {}).get("OutputLocation", "")
+            now = datetime.now(timezone.utc)
+            self._qe[qid] = {
+                "QueryExecutionId": qid, "Query": QueryString, "WorkGroup": WorkGroup,
+                "QueryExecutionContext": {"Database": database},
+                "ResultConfiguration": {"OutputLocation": f"{output.rstrip('/')}/{qid}.csv"},
+                "Status": {"State": "QUEUED", "SubmissionDateTime": now},
+                "Statistics": {},
+            }
+            age = ((ResultReuseConfiguration or {}).get("ResultReuseByAgeConfiguration") or {})
+            prev = self._reuse.get(QueryString) if age.get("Enabled") else None
+            if prev and (now - self._qe[prev]["Status"]["CompletionDateTime"]).total_seconds() <= 60 * age.get("MaxAgeInMinutes", 60):
+                self._rows[qid] = self._rows[prev]
+                self._qe[qid]["Status"].update(State="SUCCEEDED", CompletionDateTime=now)
+                self._qe[qid]["Statistics"] = {"ResultReuseInformation": {"ReusedPreviousResult": True}}
+                return {"QueryExecutionId": qid}
+        self._pool.submit(self._run, qid, QueryString, database, output,
+                          bool(age.get("Enabled")))
+        return {"QueryExecutionId": qid}
+
+    def _run(self, qid, sql, database, output, reuse):
+        cur = self.engine.con.cursor()
+        cur.execute("SET integer_division = true")   # INT / INT -> INT como Trino (por conexión)
+        with self._lock:
+            if self._qe[qid]["Status"]["State"] == "CANCELLED":
+                return
+            self._qe[qid]["Status"]["State"] = "RUNNING"
+            self._cursors[qid] = cur
+        t0 = time.monotonic()
+        state, reason, stype, scanned = "SUCCEEDED", None, "DDL", 0
+        try:
+            stype, cols, rows, scanned = self.engine.execute(cur, sql, database, qid, output)
+            self._rows[qid] = (cols, rows)
+        except Exception as e:
+            state, reason = "FAILED", f"{type(e).__name__}: {e}"
+        finally:
+            cur.close()
+        ms = int((time.monotonic() - t0) * 1000)
+        with self._lock:
+            self._cursors.pop(qid, None)
+            status = self._qe[qid]["Status"]
+            if status["State"] == "CANCELLED":
+                return
+            status.update(State=state, CompletionDateTime=datetime.now(timezone.utc))
+            if reason:
+                status["StateChangeReason"] = reason
+                status["AthenaError"] = {"ErrorCategory": 2, "ErrorType": 1000, "Retryable": False}
+            self._qe[qid]["StatementType"] = stype
+            self._qe[qid]["Statistics"] = {
+                "EngineExecutionTimeInMillis": ms, "TotalExecutionTimeInMillis": ms,
+                "QueryQueueTimeInMillis": 0, "QueryPlanningTimeInMillis": 0,
+                "DataScannedInBytes": scanned,
+                "ResultReuseInformation": {"ReusedPreviousResult": False},
+            }
+            if state == "SUCCEEDED" and reuse:
+                self._reuse[sql] = qid
+
+    def _get(self, qid, op):
+        qe = self._qe.get(qid)
+        if qe is None:
+            raise _client_error("InvalidRequestException", f"QueryExecution {qid} was not found", op)
+        return qe
+
+    def get_query_execution(self, QueryExecutionId):
+        with self._lock:
+            return {"QueryExecution": copy.deepcopy(self._get(QueryExecutionId, "GetQueryExecution"))}
+
+    def batch_get_query_execution(self, QueryExecutionIds):
+        with self._lock:
+            found = [copy.deepcopy(self._qe[q]) for q in QueryExecutionIds if q in self._qe]
+        return {"QueryExecutions": found,
+                "UnprocessedQueryExecutionIds": [{"QueryExecutionId": q} for q in QueryExecutionIds
+                                                 if q not in self._qe]}
+
+    def stop_query_execution(self, QueryExecutionId):
+        with self._lock:
+            status = self._get(QueryExecutionId, "StopQueryExecution")["Status"]
+            if status["State"] in ("QUEUED", "RUNNING"):
+                status.update(State="CANCELLED", CompletionDateTime=datetime.now(timezone.utc))
+                cur = self._cursors.get(QueryExecutionId)
+                if cur is not None:
+                    cur.interrupt()
+        return {}
+
+    def get_query_results(self, QueryExecutionId, NextToken=None, MaxResults=PAGE_SIZE):
+        with self._lock:
+            if self._get(QueryExecutionId, "GetQueryResults")["Status"]["State"] != "SUCCEEDED":
+                raise _client_error("InvalidRequestException", "Query has not yet finished", "GetQueryResults")
+        cols, rows = self._rows.get(QueryExecutionId, ([], []))
+        table = ([[{"VarCharValue": c} for c, _ in cols]] if cols else []) + [[_cell(v) for v in r] for r in rows]
+        start = int(NextToken or 0)
+        end = start + min(MaxResults or PAGE_SIZE, PAGE_SIZE)
+        resp = {"ResultSet": {"Rows": [{"Data": r} for r in table[start:end]],
+                              "ResultSetMetadata": {"ColumnInfo": [{"Name": c, "Type": _hive_type(t)} for c, t in cols]}}}
+        if end < len(table):
+            resp["NextToken"] = str(end)
+        return resp
+
+# ---------- API Glue ----------
+class EntityNotFoundException(ClientError):
+    def __init__(self, message="Entity Not Found", op="GetTable"):
+        super().__init__({"Error": {"Code": "EntityNotFoundException", "Message": message}}, op)
+
+class AlreadyExistsException(ClientError):
+    def __init__(self, message="Already Exists", op="CreateTable"):
+        super().__init__({"Error": {"Code": "AlreadyExistsException", "Message": message}}, op)
+
+class LocalGlue:
+    """Subconjunto de boto3.client("glue") que usa glue_catalog, sobre el catálogo local."""
+    exceptions = SimpleNamespace(EntityNotFoundException=EntityNotFoundException,
+                                 AlreadyExistsException=AlreadyExistsException)
+
+    def __init__(self, cat: LocalCatalog):
+        self.catalog = cat
+
+    def get_table(self, DatabaseName, Name):
+        t = self.catalog.get(DatabaseName, Name)
+        if t is None:
+            raise EntityNotFoundException(f"Table {Name} not found.")
+        return {"Table": {**t, "DatabaseName": DatabaseName}}
+
+    def create_table(self, DatabaseName, TableInput):
+        if self.catalog.get(DatabaseName, TableInput["Name"]):
+            raise AlreadyExistsException(f"Table already exists: {TableInput['Name']}")
+        self.catalog.put(DatabaseName, TableInput)
+        return {}
+
+    def update_table(self, DatabaseName, TableInput):
+        self.get_table(DatabaseName, TableInput["Name"])
+        self.catalog.put(DatabaseName, TableInput)
+        return {}
+
+    def delete_table(self, DatabaseName, Name):
+        if not self.catalog.delete(DatabaseName, Name):
+            raise EntityNotFoundException(f"Table {Name} not found.", "DeleteTable")
+        return {}
+
+    def batch_delete_table(self, DatabaseName, TablesToDelete):
+        errors = [{"TableName": n, "ErrorDetail": {"ErrorCode": "EntityNotFoundException"}}
+                  for n in TablesToDelete if not self.catalog.delete(DatabaseName, n)]
+        return {"Errors": errors}
+
+    def get_paginator(self, op):
+        if op != "get_tables":
+            raise NotImplementedError(op)
+        cat = self.catalog
+        return SimpleNamespace(paginate=lambda DatabaseName, **kw: [{"TableList": cat.tables(DatabaseName)}])
+
+# ---------- instancias por proceso (bronze_to_silver comparte catálogo entre Athena y Glue) ----------
+_catalogs, _engines = {}, {}
+_init_lock = threading.Lock()
+
+def catalog(local_dir: str = None) -> LocalCatalog:
+    local_dir = local_dir or LOCAL_DIR
+    with _init_lock:
+        if local_dir not in _catalogs:
+            _catalogs[local_dir] = LocalCatalog(os.path.join(local_dir, "catalog.json"))
+        return _catalogs[local_dir]
+
+def local_athena(s3, local_dir: str = None) -> LocalAthena:
+    """Reemplazo de boto3.client("athena") para AthenaClient."""
+    local_dir = local_dir or LOCAL_DIR
+    engine = _engines.get(local_dir)
+    if engine is None:
+        engine = _engines[local_dir] = DuckDbEngine(s3, local_dir)
+    return LocalAthena(engine)
+
+def local_glue(local_dir: str = None) -> LocalGlue:
+    """Reemplazo de boto3.client("glue") para glue_catalog."""
+    return LocalGlue(catalog(local_dir))
+
+def reset(local_dir: str = None):
+    """Borra catálogo y caché de objetos (arranque limpio de una corrida local)."""
+    local_dir = local_dir or LOCAL_DIR
+    with _init_lock:
+        _catalogs.pop(local_dir, None)
+        _engines.pop(local_dir, None)
+    shutil.rmtree(local_dir, ignore_errors=True)
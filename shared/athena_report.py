@@ -0,0 +1,128 @@
+# athena_report.py
+"""
+Reporte de la telemetría de Athena (filas status=ATHENA_QUERY del CONTROL_TABLE,
+ver athena_client.QueryTelemetry): tiempo y bytes escaneados por paso y por mes.
+
+Uso:
+    python shared/athena_report.py <CONTROL_TABLE> [--source bronze_to_silver]
+        [--month 2012-07] [--by step|month] [--regression 1.5] [--json]
+
+- --by step  (default): una fila por paso (sufijo de mes quitado), todos los meses.
+- --by month: una fila por run_month (suma de la corrida).
+- Regresiones: pasos cuyo total_ms mediano del último mes supera --regression
+  veces la mediana de los meses anteriores (y al menos 1 s más).
+- Costo estimado: USD 5 por TB escaneado, mínimo 10 MB por consulta.
+"""
+import sys, json, argparse
+from statistics import median
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+USD_PER_TB = 5.0
+MIN_BILLED_BYTES = 10 * 1024 * 1024
+_TB = 1024 ** 4
+
+def load_items(table_name, source=None, month=None):
+    table = boto3.resource("dynamodb").Table(table_name)
+    fe = Attr("status").eq("ATHENA_QUERY")
+    if source:
+        fe = fe & Attr("source").eq(source)
+    if month:
+        fe = fe & Attr("run_month").eq(month)
+    items, last_evaluated_key = [], None
+    while True:
+        kwargs = {"FilterExpression": fe}
+        if last_evaluated_key:
+            kwargs["ExclusiveStartKey"] = last_evaluated_key
+        resp = table.scan(**kwargs)
+        items += resp.get("Items", [])
+        last_evaluated_key = resp.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return items
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))] if values else 0
+
+def _cost(items):
+    billed = sum(max(int(it.get("scanned_bytes", 0)), MIN_BILLED_BYTES)
+                 for it in items if it.get("state") == "SUCCEEDED" and not it.get("reused"))
+    return billed / _TB * USD_PER_TB
+
+def aggregate(items, by="step"):
+    groups = {}
+    for it in items:
+        groups.setdefault(it.get(by) or "?", []).append(it)
+    rows = []
+    for name, its in groups.items():
+        total = [int(it.get("total_ms", 0)) for it in its]
+        rows.append({
+            by: name,
+            "queries": len(its),
+            "failed": sum(it.get("state") != "SUCCEEDED" for it in its),
+            "months": len({it.get("run_month") for it in its}),
+            "p50_ms": _pct(total, 0.5),
+            "p95_ms": _pct(total, 0.95),
+            "max_ms": max(total),
+            "sum_ms": sum(total),
+            "queue_ms": sum(int(it.get("queue_ms", 0)) for it in its),
+            "engine_ms": sum(int(it.get("engine_ms", 0)) for it in its),
+            "scanned_mb": round(sum(int(it.get("scanned_bytes", 0)) for it in its) / 1024 ** 2, 1),
+            "usd": round(_cost(its), 4),
+        })
+    return sorted(rows, key=lambda r: (r[by] if by == "run_month" else -r["sum_ms"]))
+
+def regressions(items, factor=1.5, min_delta_ms=1000):
+    """[(step, último mes, mediana último, mediana anterior)] con último > factor * anterior."""
+    by_step = {}
+    for it in items:
+        if it.get("run_month") and it.get("state") == "SUCCEEDED":
+            by_step.setdefault(it["step"], {}).setdefault(it["run_month"], []).append(int(it.get("total_ms", 0)))
+    out = []
+    for step, months in by_step.items():
+        if len(months) < 2:
+            continue
+        last = max(months)
+        cur = median(months[last])
+        prev = median(median(v) for m, v in months.items() if m != last)
+        if cur > factor * prev and cur - prev >= min_delta_ms:
+            out.append({"step": step, "run_month": last, "p50_ms": cur, "baseline_ms": prev,
+                        "ratio": round(cur / prev, 2) if prev else None})
+    return sorted(out, key=lambda r: -(r["p50_ms"] - r["baseline_ms"]))
+
+def _print_table(rows):
+    if not rows:
+        print("(sin datos)")
+        return
+    cols = list(rows[0])
+    width = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in cols}
+    print("  ".join(c.ljust(width[c]) for c in cols))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(width[c]) for c in cols))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Telemetría de consultas Athena por paso / mes")
+    ap.add_argument("control_table")
+    ap.add_argument("--source")
+    ap.add_argument("--month")
+    ap.add_argument("--by", choices=("step", "month"), default="step")
+    ap.add_argument("--regression", type=float, default=1.5)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    items = load_items(args.control_table, args.source, args.month)
+    report = {"queries": len(items),
+              "rows": aggregate(items, "run_month" if args.by == "month" else "step"),
+              "regressions": regressions(items, args.regression)}
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return report
+    print(f"{len(items)} consultas, USD {_cost(items):.4f} estimados")
+    _print_table(report["rows"])
+    if report["regressions"]:
+        print("\nREGRESIONES:")
+        _print_table(report["regressions"])
+    return report
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
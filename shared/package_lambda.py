@@ -0,0 +1,62 @@
+# package_lambda.py
+"""
+Arma el zip de despliegue de una Lambda con los módulos de shared/ incluidos.
+
+bronze_to_silver/ y h2-factsales-upsert-month/ tienen athena_client.py y
+athena_duckdb.py como symlinks a shared/. Un zip que guarde el enlace (zip -y,
+o un checkout de Windows sin symlinks) deja la Lambda con ImportError; este
+script escribe siempre el contenido del archivo apuntado.
+
+Uso:
+    python shared/package_lambda.py bronze_to_silver [--out bronze_to_silver.zip]
+    python shared/package_lambda.py h2-factsales-upsert-month
+
+- Incluye los .py (y .sql / .json si los hay) del directorio, sin __pycache__
+  ni zips previos.
+- Falla si un symlink está roto o si un módulo con nombre de shared/ no tiene
+  su mismo contenido (p. ej. el checkout dejó el enlace como texto con la ruta).
+- Las dependencias de terceros van aparte (capa o pip install -t), ver
+  lambda_ingest/requirements.txt.
+"""
+import os, sys, filecmp, zipfile, argparse
+
+SHARED_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SHARED_DIR)
+INCLUDE = (".py", ".sql", ".json")
+
+def files_to_package(directory):
+    """[(ruta real, nombre en el zip)] del directorio de la Lambda."""
+    out = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(INCLUDE):
+            continue
+        real = os.path.realpath(os.path.join(directory, name))
+        if not os.path.isfile(real):
+            raise RuntimeError(f"{directory}/{name}: enlace roto ({real})")
+        shared = os.path.join(SHARED_DIR, name)
+        if os.path.isfile(shared) and not filecmp.cmp(real, shared, shallow=False):
+            # checkout sin symlinks (el "archivo" es la ruta del enlace) o copia vieja
+            raise RuntimeError(f"{directory}/{name} no es shared/{name}: rehacer el symlink")
+        out.append((real, name))
+    return out
+
+def package(directory, out=None):
+    directory = os.path.join(ROOT, directory) if not os.path.isabs(directory) else directory
+    out = out or os.path.join(directory, os.path.basename(directory.rstrip(os.sep)) + ".zip")
+    entries = files_to_package(directory)
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as z:
+        for real, name in entries:
+            z.write(real, name)   # contenido del archivo, no el enlace
+    return out, [name for _, name in entries]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="zip de despliegue de una Lambda (resuelve symlinks a shared/)")
+    ap.add_argument("directory")
+    ap.add_argument("--out")
+    args = ap.parse_args(argv)
+    out, names = package(args.directory, args.out)
+    print(f"{out}: {len(names)} archivos ({', '.join(names)})")
+    return out
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
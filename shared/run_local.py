@@ -0,0 +1,152 @@
+# run_local.py
+"""
+Corrida local del pipeline mensual (DDL del warehouse -> bronze_to_silver ->
+h2-factsales-upsert-month) sobre el backend DuckDB de athena_duckdb.py,
+cronometrando cada paso.
+
+Uso:
+    python shared/run_local.py --run-month 2012-07 --seed ./datalake [--moto | --endpoint URL]
+        [--bucket bg-hack2-aw-datalake2] [--steps ddl,bronze_to_silver,h2,dims,views]
+        [--refresh-dims] [--workdir DIR] [--reset] [--json]
+
+- --seed DIR: sube DIR/<key> a s3://<bucket>/<key> (p. ej. DIR/bronze/source=github/
+  table=orders/year=2012/month=7/orders_2012-07.csv.gz).
+- --moto: levanta un moto_server en un puerto libre (pip install "moto[server]");
+  --endpoint: usa uno ya levantado (moto_server, MinIO). Sin ninguno usa el
+  S3 de la cuenta configurada (Athena / Glue igual son locales).
+- Pasos: ddl (DROP/CREATE de 1_tablas_externas y 2_estructura_warehouse), bronze_to_silver,
+  h2 (INSERT del mes en fact_sales), dims (3_insert_dims_warehouse), views (vistas_powerBI).
+- Cada lambda corre en su propio proceso (las dos tienen athena_utils.py) con
+  ATHENA_BACKEND=duckdb; comparten el catálogo en --workdir.
+- CONTROL_TABLE se quita del entorno: sin caché ni telemetría en DynamoDB.
+"""
+import os, re, sys, json, time, socket, argparse, subprocess
+import boto3
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# pasos que ejecutan scripts .sql del repo: carpetas, solo DDL (sin las SELECT de muestra)
+SCRIPTS = {
+    "ddl": (["athena_etl_warehouse/1_tablas_externas", "athena_etl_warehouse/2_estructura_warehouse"], True),
+    "dims": (["athena_etl_warehouse/3_insert_dims_warehouse"], False),
+    "views": (["vistas_powerBI"], False),
+}
+_CALL = ("import json, sys, {module} as m; "
+         "print('RESULT ' + json.dumps(m.{handler}(json.loads(sys.argv[1]), None), default=str))")
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _statements(path):
+    """Sentencias de un script .sql (separadas por ';' fuera de literales)."""
+    from athena_duckdb import _split_top
+    with open(path, encoding="utf-8") as f:
+        return [s for s in _split_top(f.read(), ";") if re.sub(r"--[^\n]*", "", s).strip()]
+
+def seed(s3, bucket, directory):
+    n = 0
+    for base, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(base, name)
+            s3.upload_file(path, bucket, os.path.relpath(path, directory).replace(os.sep, "/"))
+            n += 1
+    return n
+
+def run_scripts(s3, db, output, dirs, ddl_only=False, workdir=None):
+    """Sentencias de los .sql de dirs (en orden de nombre) contra el backend local, en este proceso."""
+    from athena_client import AthenaClient
+    from athena_duckdb import local_athena
+    client = AthenaClient(local_athena(s3, workdir), db, output)
+    n, scanned = 0, 0
+    for d in dirs:
+        for name in sorted(os.listdir(os.path.join(ROOT, d))):
+            for sql in _statements(os.path.join(ROOT, d, name)):
+                if ddl_only and not re.match(r"\s*(--[^\n]*\n\s*)*(CREATE|DROP)\b", sql, re.I):
+                    continue
+                scanned += client.run(sql, step=name).scanned_bytes
+                n += 1
+    return {"statements": n, "scanned_bytes": scanned}
+
+def run_lambda(directory, module, handler, event, env):
+    proc = subprocess.run([sys.executable, "-c", _CALL.format(module=module, handler=handler), json.dumps(event)],
+                          cwd=os.path.join(ROOT, directory), env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stdout[-4000:] + proc.stderr[-4000:])
+        raise RuntimeError(f"{directory}: exit {proc.returncode}")
+    line = next(l for l in reversed(proc.stdout.splitlines()) if l.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pipeline mensual con Athena local (DuckDB)")
+    ap.add_argument("--run-month", required=True)
+    ap.add_argument("--bucket", default="bg-hack2-aw-datalake2")
+    ap.add_argument("--db", default="hack2_aw_catalog")
+    ap.add_argument("--seed")
+    ap.add_argument("--endpoint", default=os.environ.get("AWS_ENDPOINT_URL"))
+    ap.add_argument("--moto", action="store_true")
+    ap.add_argument("--steps", default="ddl,bronze_to_silver,h2")
+    ap.add_argument("--refresh-dims", action="store_true")
+    ap.add_argument("--workdir", default=os.path.join(ROOT, ".athena_local"))
+    ap.add_argument("--reset", action="store_true", help="borra catálogo y caché local antes de empezar")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    env = dict(os.environ, ATHENA_BACKEND="duckdb", ATHENA_LOCAL_DIR=args.workdir,
+               CATALOG_DB=args.db, DB=args.db, BUCKET_NAME=args.bucket, BUCKET=args.bucket,
+               ATHENA_OUTPUT=f"s3://{args.bucket}/logs/athena-results/",
+               ATHENA_RESULTS=f"s3://{args.bucket}/logs/athena-results/",
+               ATHENA_POLL_MIN_S=os.environ.get("ATHENA_POLL_MIN_S", "0.01"),
+               ATHENA_POLL_MAX_S=os.environ.get("ATHENA_POLL_MAX_S", "0.2"))
+    env.pop("CONTROL_TABLE", None)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    server = None
+    if args.moto:
+        import logging
+        from moto.server import ThreadedMotoServer
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)   # sin una línea por request
+        port = _free_port()
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+        server.start()
+        args.endpoint = f"http://127.0.0.1:{port}"
+        env.update(AWS_ACCESS_KEY_ID="testing", AWS_SECRET_ACCESS_KEY="testing")
+    if args.endpoint:
+        env["AWS_ENDPOINT_URL"] = args.endpoint
+    os.environ.update(env)   # el paso ddl corre en este proceso
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import athena_duckdb
+    if args.reset:
+        athena_duckdb.reset(args.workdir)
+
+    report = {"run_month": args.run_month, "steps": {}}
+    try:
+        s3 = boto3.client("s3", endpoint_url=args.endpoint)
+        if args.moto:
+            s3.create_bucket(Bucket=args.bucket)
+        if args.seed:
+            t0 = time.monotonic()
+            report["steps"]["seed"] = {"objects": seed(s3, args.bucket, args.seed),
+                                       "wall_s": round(time.monotonic() - t0, 3)}
+        steps = {
+            **{name: (lambda dirs=dirs, ddl=ddl: run_scripts(s3, args.db, env["ATHENA_OUTPUT"], dirs, ddl,
+                                                                   args.workdir))
+               for name, (dirs, ddl) in SCRIPTS.items()},
+            "bronze_to_silver": lambda: run_lambda("bronze_to_silver", "lambda_function", "handler",
+                                                   {"run_month": args.run_month, "refresh_dims": args.refresh_dims}, env),
+            "h2": lambda: run_lambda("h2-factsales-upsert-month", "lambda_function", "lambda_handler",
+                                     {"run_month": args.run_month}, env),
+        }
+        for name in [s.strip() for s in args.steps.split(",") if s.strip()]:
+            t0 = time.monotonic()
+            result = steps[name]()
+            report["steps"][name] = {"wall_s": round(time.monotonic() - t0, 3), "result": result}
+            print(f"LOCAL {name}: {report['steps'][name]['wall_s']}s")
+    finally:
+        if server:
+            server.stop()
+    report["total_s"] = round(sum(s["wall_s"] for s in report["steps"].values()), 3)
+    print(json.dumps(report, indent=2, default=str) if args.json else f"LOCAL total: {report['total_s']}s")
+    return report
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,12 @@
+import os, sys
+
+# los módulos de la Lambda se importan planos, como en el zip desplegado
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "bronze_to_silver"))
+
+# athena_utils lee estas variables al importarse (sin CONTROL_TABLE: sin telemetría)
+os.environ.setdefault("CATALOG_DB", "hack2_aw_catalog")
+os.environ.setdefault("ATHENA_OUTPUT", "s3://test-bucket/logs/athena-results/")
+os.environ.setdefault("BUCKET_NAME", "test-bucket")
+for k, v in {"AWS_DEFAULT_REGION": "us-east-1", "AWS_ACCESS_KEY_ID": "testing",
+             "AWS_SECRET_ACCESS_KEY": "testing"}.items():
+    os.environ.setdefault(k, v)
@@ -0,0 +1,59 @@
+import pytest
+from athena_dag import AthenaDag, SUCCEEDED, FAILED, SKIPPED
+
+def _dag(calls, fail=()):
+    """DAG de nodos Python (sin Athena): cada nodo anota su nombre al correr."""
+    dag = AthenaDag(max_in_flight=2)
+    def node(name):
+        def action():
+            calls.append(name)
+            if name in fail:
+                raise RuntimeError(f"boom {name}")
+        return action
+    return dag, node
+
+def test_dependencies_run_first():
+    calls = []
+    dag, node = _dag(calls)
+    a = dag.add("a", node("a"))
+    b = dag.add("b", node("b"), deps=[a])
+    c = dag.add("c", node("c"))
+    dag.add("d", node("d"), deps=[b, c])
+    summary = dag.run()
+    assert calls.index("a") < calls.index("b") < calls.index("d")
+    assert calls.index("c") < calls.index("d")
+    assert (summary["statements"], summary["succeeded"], summary["failed"]) == (4, 4, 0)
+    assert {n["state"] for n in summary["nodes"].values()} == {SUCCEEDED}
+
+def test_failure_skips_dependents_and_always_nodes_run():
+    calls = []
+    dag, node = _dag(calls, fail={"ctas"})
+    drop = dag.add("drop", node("drop"))
+    ctas = dag.add("ctas", node("ctas"), deps=[drop])
+    after = dag.add("after", node("after"), deps=[ctas])
+    dag.add("cleanup", node("cleanup"), deps=[after], always=True)
+    dag.add("other", node("other"))
+    with pytest.raises(RuntimeError, match="ctas: boom ctas"):
+        dag.run()
+    states = {name: n.state for name, n in dag.nodes.items()}
+    assert states == {"drop": SUCCEEDED, "ctas": FAILED, "after": SKIPPED,
+                      "cleanup": SUCCEEDED, "other": SUCCEEDED}
+    assert "after" not in calls and calls[-1] in ("cleanup", "other")
+
+def test_always_node_waits_for_its_dependencies():
+    calls = []
+    dag, node = _dag(calls)
+    a = dag.add("a", node("a"))
+    dag.add("cleanup", node("cleanup"), deps=[a], always=True)
+    dag.run()
+    assert calls == ["a", "cleanup"]
+
+def test_add_validates_graph():
+    dag = AthenaDag()
+    dag.add("a", "SELECT 1")
+    with pytest.raises(ValueError):
+        dag.add("a", "SELECT 2")
+    with pytest.raises(ValueError):
+        dag.add("b", "SELECT 2", deps=["missing"])
+    assert dag.add("c", "SELECT 3", deps=["a", None]) == "c"
+    assert dag.nodes["c"].deps == ["a"]
@@ -0,0 +1,8 @@
+import os, sys
+
+# los módulos de la Lambda se importan planos, como en el zip desplegado
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "lambda_ingest"))
+
+for k, v in {"AWS_DEFAULT_REGION": "us-east-1", "AWS_ACCESS_KEY_ID": "testing",
+             "AWS_SECRET_ACCESS_KEY": "testing"}.items():
+    os.environ.setdefault(k, v)
@@ -0,0 +1,64 @@
+import io
+import pytest
+from bronze_writer import open_bronze_writer, bronze_key, csv_key, month_partition, parquet_prefix
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+moto = pytest.importorskip("moto")
+
+BUCKET = "test-bucket"
+SRC = {"table": "orders", "target_bronze_prefix": "bronze/source=github/table=orders/",
+       "format": "parquet", "archive_csv": True, "compression": "gzip",
+       "schema": {"SalesOrderID": "int", "UnitPrice": "decimal(10,2)", "Flag": "boolean"}}
+FIELDS = ["SalesOrderID", "UnitPrice", "Flag", "OrderDate"]
+
+@pytest.fixture
+def s3():
+    with moto.mock_aws():
+        import boto3
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+def _read_parquet(s3, key):
+    return pq.read_table(io.BytesIO(s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()))
+
+def test_keys_and_partition():
+    part = month_partition({"partitioning": "year-month"}, "2012-07")
+    assert part == "year=2012/month=7/"
+    assert month_partition({}, "2012-07") == ""
+    assert bronze_key(SRC, "orders_2012-07", partition=part) == \
+        "bronze/source=github/table=orders_parquet/year=2012/month=7/orders_2012-07.parquet"
+    assert csv_key(SRC, "orders_2012-07", compression="gzip", partition=part) == \
+        "bronze/source=github/table=orders/year=2012/month=7/orders_2012-07.csv.gz"
+    assert parquet_prefix(dict(SRC, parquet_prefix="x/")) == "x/"
+
+def test_parquet_typed_with_csv_archive(s3):
+    with open_bronze_writer(s3, BUCKET, SRC, "orders_2012-07", FIELDS) as w:
+        w.writerow({"SalesOrderID": "1", "UnitPrice": "3.5", "Flag": "yes", "OrderDate": "7/1/2012"})
+        w.writerow({"SalesOrderID": "x", "UnitPrice": "", "Flag": "?", "OrderDate": "7/2/2012"})
+    assert w.rows == 2
+    table = _read_parquet(s3, bronze_key(SRC, "orders_2012-07"))
+    assert table.schema.field("SalesOrderID").type == pa.int32()
+    assert table.schema.field("UnitPrice").type == pa.decimal128(10, 2)
+    assert table.schema.field("OrderDate").type == pa.string()
+    # lo que no convierte queda null, como TRY(CAST(...)) en silver
+    assert table.to_pydict()["SalesOrderID"] == [1, None]
+    assert table.to_pydict()["Flag"] == [True, None]
+    # la copia CSV conserva el valor crudo
+    keys = [o["Key"] for o in s3.list_objects_v2(Bucket=BUCKET)["Contents"]]
+    assert csv_key(SRC, "orders_2012-07", compression="gzip") in keys
+
+def test_parquet_empty_has_schema(s3):
+    src = dict(SRC, archive_csv=False)
+    with open_bronze_writer(s3, BUCKET, src, "orders_2012-08", FIELDS):
+        pass
+    table = _read_parquet(s3, bronze_key(src, "orders_2012-08"))
+    assert table.num_rows == 0 and table.schema.names == FIELDS
+
+def test_parquet_abort_leaves_nothing(s3):
+    with pytest.raises(RuntimeError):
+        with open_bronze_writer(s3, BUCKET, dict(SRC, archive_csv=False), "orders_2012-09", FIELDS) as w:
+            w.writerow({"SalesOrderID": "1"})
+            raise RuntimeError("corte")
+    assert "Contents" not in s3.list_objects_v2(Bucket=BUCKET)
@@ -0,0 +1,36 @@
+from date_matcher import DateMatcher, date_validator, parse_year_month_slow
+
+def test_manifest_format_kept_when_sample_has_day_over_12():
+    # "7/13/2012" solo es válido como M/d; el manifest sigue mandando para las ambiguas
+    m = DateMatcher.detect("M/d/yyyy", ["7/13/2012", "7/1/2012", "2012-07-05"])
+    assert m.fmt == "%m/%d/%Y"
+    assert m.year_month("3/4/2012") == (2012, 3)
+
+def test_manifest_format_kept_with_empty_sample():
+    assert DateMatcher.detect("MM-dd-yyyy", []).fmt == "%m-%d-%Y"
+
+def test_fallback_when_manifest_parses_nothing():
+    m = DateMatcher.detect("M/d/yyyy", ["2012-07-01", "2012-07-31 00:00:00"])
+    assert m.fmt == "%Y-%m-%d"
+    assert DateMatcher.detect(None, ["31-07-2012", "01-08-2012"]).fmt == "%d-%m-%Y"
+
+def test_year_month_mismatch_goes_to_slow_path():
+    m = DateMatcher.detect("M/d/yyyy", ["7/1/2012"])
+    assert m.year_month("2012-08-15T10:00:00") == (2012, 8)
+    assert m.year_month("") is None
+    assert m.year_month("2/30/2012") is None
+    r = m.report()
+    assert (r["rows"], r["empty"], r["mismatches"]) == (3, 1, 2)
+    assert r["mismatch_samples"] == ["2012-08-15T10:00:00", "2/30/2012"]
+
+def test_from_rows_keeps_sample():
+    rows = [{"d": f"7/{i}/2012"} for i in range(1, 6)]
+    m, it = DateMatcher.from_rows("M/d/yyyy", rows, "d", sample_size=2)
+    assert [r["d"] for r in it] == [r["d"] for r in rows]
+
+def test_slow_path_and_validator():
+    assert parse_year_month_slow("5/31/2011 00:00", "M/d/yyyy") == (2011, 5)
+    assert parse_year_month_slow("not a date", None) is None
+    is_date = date_validator("M/d/yyyy")
+    assert is_date("5/31/2011") and is_date("2011-05-31")
+    assert not is_date("2011-02-30") and not is_date("") and not is_date("abc")
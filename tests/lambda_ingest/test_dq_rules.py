@@ -0,0 +1,60 @@
+import gzip
+import pytest
+from dq_rules import DQGate, compile_rules, quarantine_key, FAILED_RULES_FIELD
+
+moto = pytest.importorskip("moto")
+
+BUCKET = "test-bucket"
+SRC = {"table": "orders", "source": "github", "compression": "gzip", "date_format": "M/d/yyyy",
+       "dq_rules": ["not_null:SalesOrderID", "valid_date:OrderDate", "gte_zero:TotalDue"]}
+FIELDS = ["SalesOrderID", "OrderDate", "TotalDue"]
+
+@pytest.fixture
+def s3():
+    with moto.mock_aws():
+        import boto3
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+def test_compile_rules():
+    rules = compile_rules(SRC["dq_rules"], "M/d/yyyy", FIELDS)
+    assert [r.name for r in rules] == SRC["dq_rules"]
+    nn, date, gte = rules
+    assert nn.check({"SalesOrderID": "1"}) and not nn.check({"SalesOrderID": " "}) and not nn.check({})
+    assert date.check({"OrderDate": " 7/1/2012 "}) and not date.check({"OrderDate": "7/32/2012"})
+    assert not date.check({})
+    assert gte.check({"TotalDue": "0"}) and gte.check({"TotalDue": ""}) and gte.check({})
+    assert not gte.check({"TotalDue": "-1"}) and not gte.check({"TotalDue": "abc"})
+    assert compile_rules(None) == []
+
+@pytest.mark.parametrize("spec", ["not_null", "not_null:", "unique:SalesOrderID"])
+def test_invalid_rule(spec):
+    with pytest.raises(ValueError):
+        compile_rules([spec])
+
+def test_gate_quarantines_rejected_rows(s3):
+    gate = DQGate(s3, BUCKET, SRC, "orders_2012-07", FIELDS)
+    rows = [{"SalesOrderID": "1", "OrderDate": "7/1/2012", "TotalDue": "10"},
+            {"SalesOrderID": "", "OrderDate": "bad", "TotalDue": "5"},
+            {"SalesOrderID": "3", "OrderDate": "7/3/2012", "TotalDue": "-2"}]
+    assert [gate.accept(r) for r in rows] == [True, False, False]
+    gate.close()
+    key = quarantine_key(SRC, "orders_2012-07")
+    assert key == "bronze/quarantine/source=github/table=orders/orders_2012-07.csv.gz"
+    body = gzip.decompress(s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()).decode("utf-8")
+    lines = body.splitlines()
+    assert lines[0] == ",".join(FIELDS + [FAILED_RULES_FIELD])
+    assert lines[1:] == [",bad,5,not_null:SalesOrderID;valid_date:OrderDate", "3,7/3/2012,-2,gte_zero:TotalDue"]
+    assert gate.report() == {
+        "dq_rows": 3, "dq_rejected": 2, "dq_quarantine_key": key,
+        "dq_violations": {"not_null:SalesOrderID": 1, "valid_date:OrderDate": 1, "gte_zero:TotalDue": 1}}
+
+def test_clean_run_removes_previous_quarantine(s3):
+    key = quarantine_key(SRC, "orders_2012-07")
+    s3.put_object(Bucket=BUCKET, Key=key, Body=b"old")
+    gate = DQGate(s3, BUCKET, SRC, "orders_2012-07", FIELDS)
+    assert gate.accept({"SalesOrderID": "1", "OrderDate": "7/1/2012", "TotalDue": "1"})
+    gate.close()
+    assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
+    assert "dq_quarantine_key" not in gate.report()
@@ -0,0 +1,32 @@
+from fingerprint import RowHasher, fingerprint_id, source_unchanged
+
+def _digest(fields, rows):
+    h = RowHasher(fields)
+    for r in rows:
+        h.update(r)
+    return h.hexdigest()
+
+def test_hash_is_stable_and_strips_values():
+    rows = [{"a": "1", "b": "x"}, {"a": "2", "b": None}]
+    assert _digest(["a", "b"], rows) == _digest(["a", "b"], [{"a": " 1", "b": "x "}, {"a": 2, "b": ""}])
+
+def test_header_is_stripped():
+    assert RowHasher(["a", "b"]).hexdigest() == RowHasher([" a", "b "]).hexdigest()
+
+def test_hash_depends_on_order_and_content():
+    rows = [{"a": "1", "b": "x"}, {"a": "2", "b": "y"}]
+    base = _digest(["a", "b"], rows)
+    assert base != _digest(["b", "a"], rows)
+    assert base != _digest(["a", "b"], rows[::-1])
+    assert base != _digest(["a", "b"], rows[:1])
+    # el separador de campo evita que "1|x" y "1x|" colisionen
+    assert _digest(["a", "b"], [{"a": "1", "b": "x"}]) != _digest(["a", "b"], [{"a": "1x", "b": ""}])
+
+def test_source_unchanged():
+    prev = {"source_etag": '"abc"', "source_last_modified": "Mon, 01 Jul 2024 00:00:00 GMT"}
+    assert fingerprint_id("github", "product") == "fingerprint#github#product"
+    assert not source_unchanged(None, '"abc"', None)
+    assert source_unchanged(prev, '"abc"', None)
+    assert not source_unchanged(prev, '"def"', prev["source_last_modified"])
+    assert source_unchanged(prev, None, prev["source_last_modified"])
+    assert not source_unchanged(prev, None, None)
@@ -0,0 +1,34 @@
+from money_normalizer import MoneyNormalizer, clean_money
+
+def test_clean_money_examples():
+    assert clean_money("$60.749.820.000") == "60749820000"
+    assert clean_money("60.749.820,50") == "60749820.50"
+    assert clean_money(60749820000) == "60749820000"
+    assert clean_money("  60 749 820 000 ") == "60749820000"
+    assert clean_money(12.5) == "12.5"
+    assert clean_money("") is None and clean_money(None) is None
+
+def test_detect_prefers_dot_thousands_on_tie():
+    assert MoneyNormalizer.detect(["$60.749.820.000", "1.000"]).fmt == (".", ",")
+
+def test_detect_comma_thousands_ignores_typed_numbers():
+    n = MoneyNormalizer.detect(["1,234.50", "$2,000", 15, None, " "])
+    assert n.fmt == (",", ".")
+    assert n.normalize("$1,234,567.89") == "1234567.89"
+
+def test_normalize_counts_empty_and_outliers():
+    n = MoneyNormalizer((".", ","))
+    assert n.normalize("$ 60.749.820.000 ") == "60749820000"
+    assert n.normalize("1.234,5") == "1234.5"
+    assert n.normalize(7.0) == "7"
+    assert n.normalize(None) is None and n.normalize("  ") is None
+    assert n.normalize("USD 1,5 aprox") == "1.5"   # fuera de formato -> clean_money
+    r = n.report()
+    assert r["money_format"] == {"thousands": ".", "decimal": ","}
+    assert (r["rows"], r["empty"], r["outliers"]) == (6, 2, 1)
+    assert r["outlier_samples"] == ["USD 1,5 aprox"]
+
+def test_from_rows_keeps_sample():
+    rows = [{"b": "1.000"}, {"b": "2.000,5"}, {"b": "3"}]
+    n, it = MoneyNormalizer.from_rows(rows, lambda r: r["b"], sample_size=2)
+    assert [n.normalize(r["b"]) for r in it] == ["1000", "2000.5", "3"]
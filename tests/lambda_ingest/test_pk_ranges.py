@@ -0,0 +1,37 @@
+import pytest
+from pk_ranges import pk_column, range_count, split_ranges, range_label, part_name, bounds_query, range_query
+
+def test_pk_column():
+    assert pk_column({"pk": ["StoreID"]}) == "StoreID"
+    for pk in ([], ["A", "B"], ["Store ID"], None):
+        with pytest.raises(ValueError):
+            pk_column({"table": "stores", "pk": pk})
+
+def test_range_count():
+    assert range_count({"parallel_ranges": 4}) == 4
+    assert range_count({"parallel_ranges": 4}, requested=2) == 2
+    assert range_count({}) == 1
+
+def test_split_ranges_cover_bounds_without_overlap():
+    rs = split_ranges(1, 10, 3)
+    assert [(r["lo"], r["hi"], r["last"]) for r in rs] == [(1, 5, False), (5, 9, False), (9, 10, True)]
+    assert {r["count"] for r in rs} == {3}
+    covered = [k for r in rs for k in range(r["lo"], r["hi"] + (1 if r["last"] else 0))]
+    assert covered == list(range(1, 11))
+
+def test_split_ranges_fewer_keys_than_ranges():
+    rs = split_ranges(5, 6, 4)
+    assert len(rs) == 2 and all(r["count"] == 2 for r in rs)
+    assert split_ranges(7, 7, 3) == [{"index": 0, "count": 1, "lo": 7, "hi": 7, "last": True}]
+
+def test_labels_and_queries():
+    rs = split_ranges(1, 10, 3)
+    assert range_label(rs[1]) == "part-0001-of-0003"
+    assert part_name("stores", rs[2]) == "stores_part-0002-of-0003"
+    assert bounds_query("SELECT * FROM t;", "id") == \
+        "SELECT MIN(pk_src.`id`) AS lo, MAX(pk_src.`id`) AS hi FROM (SELECT * FROM t) AS pk_src"
+    sql, params = range_query("SELECT * FROM t", "id", rs[0])
+    assert sql.endswith("WHERE (pk_src.`id` >= %s AND pk_src.`id` < %s) OR pk_src.`id` IS NULL")
+    assert params == (1, 5)
+    sql, params = range_query("SELECT * FROM t", "id", rs[2])
+    assert sql.endswith("WHERE pk_src.`id` >= %s AND pk_src.`id` <= %s") and params == (9, 10)
@@ -0,0 +1,53 @@
+from datetime import date, datetime, timezone, timedelta
+import pytest
+from watermark import (WatermarkTracker, watermark_config, watermark_id,
+                       needs_full_snapshot, incremental_query)
+
+def test_config():
+    assert watermark_config({}) is None
+    assert watermark_config({"watermark": "ModifiedDate"}) == {"column": "ModifiedDate"}
+    cfg = {"column": "ModifiedDate", "full_snapshot_every_days": 30}
+    assert watermark_config({"watermark": cfg}) == cfg
+    with pytest.raises(ValueError):
+        watermark_config({"table": "stores", "watermark": "Modified Date; DROP"})
+    assert watermark_id("mysql", "stores") == "watermark#mysql#stores"
+
+def test_max_over_mixed_str_and_datetime():
+    # pymysql entrega str para las fechas que no puede convertir
+    t = WatermarkTracker("ModifiedDate")
+    for v in [datetime(2012, 7, 1, 8, 0), "0000-00-00 00:00:00", None, "",
+              datetime(2013, 1, 1, 5, 0), date(2012, 12, 31)]:
+        t.update({"ModifiedDate": v})
+    assert t.rows == 6
+    assert t.value == "2013-01-01 05:00:00"
+
+def test_merge():
+    a, b = WatermarkTracker("c"), WatermarkTracker("c")
+    a.update({"c": "2012-07-01 00:00:00"})
+    b.update({"c": datetime(2012, 8, 1)})
+    b.update({"c": None})
+    assert a.merge(b) is a
+    assert (a.rows, a.value) == (3, "2012-08-01 00:00:00")
+    assert WatermarkTracker("c").merge(WatermarkTracker("c")).value is None
+
+def test_numeric_column():
+    t = WatermarkTracker("id")
+    for v in (9, 10, 2):
+        t.update({"id": v})
+    assert t.value == "10"
+
+def test_needs_full_snapshot():
+    now = datetime(2024, 1, 31, tzinfo=timezone.utc)
+    cfg = {"column": "c", "full_snapshot_every_days": 30}
+    state = {"value": "2024-01-30", "last_full_at": (now - timedelta(days=29)).isoformat()}
+    assert needs_full_snapshot(None, cfg)
+    assert needs_full_snapshot({"value": ""}, cfg)
+    assert needs_full_snapshot(state, cfg, force=True)
+    assert not needs_full_snapshot(state, cfg, now=now)
+    assert needs_full_snapshot(dict(state, last_full_at=(now - timedelta(days=30)).isoformat()), cfg, now=now)
+    assert needs_full_snapshot({"value": "x"}, cfg, now=now)
+    assert not needs_full_snapshot({"value": "x"}, {"column": "c"}, now=now)
+
+def test_incremental_query():
+    assert incremental_query(" SELECT a FROM t;\n", "ModifiedDate") == \
+        "SELECT * FROM (SELECT a FROM t) AS wm_src WHERE wm_src.`ModifiedDate` > %s"
@@ -0,0 +1,33 @@
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError, NoCredentialsError
+from athena_client import normalize_sql, cache_key, written_table, step_name, _retryable
+
+def test_normalize_sql_collapses_whitespace_outside_literals():
+    assert normalize_sql("SELECT  a,\n\tb  FROM t ;  ") == "SELECT a, b FROM t"
+    assert normalize_sql("SELECT 'a  b', 'it''s  x' FROM t;") == "SELECT 'a  b', 'it''s  x' FROM t"
+
+def test_cache_key():
+    base = cache_key("SELECT 1 FROM t", {"t": "v1", "s3": "e1"}, "db")
+    assert base == cache_key("SELECT  1\nFROM t;", {"s3": "e1", "t": "v1"}, "db")
+    assert base != cache_key("SELECT 1 FROM t", {"t": "v2", "s3": "e1"}, "db")
+    assert base != cache_key("SELECT 1 FROM t", {"t": "v1", "s3": "e1"}, "other_db")
+    assert base != cache_key("SELECT 'x  y' FROM t", {"t": "v1", "s3": "e1"}, "db")
+    assert cache_key("SELECT 1", None) == cache_key("SELECT 1", {})
+
+def test_written_table_and_step_name():
+    assert written_table("INSERT INTO hack2_aw_catalog.fact_sales SELECT 1", "db") == "hack2_aw_catalog.fact_sales"
+    assert written_table("SELECT 1", "db") is None
+    assert step_name("ctas:tmp_dim_store_2012_7") == "ctas:tmp_dim_store"
+    assert step_name(None) == "adhoc"
+
+def _client_error(code, status=400):
+    return ClientError({"Error": {"Code": code, "Message": code},
+                        "ResponseMetadata": {"HTTPStatusCode": status}}, "StartQueryExecution")
+
+def test_retryable_only_transient_errors():
+    assert _retryable(_client_error("ThrottlingException"))
+    assert _retryable(_client_error("InternalServerException", 500))
+    assert not _retryable(_client_error("InvalidRequestException"))
+    assert _retryable(EndpointConnectionError(endpoint_url="https://athena"))
+    assert _retryable(ReadTimeoutError(endpoint_url="https://athena"))
+    assert not _retryable(NoCredentialsError())
+    assert not _retryable(ValueError("x"))
@@ -0,0 +1,127 @@
+import csv, gzip, io, os, urllib.request
+import pytest
+
+pytest.importorskip("duckdb")
+moto_server = pytest.importorskip("moto.server")
+
+BUCKET = "bg-hack2-aw-datalake2"
+DB = "hack2_aw_catalog"
+ORDERS = "bronze/source=github/table=orders/"
+FIELDS = ["SalesOrderID", "SalesOrderDetailID", "OrderDate", "DueDate", "ShipDate", "EmployeeID",
+          "CustomerID", "SubTotal", "TaxAmt", "Freight", "TotalDue", "ProductID", "OrderQty",
+          "UnitPrice", "UnitPriceDiscount", "LineTotal", "StoreID"]
+
+def _orders_gz(path, month, year, n, bad=0):
+    """orders_<y>-<mm>.csv.gz como lo escribe ingest (gzip); las últimas 'bad' filas sin fecha válida."""
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(FIELDS)
+    for i in range(n):
+        date = "not-a-date" if i >= n - bad else f"{month}/{i % 28 + 1}/{year}"
+        w.writerow([1000 + i, i, date, date, "", 2, 10 + i, "100.0", "8.0", "1.0", "109.0",
+                    4, 2, "50.0", "0", "100.0", 1])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(gzip.compress(out.getvalue().encode("utf-8")))
+
+@pytest.fixture
+def lake(tmp_path):
+    seed = tmp_path / "seed"
+    _orders_gz(str(seed / ORDERS / "year=2012/month=7/orders_2012-07.csv.gz"), 7, 2012, 6, bad=1)
+    _orders_gz(str(seed / ORDERS / "year=2011/month=5/orders_2011-05.csv.gz"), 5, 2011, 3)
+    return seed
+
+@pytest.fixture
+def endpoint():
+    # run_local.main() deja su entorno en os.environ (el paso ddl corre en proceso)
+    saved = dict(os.environ)
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    url = f"http://{host}:{port}"
+    # los moto_server de un mismo proceso comparten estado: cada test arranca vacío
+    urllib.request.urlopen(urllib.request.Request(f"{url}/moto-api/reset", method="POST")).close()
+    try:
+        yield url
+    finally:
+        server.stop()
+        os.environ.clear()
+        os.environ.update(saved)
+
+def test_ddl_bronze_to_silver_h2_on_duckdb(lake, endpoint, tmp_path):
+    import boto3, run_local
+    workdir = str(tmp_path / "athena_local")
+    s3 = boto3.client("s3", endpoint_url=endpoint)
+    s3.create_bucket(Bucket=BUCKET)
+
+    report = run_local.main(["--run-month", "2012-07", "--bucket", BUCKET, "--endpoint", endpoint,
+                             "--seed", str(lake), "--steps", "ddl,bronze_to_silver,h2",
+                             "--workdir", workdir, "--reset"])
+    steps = report["steps"]
+    assert steps["seed"]["objects"] == 2
+    assert steps["ddl"]["result"]["statements"] > 0
+    b2s = steps["bronze_to_silver"]["result"]
+    assert b2s["status"] == "SUCCEEDED" and b2s["athena"]["failed"] == 0
+    # h2 lee el .csv.gz del mes filtrando por "$path"
+    (h2,) = steps["h2"]["result"]["results"]
+    assert h2["key"] == f"{ORDERS}year=2012/month=7/orders_2012-07.csv.gz"
+    assert (h2["status"], h2["rows_inserted"]) == ("SUCCEEDED", 6)
+
+    keys = [o["Key"] for o in s3.list_objects_v2(Bucket=BUCKET, Prefix="silver/domain=sales/year=2012/month=07/")
+            .get("Contents", [])]
+    assert keys, "bronze_to_silver no escribió orders válidas en silver"
+
+    # carga del primer mes (athena_etl_warehouse/4_insert_fact_first_month) sobre el .csv.gz de 2011-05
+    from athena_client import AthenaClient
+    from athena_duckdb import local_athena
+    output = f"s3://{BUCKET}/logs/athena-results/"
+    run_local.run_scripts(s3, DB, output, ["athena_etl_warehouse/4_insert_fact_first_month"], workdir=workdir)
+    client = AthenaClient(local_athena(s3, workdir), DB, output)
+    rows = client.query(f"SELECT RunMonth, COUNT(*) FROM {DB}.fact_sales GROUP BY 1 ORDER BY 1")
+    assert rows[1:] == [["2011-05", "3"], ["2012-07", "6"]]
+
+    # re-ejecutar h2 sobre el mes ya cargado no duplica filas
+    again = run_local.main(["--run-month", "2012-07", "--bucket", BUCKET, "--endpoint", endpoint,
+                            "--steps", "h2", "--workdir", workdir])
+    assert again["steps"]["h2"]["result"]["results"][0]["status"] == "SKIPPED_EXISTS"
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(gzip.compress(text.encode("utf-8")))
+
+def test_dim_store_applies_watermark_deltas(endpoint, tmp_path):
+    import boto3, run_local
+    seed = tmp_path / "seed"
+    stores = "bronze/source=mysql/table=stores/"
+    _write(str(seed / stores / "run_month=2012-07/stores.csv.gz"),
+           "StoreID,StoreName,EmployeeID,ModifiedDate\n"
+           "1,Uno,3,2012-06-01 00:00:00\n2,Dos,4,2012-06-01 00:00:00\n4,Cuatro,5,2012-06-01 00:00:00\n"
+           "4,Cuatro bis,5,2012-06-01 00:00:00\n")
+    # deltas por watermark (engine.ingest_table): cambia la tienda 2 dos veces y agrega la 3
+    _write(str(seed / stores / "delta/stores_delta_1341100000.csv.gz"),
+           "StoreID,StoreName,EmployeeID,ModifiedDate\n2,Dos nueva,4,2012-07-02 10:00:00\n")
+    _write(str(seed / stores / "delta/stores_delta_1341200000.csv.gz"),
+           "StoreID,StoreName,EmployeeID,ModifiedDate\n"
+           "2,Dos final,7,2012-07-03 09:00:00\n3,Tres,6,2012-07-03 09:00:00\n")
+    workdir = str(tmp_path / "athena_local")
+    s3 = boto3.client("s3", endpoint_url=endpoint)
+    s3.create_bucket(Bucket=BUCKET)
+
+    report = run_local.main(["--run-month", "2012-07", "--bucket", BUCKET, "--endpoint", endpoint,
+                             "--seed", str(seed), "--steps", "ddl,bronze_to_silver", "--refresh-dims",
+                             "--workdir", workdir, "--reset"])
+    assert report["steps"]["bronze_to_silver"]["result"]["athena"]["failed"] == 0
+
+    from athena_client import AthenaClient
+    from athena_duckdb import local_athena
+    client = AthenaClient(local_athena(s3, workdir), DB, f"s3://{BUCKET}/logs/athena-results/")
+    for table, loc, extra in (("chk_dim_store", "silver/dim=store/run_month=2012-07/", ""),
+                              ("chk_dim_store_invalid", "logs/invalid/dim=store/run_month=2012-07/", ", reason string")):
+        client.run(f"CREATE EXTERNAL TABLE {DB}.{table} (storeid int, storename string, employeeid int{extra}) "
+                   f"STORED AS PARQUET LOCATION 's3://{BUCKET}/{loc}'")
+    valid = client.query(f"SELECT storeid, storename, employeeid FROM {DB}.chk_dim_store ORDER BY 1")
+    assert valid[1:] == [["1", "Uno", "3"], ["2", "Dos final", "7"], ["3", "Tres", "6"], ["4", "Cuatro", "5"]]
+    # las versiones anteriores de la tienda 2 no son duplicados; la 4 repetida en el snapshot sí
+    invalid = client.query(f"SELECT storeid, storename, reason FROM {DB}.chk_dim_store_invalid")
+    assert invalid[1:] == [["4", "Cuatro bis", "DUPLICATE_PK"]]